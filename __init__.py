@@ -25,7 +25,8 @@ DIRECTION_SYNONYMS = {
 }
 
 # words that should be removed from a command string
-STOPWORDS = ["the", "a", "on", "in", "inside", "at", "to", "room", "around"]
+STOPWORDS = frozenset(["the", "a", "on", "in", "inside", "at", "to", "room",
+    "around"])
 
 def enumerate_items(items):
     """
@@ -0,0 +1,1141 @@
+# bench.py
+# benchmarks for the engine
+# run with: python -m conworld.bench [--output results.json] [name ...]
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from .world import World, MultiplayerWorld, bulk_load
+from .room import Room
+from .player import Player
+from .item import Item, Container
+from .command import (Command, LookRoomCommand, MoveCommand, TakeCommand,
+    DiscardCommand, PutCommand, RemoveCommand, InventoryCommand, ActionCommand,
+    TravelCommand)
+from .command_kernel import CommandKernel
+from .io_driver import IODriver, JSONLinesAdapter
+from .server import Server
+from .journal import Journal
+from .store import RoomStore, PagedWorld
+from .tokens import tokenize
+from . import STOPWORDS, snapshot, generate, npc, farm
+
+
+def default_commands():
+    """
+    the standard command set, in the order it should be added to a kernel
+    """
+    return [LookRoomCommand(), MoveCommand(), TakeCommand(), DiscardCommand(),
+        PutCommand(), RemoveCommand(), InventoryCommand(), ActionCommand()]
+
+
+def small_world():
+    """
+    two connected rooms with a few items in them
+    """
+    kitchen = Room("kitchen", "A kitchen.", items=[
+        Item("knife", inventory=True),
+        Container("box", items=[Item("ball", inventory=True)], opened=True)])
+    hall = Room("hall", "A hall.")
+    kitchen.add_path("door", "north", hall)
+    hall.add_path("door", "south", kitchen)
+
+    return World(Player(kitchen), [kitchen, hall])
+
+
+def grid_world(width, height, seed=0):
+    """
+    rooms on a grid joined by paths in all four directions, each room with
+    a loose item and a closed box holding another
+    """
+    rooms = []
+    for y in range(height):
+        for x in range(width):
+            i = y * width + x
+            rooms.append(Room("room {}".format(i), "Room {}.".format(i),
+                items=[Item("stone", inventory=True), Container("box",
+                    items=[Item("coin", inventory=True)])]))
+
+    for y in range(height):
+        for x in range(width):
+            room = rooms[y * width + x]
+            if x + 1 < width:
+                room.add_path("door", "east", rooms[y * width + x + 1])
+                rooms[y * width + x + 1].add_path("door", "west", room)
+            if y + 1 < height:
+                room.add_path("door", "south", rooms[(y + 1) * width + x])
+                rooms[(y + 1) * width + x].add_path("door", "north", room)
+
+    world = World(Player(rooms[0]), rooms)
+    world.start()
+    return world
+
+
+def small_game(render=True):
+    """
+    a started game in a small world, driven by the compiled dispatcher
+    """
+    world = small_world()
+    kernel = CommandKernel(default_commands(),
+        dispatch=CommandKernel.DISPATCH_COMPILED)
+    driver = IODriver(world, kernel, render)
+    world.start()
+
+    return driver
+
+
+# results of the benchmarks run so far, as (name, value, unit) tuples
+RESULTS = []
+
+
+def show(name, value, unit="", spec=".2f"):
+    """
+    print and keep one result
+    """
+    RESULTS.append((name, value, unit))
+    print("{:<40} {:>10{}} {}".format(name, value, spec, unit).rstrip())
+
+
+def report(name, seconds, count, unit="input"):
+    """
+    print one benchmark result, as time per unit of work
+    """
+    show(name, seconds / count * 1e6, "us/{}".format(unit))
+
+
+def percentile(values, fraction):
+    """
+    value below which the given fraction of the sorted values fall
+    """
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def bench_crowd(width=100, height=100, npcs=200000, ticks=100, seed=0):
+    """
+    a crowd of NPCs wandering a grid of 10k rooms, a step per tick, against
+    moving NPCs one at a time through their rooms' paths
+    """
+    if npc.numpy is None:
+        print("crowd: skipped, numpy is not installed")
+        return
+
+    with bulk_load():
+        world = grid_world(width, height, seed)
+    rng = random.Random(seed)
+    for room in list(world.rooms)[::10]:
+        rng.choice([path for path in room.paths.values()
+            if path is not None]).block(echo=False)
+    driver = IODriver(world, CommandKernel(default_commands()))
+
+    start = time.perf_counter()
+    crowd = npc.Crowd(world, "goblin", seed=seed)
+    crowd.spawn(npcs)
+    show("crowd build ({} paths)".format(len(crowd.targets)),
+        time.perf_counter() - start, "s", ".3f")
+
+    world.scheduler.every(1, crowd.step)
+    gc.collect()
+    start = time.perf_counter()
+    world.scheduler.advance(ticks)
+    seconds = time.perf_counter() - start
+    report("crowd step ({} npcs)".format(npcs), seconds, ticks * npcs, "npc")
+    show("crowd lines heard", len(driver.output), "", "d")
+
+    # the same walk with an object (here, a room) per NPC
+    rooms = [rng.choice(crowd.rooms) for i in range(npcs // 10)]
+    start = time.perf_counter()
+    for tick in range(ticks // 10):
+        for i, room in enumerate(rooms):
+            if rng.random() < crowd.restlessness:
+                path = rng.choice([path for path in room.paths.values()
+                    if path is not None])
+                if not path.blocked:
+                    rooms[i] = path.destination
+    report("crowd step one by one ({} npcs)".format(len(rooms)),
+        time.perf_counter() - start, ticks // 10 * len(rooms), "npc")
+
+
+def farm_game(width=30, height=30):
+    """
+    a grid world and its driver, as a farm builds them (module-level, so
+    it can be sent to the processes)
+    """
+    with bulk_load():
+        world = grid_world(width, height)
+    return IODriver(world, CommandKernel([TravelCommand()] +
+        default_commands()))
+
+
+def bench_farm(scripts=400, lines=40, seed=0):
+    """
+    play many short scripts on fresh grid worlds: one after another and on
+    a pool of processes, building a world for every script and restoring
+    one per process from a snapshot; every way must give the same
+    transcripts
+    """
+    rng = random.Random(seed)
+    inputs = ["look", "go north", "go south", "go east", "go west",
+        "take stone", "open box", "take coin", "discard stone", "inventory",
+        "go to room 31", "look at box", "frobnicate the widget"]
+    script_list = [[rng.choice(inputs) for i in range(lines)]
+        for j in range(scripts)]
+    processes = os.cpu_count() or 1
+
+    transcripts = None
+    for name, count, reuse in (("serial", 0, False),
+        ("serial reuse", 0, True), ("pool", processes, False),
+        ("pool reuse", processes, True)):
+        start = time.perf_counter()
+        with farm.Farm(farm_game, processes=count, reuse=reuse) as world_farm:
+            results = world_farm.play_all(script_list)
+        seconds = time.perf_counter() - start
+
+        if transcripts is None:
+            transcripts = results
+        elif not results == transcripts:
+            raise RuntimeError("{} transcripts differ".format(name))
+
+        report("farm {} ({} processes)".format(name, count or 1), seconds,
+            scripts, "script")
+
+
+def bench_dispatch(extra_commands=300, repeat=5, number=200):
+    """
+    compare the plain command loop with the compiled dispatcher
+    extra commands are registered ahead of the standard ones, the way a game
+    with lots of custom verbs would register them
+    """
+    inputs = ["look", "take knife", "discard knife", "inventory",
+        "look at box", "put ball in box", "frobnicate the widget"]
+
+    for dispatch in (CommandKernel.DISPATCH_LOOP,
+        CommandKernel.DISPATCH_COMPILED):
+
+        commands = [Command("verb{}".format(i),
+            r"^verb{} (?P<item_name>[\w\s\d]+)".format(i))
+            for i in range(extra_commands)]
+        kernel = CommandKernel(commands + default_commands(),
+            dispatch=dispatch)
+        world = small_world()
+
+        def run():
+            for input in inputs:
+                kernel.input(world, input)
+
+        seconds = min(timeit.repeat(run, repeat=repeat, number=number))
+        report("dispatch {} ({} commands)".format(dispatch,
+            len(kernel.commands)), seconds, number * len(inputs))
+
+
+def bench_output(repeat=5, number=2000):
+    """
+    play a few turns reading the output as text, as unrendered messages (a
+    bot that only looks at keys and parameters) and as JSON lines
+    """
+    inputs = ["look", "take knife", "inventory", "discard knife",
+        "look at box", "frobnicate the widget"]
+
+    for mode in ("text", "messages", "json lines"):
+        driver = small_game(render=mode == "text")
+        adapter = JSONLinesAdapter(driver)
+
+        def run():
+            for input in inputs:
+                if mode == "json lines":
+                    adapter.process(input)
+                else:
+                    driver.process(input)
+
+        seconds = min(timeit.repeat(run, repeat=repeat, number=number))
+        report("output as {}".format(mode), seconds, number * len(inputs))
+
+
+def bench_backlog(messages=200000, capacity=1000):
+    """
+    a session nobody reads (ex. a dropped client while the world keeps
+    talking): memory held by an unbounded output against a ring buffer,
+    then the cost of reading output as a list and by draining it
+    """
+    for capacity, overflow in ((None, IODriver.DROP_OLDEST),
+        (capacity, IODriver.DROP_OLDEST), (capacity, IODriver.DROP_NEWEST),
+        (capacity, IODriver.BACKPRESSURE)):
+        world = small_world()
+        driver = IODriver(world, CommandKernel(default_commands()),
+            capacity=capacity, overflow=overflow)
+        room = world.player.location
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        for i in range(messages):
+            room.echo(room.message("ENTER"))
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        name = "unbounded" if capacity is None else "{} ({})".format(
+            overflow, capacity)
+        report("backlog {}".format(name), seconds, messages, "message")
+        show("backlog {} peak".format(name), peak / 1e6, "MB", ".1f")
+        show("backlog {} dropped".format(name), driver.dropped, "messages",
+            "d")
+
+    world = small_world()
+    driver = IODriver(world, CommandKernel(default_commands()))
+    room = world.player.location
+    for read in ("output", "drain"):
+        def run():
+            for i in range(capacity):
+                room.echo("hello")
+            if read == "output":
+                driver.output
+            else:
+                for msg in driver.drain():
+                    pass
+
+        seconds = min(timeit.repeat(run, repeat=5, number=100))
+        report("read by {}".format(read), seconds, 100 * capacity,
+            "message")
+
+
+def bench_schedule(width=100, height=100, ticks=1000, seed=0):
+    """
+    timed events on a grid of 10k rooms: every door closes at a random
+    tick and every box relocks periodically; half the doors are reprieved
+    (their timers cancelled), and time is advanced tick by tick
+    """
+    with bulk_load():
+        world = grid_world(width, height, seed)
+    scheduler = world.scheduler
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    timers = []
+    for room in world.rooms:
+        for path in room.paths.values():
+            if path is not None:
+                timers.append(scheduler.after(rng.randrange(1, ticks),
+                    path.block, False))
+        scheduler.every(rng.randrange(50, 200), room.get("box").lock)
+    show("schedule {} timers".format(scheduler.pending),
+        time.perf_counter() - start, "s", ".3f")
+
+    start = time.perf_counter()
+    for timer in timers[::2]:
+        timer.cancel()
+    show("schedule cancel {}".format(len(timers[::2])),
+        time.perf_counter() - start, "s", ".3f")
+
+    gc.collect()
+    start = time.perf_counter()
+    for tick in range(ticks):
+        scheduler.advance()
+    seconds = time.perf_counter() - start
+    report("schedule callbacks ({} over {} ticks)".format(scheduler.runs,
+        ticks), seconds, scheduler.runs, "callback")
+
+    blocked = len([path for room in world.rooms
+        for path in room.paths.values() if path is not None and path.blocked])
+    if not blocked == len(timers) - len(timers[::2]):
+        raise RuntimeError("{} doors closed, not {}".format(blocked,
+            len(timers) - len(timers[::2])))
+
+    # with nothing due, a tick costs next to nothing however much waits
+    scheduler.clear()
+    for room in world.rooms:
+        scheduler.after(ticks * 1000, room.look)
+    start = time.perf_counter()
+    for tick in range(ticks * 100):
+        scheduler.advance()
+    report("schedule idle tick ({} pending)".format(scheduler.pending),
+        time.perf_counter() - start, ticks * 100, "tick")
+
+
+def bench_script(extra_commands=300, lines=20000):
+    """
+    replay a long script line by line with process() and in one call with
+    process_many(), which preprocesses (and with compiled dispatch, matches)
+    each distinct line only once; both must produce the same output, and
+    the batch must be faster
+    """
+    script = ["look", "take knife", "inventory", "discard knife",
+        "look at box", "frobnicate the widget"] * (lines // 6)
+
+    for dispatch in (CommandKernel.DISPATCH_LOOP,
+        CommandKernel.DISPATCH_COMPILED):
+        results = {}
+        for batch in (False, True):
+            commands = [Command("verb{}".format(i),
+                r"^verb{} (?P<item_name>[\w\s\d]+)".format(i))
+                for i in range(extra_commands)]
+            world = small_world()
+            driver = IODriver(world, CommandKernel(
+                commands + default_commands(), dispatch=dispatch))
+            world.start()
+            driver.flush_output()
+
+            start = time.perf_counter()
+            if batch:
+                outputs = driver.process_many(script)
+            else:
+                outputs = [driver.process(line) for line in script]
+            seconds = time.perf_counter() - start
+            results[batch] = (seconds, outputs)
+
+            report("script {} {}".format(dispatch,
+                "process_many" if batch else "process"), seconds,
+                len(script), "line")
+
+        if not results[True][1] == results[False][1]:
+            raise RuntimeError("process_many output differs ({})"
+                .format(dispatch))
+        if not results[True][0] < results[False][0]:
+            raise RuntimeError("process_many is slower than process ({})"
+                .format(dispatch))
+
+
+def bench_travel(width=316, height=316, queries=1000, seed=0):
+    """
+    shortest routes on a grid of about 100k rooms: building a routing table,
+    answering from it, recovering from a blocked path, and walking a route
+    in one go against one move at a time
+    """
+    start = time.perf_counter()
+    with bulk_load():
+        world = grid_world(width, height, seed)
+    show("travel build ({} rooms)".format(width * height),
+        time.perf_counter() - start, "s", ".3f")
+
+    rooms = list(world.rooms)
+    router = world.router
+    corner = rooms[-1]
+
+    start = time.perf_counter()
+    router.table(corner)
+    show("travel routing table", time.perf_counter() - start, "s", ".3f")
+
+    rng = random.Random(seed)
+    sources = [rng.choice(rooms) for i in range(queries)]
+    start = time.perf_counter()
+    steps = 0
+    for source in sources:
+        steps += len(router.route(source, corner))
+    report("travel cached route ({} steps avg)".format(steps // queries),
+        time.perf_counter() - start, queries, "route")
+
+    # block the first step out of the far corner; one table is dropped
+    direction, path, distance = router.table(corner)[rooms[0]]
+    path.block(echo=False)
+    start = time.perf_counter()
+    route = router.route(rooms[0], corner)
+    show("travel reroute after block ({} dropped)".format(
+        router.invalidations), time.perf_counter() - start, "s", ".3f")
+    path.unblock(echo=False)
+
+    # settle the collector after the tables, so the moves don't pay for it
+    gc.collect()
+    for batch in (False, True):
+        driver = IODriver(world, CommandKernel(default_commands()))
+        player = world.player
+        player.location = rooms[0]
+        route = router.route(rooms[0], corner)
+
+        start = time.perf_counter()
+        if batch:
+            player.travel(route)
+        else:
+            for direction in route:
+                player.move(direction)
+        seconds = time.perf_counter() - start
+        output = driver.output
+        report("travel {} ({} moves, {} lines)".format(
+            "batched" if batch else "stepwise", len(route), len(output)),
+            seconds, len(route), "move")
+
+
+def bench_exits(exits=1000, number=10000, width=100, height=100,
+    deleted=1000):
+    """
+    find paths by name and destination in a room with many exits, then
+    delete rooms from a grid with the world's index of incoming paths and
+    by scanning every room for paths to them
+    """
+    hall = Room("hall")
+    for i in range(exits):
+        hall.add_path("door {}".format(i), "exit {}".format(i),
+            Room("room {}".format(i)))
+
+    for name in ("door {}".format(exits - 1), "room {}".format(exits - 1)):
+        seconds = min(timeit.repeat(lambda: hall.get_path(name), repeat=5,
+            number=number))
+        report("get_path {} ({} exits)".format(name.split()[0], exits),
+            seconds, number, "lookup")
+
+    for indexed in (False, True):
+        world = grid_world(width, height)
+        rooms = list(world.rooms)
+        victims = random.Random(0).sample(rooms, deleted)
+
+        start = time.perf_counter()
+        for room in victims:
+            if indexed:
+                world.delete_room(room)
+            else:
+                for other in world.rooms:
+                    for direction, path in list(other.paths.items()):
+                        if path is not None and path.destination is room:
+                            other.remove_path(direction)
+                world.remove_room(room)
+        report("delete room {} ({} rooms)".format(
+            "indexed" if indexed else "scanning", width * height),
+            time.perf_counter() - start, deleted, "room")
+
+
+def play_turn(rng, world):
+    """
+    a command a player might type next, given where the player is: look,
+    move, take, put, open or inventory
+    """
+    player = world.player
+    room = player.location
+    kind = rng.choices(("look", "move", "take", "put", "open", "inventory"),
+        (15, 30, 20, 10, 10, 15))[0]
+
+    if kind == "move":
+        directions = [direction for direction, path in room.paths.items()
+            if path is not None]
+        if directions:
+            return "go {}".format(rng.choice(directions))
+    elif kind == "take":
+        items = [item.name for item in room.items]
+        if items:
+            return "take {}".format(rng.choice(items))
+    elif kind == "put":
+        items = [item.name for item in player.inventory
+            if not item.container]
+        containers = [item.name for item in room.items if item.container]
+        if items and containers:
+            return "put {} in {}".format(rng.choice(items),
+                rng.choice(containers))
+    elif kind == "open":
+        containers = [item.name for item in room.items if item.container]
+        if containers:
+            return "open {}".format(rng.choice(containers))
+    elif kind == "inventory":
+        return "inventory"
+
+    return "look"
+
+
+def bench_mix(sizes=(1000, 20000), turns=5000, seed=0):
+    """
+    generated worlds of each layout played with a seeded mix of commands
+    through IODriver.process: build time, throughput, latency percentiles,
+    and the peak memory of building and playing (traced in a second run,
+    as tracing slows everything down)
+    """
+    for layout in (generate.GRID, generate.GRAPH):
+        for size in sizes:
+            name = "mix {} ({} rooms)".format(layout, size)
+
+            for traced in (False, True):
+                if traced:
+                    gc.collect()
+                    tracemalloc.start()
+
+                start = time.perf_counter()
+                world = generate.generate(seed, size, layout)
+                driver = IODriver(world, CommandKernel(default_commands(),
+                    dispatch=CommandKernel.DISPATCH_COMPILED))
+                world.start()
+                build_seconds = time.perf_counter() - start
+                driver.output
+
+                rng = random.Random(seed)
+                latencies = []
+                for i in range(turns):
+                    line = play_turn(rng, world)
+                    start = time.perf_counter()
+                    driver.process(line)
+                    latencies.append(time.perf_counter() - start)
+
+                if traced:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    show(name + " peak memory", peak / 1e6, "MB", ".1f")
+                else:
+                    latencies.sort()
+                    show(name + " build", build_seconds, "s", ".3f")
+                    show(name + " throughput", turns / sum(latencies),
+                        "commands/s", ".0f")
+                    for fraction in (0.5, 0.95, 0.99):
+                        show("{} p{:.0f} latency".format(name,
+                            fraction * 100),
+                            percentile(latencies, fraction) * 1e6, "us")
+
+                del world, driver
+
+
+def bench_instrument(repeat=5, number=2000):
+    """
+    a few turns through each dispatcher with instrumentation off and on,
+    then the stats they collected
+    """
+    inputs = ["look", "take knife", "inventory", "discard knife",
+        "look at box", "frobnicate the widget"]
+
+    for dispatch in (CommandKernel.DISPATCH_LOOP,
+        CommandKernel.DISPATCH_COMPILED):
+        for enabled in (False, True):
+            kernel = CommandKernel(default_commands(), dispatch=dispatch)
+            kernel.instrument(enabled)
+            world = small_world()
+
+            def run():
+                for input in inputs:
+                    kernel.input(world, input)
+
+            seconds = min(timeit.repeat(run, repeat=repeat, number=number))
+            report("{} instrumentation {}".format(dispatch,
+                "on" if enabled else "off"), seconds, number * len(inputs))
+
+    print(kernel.stats.dump())
+
+
+def bench_tokenize(repeat=5, number=2000, width=10, height=10):
+    """
+    tokenize a few turns of input with and without the cache, then check a
+    room name with digits in it can be typed
+    """
+    inputs = ["look", "take the knife", "Put the KNIFE in the box!",
+        "go north", "look at box", "frobnicate the widget"]
+    uncached = tokenize.__wrapped__
+
+    for cached in (False, True):
+        split = tokenize if cached else uncached
+
+        def run():
+            for input in inputs:
+                split(input, STOPWORDS)
+
+        tokenize.cache_clear()
+        seconds = min(timeit.repeat(run, repeat=repeat, number=number))
+        report("tokenize {}".format("cached" if cached else "uncached"),
+            seconds, number * len(inputs))
+
+    info = tokenize.cache_info()
+    show("tokenize cache hit ratio", info.hits / (info.hits + info.misses),
+        "", ".1%")
+
+    with bulk_load():
+        world = grid_world(width, height)
+    driver = IODriver(world, CommandKernel([TravelCommand()] +
+        default_commands()))
+    target = "room {}".format(width * height - 1)
+    driver.process("go to {}".format(target))
+    if not world.player.location.name == target:
+        raise RuntimeError("Could not travel to {}".format(target))
+
+
+def bench_build(sizes=(10000, 100000), rooms=100):
+    """
+    build worlds of growing size; time per item should stay flat
+    a third of the items are boxes holding another third, and the loose
+    items of the first room are moved through the inventory and back
+    """
+    for size in sizes:
+        start = time.perf_counter()
+
+        with bulk_load():
+            world_rooms = []
+            for r in range(rooms):
+                items = []
+                for i in range(size // rooms // 3):
+                    items.append(Item("item{}".format(i), inventory=True))
+                    items.append(Container("box{}".format(i), items=[
+                        Item("thing{}".format(i), inventory=True)]))
+                world_rooms.append(Room("room{}".format(r), items=items))
+            player = Player(world_rooms[0])
+            World(player, world_rooms)
+
+            for item in list(world_rooms[0].items):
+                if not item.container and item.owner is None:
+                    player._insert(item)
+                    player._erase(item)
+
+        seconds = time.perf_counter() - start
+        report("build world ({} items)".format(size), seconds, size, "item")
+
+
+def bench_server(clients=200, commands=50):
+    """
+    load test: open many local connections to a game server, each playing
+    its own game, and send commands as fast as responses come back
+    """
+    inputs = ["look", "take knife", "inventory", "discard knife",
+        "go north", "go south"]
+
+    async def read_response(reader, prompt):
+        while True:
+            line = await reader.readline()
+            if not line or line.rstrip(b"\n") == prompt:
+                return
+
+    async def client(port, latencies):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        await read_response(reader, b">")
+
+        for i in range(commands):
+            start = time.perf_counter()
+            writer.write(inputs[i % len(inputs)].encode("utf-8") + b"\n")
+            await read_response(reader, b">")
+            latencies.append(time.perf_counter() - start)
+
+        writer.close()
+        await writer.wait_closed()
+
+    async def run():
+        server = Server(small_game)
+        await server.start()
+
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*[client(server.port, latencies)
+            for i in range(clients)])
+        seconds = time.perf_counter() - start
+
+        await server.close()
+        return seconds, sorted(latencies)
+
+    seconds, latencies = asyncio.run(run())
+    show("server ({} clients)".format(clients), len(latencies) / seconds,
+        "commands/s", ".0f")
+    show("server p50 latency", percentile(latencies, 0.5) * 1e3, "ms")
+    show("server p99 latency", percentile(latencies, 0.99) * 1e3, "ms")
+
+
+def bench_multiplayer(populations=(1000, 10000, 100000), occupancy=10,
+    number=10000):
+    """
+    deliver room messages in a shared world of growing population
+    the room always holds the same number of players, so the time per
+    message should stay flat
+    """
+    for population in populations:
+        with bulk_load():
+            rooms = [Room("room{}".format(i))
+                for i in range(population // occupancy)]
+            world = MultiplayerWorld(rooms)
+            for i in range(population):
+                view = world.join(Player(rooms[i % len(rooms)]))
+                view.on_echo.subscribe(lambda msg: None)
+
+        room = rooms[0]
+        seconds = min(timeit.repeat(lambda: room.echo("Hello."), repeat=3,
+            number=number))
+        report("room message ({} players)".format(population), seconds,
+            number, "message")
+
+
+def bench_snapshot(width=250, height=200):
+    """
+    save a large world after changing its state, load the snapshot into a
+    fresh copy of the world and check the two agree
+    the collector's first full pass over the worlds, which the bulk load
+    put off, is timed on its own rather than charged to whatever allocates
+    next
+    """
+    with bulk_load():
+        world = grid_world(width, height)
+        copy = grid_world(width, height)
+    start = time.perf_counter()
+    gc.collect()
+    collect_seconds = time.perf_counter() - start
+
+    # change some state: take items, open boxes, block paths
+    player = world.player
+    for room in list(world.rooms)[::7]:
+        player.location = room
+        box = room.get("box")
+        box.open()
+        player.take(room.get("stone"))
+        room.get_path("east") and room.get_path("east").block()
+    player._erase(player.get("stone"))
+
+    start = time.perf_counter()
+    data = snapshot.dumps(world)
+    save_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot.loads(copy, data)
+    load_seconds = time.perf_counter() - start
+
+    if not snapshot.dumps(copy) == data:
+        raise RuntimeError("Restored world does not match the original")
+    for room, copy_room in zip(world.rooms, copy.rooms):
+        if not [item.name for item in room.items] == \
+            [item.name for item in copy_room.items]:
+            raise RuntimeError("{} was not restored".format(room.name))
+
+    name = "snapshot ({} rooms, {} bytes)".format(width * height, len(data))
+    show(name + " first collection", collect_seconds, "s", ".3f")
+    show(name + " save", save_seconds, "s", ".3f")
+    show(name + " load", load_seconds, "s", ".3f")
+
+
+def bench_journal(width=100, height=100, rounds=20):
+    """
+    play in a journaled world, compacting in the background, then recover a
+    fresh copy of the world from the journal directory and check they agree
+    """
+    with bulk_load():
+        world = grid_world(width, height)
+        copy = grid_world(width, height)
+
+    directory = tempfile.mkdtemp()
+    try:
+        journal = Journal(world, directory, interval=0.05)
+        journal.start()
+
+        player = world.player
+        rooms = list(world.rooms)
+        start = time.perf_counter()
+        for i in range(rounds):
+            for room in rooms[i::rounds]:
+                player.location = room
+                box = room.get("box")
+                box.open()
+                player.take(room.get("stone"))
+                if i % 2:
+                    player.take(box.get("coin"))
+        journal.close()
+        seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        Journal.recover(copy, directory)
+        recover_seconds = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory)
+
+    if not snapshot.dumps(copy) == snapshot.dumps(world):
+        raise RuntimeError("Recovered world does not match the original")
+
+    report("journaled play ({} changes)".format(journal.records), seconds,
+        journal.records, "change")
+    show("journal compactions", journal.compactions, "", "d")
+    show("recover ({} rooms)".format(width * height), recover_seconds, "s",
+        ".3f")
+
+
+def bench_paging(width=200, height=200, capacity=500, moves=20000):
+    """
+    wander a large stored world with only a few hundred rooms in memory,
+    taking and leaving stones along the way, then check the changes were
+    written back
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "rooms.db")
+        with bulk_load():
+            rooms = list(grid_world(width, height).rooms)
+        start = time.perf_counter()
+        store = RoomStore(filename)
+        store.add_rooms(rooms)
+        build_seconds = time.perf_counter() - start
+        del rooms
+
+        world = PagedWorld(store, Player(), capacity=capacity)
+        player = world.player
+        directions = ("north", "south", "east", "west")
+        generator = random.Random(0)
+
+        start = time.perf_counter()
+        for i in range(moves):
+            player.move(generator.choice(directions))
+            stone = player.location.get("stone")
+            if stone is not None and i % 3 == 0:
+                player.take(stone)
+            elif stone is None and player.get("stone") is not None:
+                player._erase(player.get("stone"))
+        seconds = time.perf_counter() - start
+
+        world.flush()
+        stats = (world.hit_ratio, world.misses, world.evictions, world.writes)
+        carried = len(player.inventory)
+        stones = sum(len([item for item in world.room(room_id).items
+            if item.name == "stone"]) for room_id in range(width * height))
+        store.close()
+    finally:
+        shutil.rmtree(directory)
+
+    if not stones + carried == width * height:
+        raise RuntimeError("{} stones went missing".format(
+            width * height - stones - carried))
+
+    show("store ({} rooms)".format(width * height), build_seconds, "s",
+        ".3f")
+    report("paged move ({} rooms loaded)".format(capacity), seconds, moves,
+        "move")
+    show("page hit ratio", stats[0], "", ".1%")
+    show("page misses", stats[1], "", "d")
+    show("page evictions", stats[2], "", "d")
+    show("page write-backs", stats[3], "", "d")
+
+
+def bench_look(items=1000, number=2000):
+    """
+    look around a room holding many items: from the look cache, and built
+    every time with templates filled in lazily (only the fields they use)
+    and eagerly (the whole context every time, as a subclass overriding
+    context() still gets); then with the room changing between looks
+    """
+    class UncachedRoom(Room):
+        CACHE_LOOK = False
+
+    class EagerRoom(UncachedRoom):
+        def context(self, **extra):
+            return super(EagerRoom, self).context(**extra)
+
+    def build(room_class):
+        room = room_class("hall", "A hall.", items=[
+            Item("item{}".format(i), inventory=True) for i in range(items)])
+        room.add_path("door", "north", Room("kitchen"))
+        room.add_path("gate", "south", Room("garden"), blocked=True)
+        return room
+
+    for name, room_class in (("cached", Room), ("lazy", UncachedRoom),
+        ("eager", EagerRoom)):
+        room = build(room_class)
+        seconds = min(timeit.repeat(room.look, repeat=3, number=number))
+        report("look {} ({} items)".format(name, items), seconds, number,
+            "look")
+        if room_class is Room:
+            show("look cache hit ratio", room.look_hit_ratio, "", ".1%")
+
+    # every look follows a change, so none of them come from the cache
+    room = build(Room)
+    gate = room.paths["south"]
+
+    def look_changed():
+        gate.toggle(echo=False)
+        room.look()
+
+    seconds = min(timeit.repeat(look_changed, repeat=3, number=number))
+    report("look after a change ({} items, {:.0%} hits)".format(items,
+        room.look_hit_ratio), seconds, number, "look")
+
+
+def bench_templates(rooms=1000, boxes=30):
+    """
+    memory and build time of a generated world whose entities share their
+    class template tables, against the same world with every entity holding
+    a full copy of its templates (as they used to)
+    """
+    def build(copy):
+        def text(cls):
+            return dict(cls.templates()) if copy else {}
+
+        world_rooms = []
+        for r in range(rooms):
+            items = []
+            for i in range(boxes):
+                items.append(Container("box{}".format(i), text=text(Container),
+                    items=[Item("coin{}".format(i), inventory=True,
+                        text=text(Item))]))
+            world_rooms.append(Room("room{}".format(r), items=items,
+                text=text(Room)))
+        return world_rooms
+
+    for copy in (False, True):
+        start = time.perf_counter()
+        with bulk_load():
+            world_rooms = build(copy)
+        seconds = time.perf_counter() - start
+        del world_rooms
+
+        tracemalloc.start()
+        world_rooms = build(copy)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del world_rooms
+
+        name = "templates {} ({} items)".format(
+            "copied" if copy else "shared", rooms * boxes * 2)
+        show(name, size / float(rooms * boxes * 2), "bytes/item", ".0f")
+        report(name, seconds, rooms * boxes * 2, "item")
+
+
+def bench_memory(count=1000000, per_room=100):
+    """
+    memory and build time of a world holding a million items: in each room,
+    half the items lie loose and the rest are boxes holding one item each
+    """
+    def build():
+        rooms = []
+        for r in range(count // per_room):
+            items = [Item("item{}".format(i), inventory=True)
+                for i in range(per_room // 2)]
+            items.extend([Container("box{}".format(i), items=[
+                Item("coin{}".format(i), inventory=True)])
+                for i in range(per_room // 4)])
+            rooms.append(Room("room{}".format(r), items=items))
+        return rooms
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    # the rooms are held on to until the memory they take is measured
+    with bulk_load():
+        rooms = build()
+    seconds = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del rooms
+
+    name = "memory ({} items)".format(count)
+    show(name, size / float(count), "bytes/item", ".0f")
+    show(name, size / 1e6, "MB", ".1f")
+    report(name + " build, traced", seconds, count, "item")
+
+
+def bench_relocate(sizes=(10, 1000, 100000), moves=100000):
+    """
+    carry a chest back and forth between a room and the inventory of a
+    world; the time per move doesn't depend on how much the chest holds, as
+    only the chest's parent changes (see bench_find)
+    """
+    for size in sizes:
+        chest = Container("chest", opened=True, items=[
+            Item("coin{}".format(i), inventory=True) for i in range(size)])
+        room = Room("vault", items=[chest])
+        player = Player(room)
+        World(player, [room])
+
+        def run():
+            player._insert(chest)
+            player._erase(chest)
+
+        number = max(1, moves // size)
+        seconds = min(timeit.repeat(run, repeat=3, number=number))
+        report("relocate chest ({} items)".format(size), seconds,
+            number * 2, "move")
+
+
+def bench_find(sizes=(10, 1000, 10000), number=10000):
+    """
+    look names up in a room of a world full of chests: a miss (as every
+    "take" does on the inventory first), an item in the room, and an item in
+    the last chest (found through the world's index of names)
+    """
+    for size in sizes:
+        room = Room("warehouse", items=[
+            Container("chest{}".format(i), opened=True, items=[
+                Item("coin{}".format(i), inventory=True)])
+            for i in range(size)])
+        World(Player(room), [room])
+        items = room.items
+        last = "coin{}".format(size - 1)
+
+        for case, name in (("miss", "sword"), ("member", "chest0"),
+            ("nested", last)):
+            seconds = min(timeit.repeat(lambda: items.find(name), repeat=3,
+                number=number))
+            report("find {} ({} chests)".format(case, size), seconds, number,
+                "lookup")
+
+
+def bench_echo(number=100000):
+    """
+    messages from an item in a container, a container, a room and the player
+    reaching the world's subscribers through the bus, then with on_echo hooks
+    on the room and the player (which the bus still triggers)
+    """
+    world = small_world()
+    world.on_echo.subscribe(lambda msg: None)
+    room = world.player.location
+    box = room.get("box")
+    ball = box.get("ball")
+    sources = (("item", ball), ("container", box), ("room", room),
+        ("player", world.player))
+
+    for hooks in (False, True):
+        if hooks:
+            room.on_echo.subscribe(lambda msg: None)
+            world.player.on_echo.subscribe(lambda msg: None)
+
+        for name, source in sources:
+            seconds = min(timeit.repeat(lambda: source.echo("hello"),
+                repeat=5, number=number))
+            report("{} message{}".format(name, " (hooks)" if hooks else ""),
+                seconds, number, "message")
+
+
+BENCHMARKS = {
+    "backlog": bench_backlog,
+    "build": bench_build,
+    "crowd": bench_crowd,
+    "dispatch": bench_dispatch,
+    "echo": bench_echo,
+    "exits": bench_exits,
+    "farm": bench_farm,
+    "find": bench_find,
+    "instrument": bench_instrument,
+    "journal": bench_journal,
+    "look": bench_look,
+    "memory": bench_memory,
+    "mix": bench_mix,
+    "multiplayer": bench_multiplayer,
+    "output": bench_output,
+    "paging": bench_paging,
+    "relocate": bench_relocate,
+    "schedule": bench_schedule,
+    "script": bench_script,
+    "server": bench_server,
+    "snapshot": bench_snapshot,
+    "templates": bench_templates,
+    "tokenize": bench_tokenize,
+    "travel": bench_travel
+}
+
+
+def main(args):
+    """
+    run benchmarks by name (all of them by default)
+    with --output FILE, the results are also written to FILE as json, to
+    compare between versions
+    """
+    parser = argparse.ArgumentParser(prog="python -m conworld.bench")
+    parser.add_argument("names", nargs="*", metavar="name",
+        help="one of: " + ", ".join(sorted(BENCHMARKS)))
+    parser.add_argument("--output", metavar="FILE",
+        help="write the results to FILE as json")
+    args = parser.parse_args(args)
+
+    results = {}
+    for name in args.names or sorted(BENCHMARKS):
+        del RESULTS[:]
+        BENCHMARKS[name]()
+        results[name] = [{"name": result, "value": value, "unit": unit}
+            for result, value, unit in RESULTS]
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
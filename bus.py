@@ -0,0 +1,89 @@
+# bus.py
+# deliver messages from entities straight to the sinks that should get them
+
+# message scopes: what a message is about, which decides who gets it
+ITEM = "item"
+ROOM = "room"
+PLAYER = "player"
+WORLD = "world"
+
+
+class MessageBus(object):
+    """
+    routes messages published by the entities of a world
+    an entity publishes once, with its scope, and the bus hands the message
+    to the final sinks (ex. the IO driver subscribed to the world) instead
+    of it being relayed hop by hop through every holder's on_echo
+    on_echo subscribers of the publishing entity still get the message
+    (EchoMixin.echo triggers them); so do those of the room or player an
+    item message is resolved to, as the relays used to reach them
+    this bus sends everything to the world's own echo subscribers
+    """
+
+    def __init__(self, world):
+        self._world = world
+
+    @property
+    def world(self):
+        return self._world
+
+    def publish(self, scope, source, msg):
+        """
+        deliver a message from source (an item, room or player; anything for
+        the world scope)
+        """
+        if scope == ITEM:
+            # an item speaks through whatever room or player holds it now
+            holder = source.holder()
+            if holder is None:
+                return
+
+            # on_echo hooks of the holder, which the relays used to reach
+            if getattr(holder, "_on_echo", None) is not None:
+                holder.on_echo.trigger(msg)
+            scope = holder.HOLDER
+            source = holder
+
+        if scope == ROOM:
+            self.room(source, msg)
+        elif scope == PLAYER:
+            self.player(source, msg)
+        elif scope == WORLD:
+            self.world_wide(msg)
+        else:
+            raise ValueError("{} is not a message scope".format(scope))
+
+    def room(self, room, msg):
+        """
+        deliver a message about a room
+        """
+        self._world.echo(msg)
+
+    def player(self, player, msg):
+        """
+        deliver a message to a player
+        """
+        self._world.echo(msg)
+
+    def world_wide(self, msg):
+        """
+        deliver a message about the whole world
+        """
+        self._world.echo(msg)
+
+
+class MultiplayerBus(MessageBus):
+    """
+    bus of a world shared by many players
+    room messages only reach the views of the players in the room, player
+    messages only that player's view
+    """
+
+    def room(self, room, msg):
+        for view in self._world.room_views(room):
+            view.echo(msg)
+
+    def player(self, player, msg):
+        view = self._world.get_view(player)
+        if view is not None:
+            view.echo(msg)
@@ -0,0 +1,140 @@
+# catalog.py
+# stable numbering of the entities in a world
+
+import zlib
+
+
+class Catalog(object):
+    """
+    numbers the rooms, paths, items and players of a world
+    ids are handed out in the order entities are first seen and never change,
+    so two worlds built the same way number their entities the same way as
+    long as both catalogs are taken before play starts (World.start() does)
+    entities added later get new ids when the catalog is refreshed
+    """
+
+    def __init__(self, world):
+        self._world = world
+
+        self._rooms = []
+        self._paths = []
+        self._items = []
+        self._players = []
+        # id of each entity, by entity
+        self._ids = {}
+        # cached fingerprint; None when it needs recomputing
+        self._fingerprint = None
+
+        self.refresh()
+
+    @property
+    def rooms(self):
+        return self._rooms
+
+    @property
+    def paths(self):
+        return self._paths
+
+    @property
+    def items(self):
+        return self._items
+
+    @property
+    def players(self):
+        return self._players
+
+    def __contains__(self, entity):
+        return entity in self._ids
+
+    @property
+    def ids(self):
+        """
+        entity -> id mapping; don't modify it
+        """
+        return self._ids
+
+    @property
+    def counts(self):
+        """
+        number of rooms, paths, items and players
+        """
+        return (len(self._rooms), len(self._paths), len(self._items),
+            len(self._players))
+
+    def kind(self, entity):
+        """
+        "room", "path", "item" or "player"; None if the entity has no id
+        """
+        entity_id = self._ids.get(entity)
+        if entity_id is None:
+            return None
+
+        for kind, entities in (("room", self._rooms), ("path", self._paths),
+            ("item", self._items), ("player", self._players)):
+            if entity_id < len(entities) and entities[entity_id] is entity:
+                return kind
+
+    def id(self, entity):
+        """
+        id of an entity within its kind (room, path, item or player)
+        """
+        return self._ids[entity]
+
+    def _add(self, entities, entity):
+        if not entity in self._ids:
+            self._ids[entity] = len(entities)
+            entities.append(entity)
+            self._fingerprint = None
+
+    def _add_items(self, items):
+        ids = self._ids
+        for item in items:
+            if not item in ids:
+                self._add(self._items, item)
+                if item.container:
+                    self._add_items(item.items)
+
+    def refresh(self):
+        """
+        give ids to entities that joined the world since the last refresh
+        """
+        ids = self._ids
+        for room in self._world.rooms:
+            if not room in ids:
+                self._add(self._rooms, room)
+
+        for room in self._world.rooms:
+            for path in Catalog.room_paths(room):
+                if not path in ids:
+                    self._add(self._paths, path)
+
+            self._add_items(room.items)
+
+        for player in self._world.players:
+            self._add(self._players, player)
+            self._add_items(player.inventory)
+
+    @staticmethod
+    def room_paths(room):
+        """
+        paths out of a room, in a fixed order
+        """
+        paths = getattr(room, "paths", None)
+        if paths is None:
+            return []
+
+        return [path for path in paths.values() if path is not None]
+
+    @property
+    def fingerprint(self):
+        """
+        checksum of the catalog's shape, to tell if two catalogs agree
+        """
+        if self._fingerprint is None:
+            names = [room.name for room in self._rooms]
+            names.extend([path.name for path in self._paths])
+            names.extend([item.name for item in self._items])
+            self._fingerprint = zlib.crc32(
+                "\0".join(names).encode("utf-8"))
+
+        return self._fingerprint
@@ -0,0 +1,361 @@
+# collection.py
+# lookup structures for rooms, inventories and containers
+
+from .event import EventSlot
+
+
+class ItemIndex(object):
+    """
+    index items by their name and synonyms
+    each key maps to the items answering to it, in the order they were added,
+    so get() returns the same item a scan of the holder's list would
+    (the items sit in an insertion-ordered dict so that many items sharing a
+    name still add and remove in O(1))
+    """
+
+    __slots__ = ("_keys", "_on_collision")
+
+    # EVENTS
+    # a second item started answering to a name that was already taken
+    # callbacks receive the name and the item that now shares it
+    # (get_all() has the rest)
+    on_collision = EventSlot()
+
+    def __init__(self):
+        self._keys = {}
+        # set, so triggering it without subscribers stays cheap
+        self._on_collision = None
+
+    @staticmethod
+    def keys(item):
+        """
+        names an item answers to
+        """
+        synonyms = item.synonyms
+        if isinstance(synonyms, str):
+            synonyms = (synonyms,)
+
+        keys = [item.name]
+        for synonym in synonyms:
+            if not synonym in keys:
+                keys.append(synonym)
+
+        return keys
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, item):
+        """
+        index an item
+        """
+        for key in ItemIndex.keys(item):
+            items = self._keys.get(key)
+            if items is None:
+                self._keys[key] = {item: None}
+            elif not item in items:
+                items[item] = None
+                if self._on_collision is not None:
+                    self._on_collision.trigger(key, item)
+
+    def remove(self, item):
+        """
+        drop an item from the index
+        """
+        for key in ItemIndex.keys(item):
+            items = self._keys.get(key)
+            if items is not None and item in items:
+                del items[item]
+                if not items:
+                    del self._keys[key]
+
+    def add_tree(self, items):
+        """
+        index items along with everything inside them
+        """
+        for item in items:
+            self.add(item)
+            if item.container:
+                self.add_tree(item.items)
+
+    def remove_tree(self, items):
+        """
+        drop items along with everything inside them
+        """
+        for item in items:
+            self.remove(item)
+            if item.container:
+                self.remove_tree(item.items)
+
+    def clear(self):
+        """
+        drop every item from the index
+        """
+        self._keys.clear()
+
+    def get(self, key):
+        """
+        get the first item answering to a name, or None
+        """
+        items = self._keys.get(key)
+        if items:
+            return next(iter(items))
+        else:
+            return None
+
+    def get_all(self, key):
+        """
+        get every item answering to a name
+        """
+        return list(self._keys.get(key, ()))
+
+    def items(self, key):
+        """
+        the items answering to a name, in the order they were indexed,
+        without copying them (empty if there are none); don't change the
+        index while going through them
+        """
+        return self._keys.get(key, ())
+
+    @property
+    def collisions(self):
+        """
+        names that more than one item answers to, with those items
+        """
+        return dict([(key, list(items)) for key, items in self._keys.items()
+            if len(items) > 1])
+
+
+class OrderedSet(object):
+    """
+    set that remembers insertion order
+    membership, insertion and removal are O(1); iteration follows the order
+    the members were added in (room descriptions depend on it)
+    """
+
+    __slots__ = ("_members",)
+
+    def __init__(self, members=()):
+        self._members = {}
+        self.update(members)
+
+    def __contains__(self, member):
+        return member in self._members
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def __len__(self):
+        return len(self._members)
+
+    def __getitem__(self, position):
+        """
+        positional access for code written against the old lists
+        this is O(n); iterate instead where you can
+        """
+        return list(self._members)[position]
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, list(self._members))
+
+    def add(self, member):
+        """
+        add a member to the end
+        returns false if it was already a member
+        """
+        if member in self._members:
+            return False
+
+        self._members[member] = None
+        return True
+
+    def update(self, members):
+        """
+        add many members at once, in order
+        """
+        for member in members:
+            self.add(member)
+
+    def remove(self, member):
+        """
+        remove a member, raising KeyError if it isn't one
+        """
+        del self._members[member]
+
+    def discard(self, member):
+        """
+        remove a member if it is one
+        returns false if it wasn't
+        """
+        if member in self._members:
+            self.remove(member)
+            return True
+
+        return False
+
+    def clear(self):
+        """
+        remove every member
+        """
+        self._members.clear()
+
+
+class ItemCollection(OrderedSet):
+    """
+    ordered set of items that can also look them up by name and synonym
+    find() also looks inside the containers among the members (at any
+    depth); in a world it answers from the world's index of every item
+    (see AbstractWorld.names), keeping the candidates whose parents lead
+    back to the collection's holder, so moving a container only touches the
+    two collections it leaves and joins, whatever it holds
+    """
+
+    __slots__ = ("_index", "_holder", "_containers", "_on_add", "_on_remove",
+        "_on_clear")
+
+    # EVENTS
+    # lowest-level record of items coming and going (ex. for journaling)
+    # item was added; callbacks receive the item
+    on_add = EventSlot()
+    # item was removed; callbacks receive the item
+    on_remove = EventSlot()
+    # every item was removed at once
+    on_clear = EventSlot()
+
+    def __init__(self, items=(), holder=None):
+        self._index = ItemIndex()
+        # room, player or container the collection belongs to, if any
+        self._holder = holder
+        # members that are containers, for find(); None until there are any
+        self._containers = None
+        # set, so triggering them without subscribers stays cheap
+        self._on_add = None
+        self._on_remove = None
+        self._on_clear = None
+        super(ItemCollection, self).__init__(items)
+
+    # index property is read-only
+    @property
+    def index(self):
+        return self._index
+
+    # holder property is read-only
+    @property
+    def holder(self):
+        return self._holder
+
+    def add(self, item):
+        if super(ItemCollection, self).add(item):
+            self._index.add(item)
+            if item.container:
+                if self._containers is None:
+                    self._containers = {}
+                self._containers[item] = None
+            if self._on_add is not None:
+                self._on_add.trigger(item)
+            return True
+
+        return False
+
+    def remove(self, item):
+        super(ItemCollection, self).remove(item)
+        self._index.remove(item)
+        if self._containers is not None:
+            self._containers.pop(item, None)
+        if self._on_remove is not None:
+            self._on_remove.trigger(item)
+
+    def clear(self):
+        super(ItemCollection, self).clear()
+        self._index.clear()
+        self._containers = None
+        if self._on_clear is not None:
+            self._on_clear.trigger()
+
+    def get(self, item_name):
+        """
+        get the first item answering to a name, or None
+        """
+        return self._index.get(item_name)
+
+    def find(self, item_name):
+        """
+        like get(), but also looks inside the containers among the items
+        (members first, then each container's contents in order)
+        """
+        item = self._index.get(item_name)
+        if item is not None or not self._containers:
+            return item
+
+        world = holder_world(self._holder)
+        if world is None:
+            return self._search(item_name)
+
+        candidates = world.names.items(item_name)
+        if not candidates:
+            return None
+        # checking each candidate's ancestry costs more than looking
+        # through the containers once there are more of them
+        if len(candidates) > len(self._containers):
+            return self._search(item_name)
+
+        holder = self._holder
+        found = None
+        for candidate in candidates:
+            if _inside(candidate, holder):
+                if found is not None:
+                    # several items inside answer to it; the first in order
+                    # wins
+                    return self._search(item_name)
+                found = candidate
+
+        return found
+
+    def _search(self, item_name):
+        """
+        find() by looking through the containers in order
+        """
+        item = self._index.get(item_name)
+        if item is not None or not self._containers:
+            return item
+
+        for container in self._containers:
+            item = container.items._search(item_name)
+            if item is not None:
+                return item
+
+        return None
+
+
+def _inside(item, holder):
+    """
+    whether an item is in a holder, directly or through containers
+    """
+    parent = item._parent
+    while parent is not None:
+        if parent is holder:
+            return True
+        if not parent.HOLDER == "container":
+            return False
+        parent = parent._parent
+
+    return False
+
+
+def holder_world(holder):
+    """
+    world of a room, player or container (through the room or player
+    holding it), or None when it isn't in one
+    """
+    if holder is None:
+        return None
+    if holder.HOLDER == "container":
+        holder = holder.holder()
+        if holder is None:
+            return None
+
+    bus = holder.bus
+    return None if bus is None else bus.world
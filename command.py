@@ -5,6 +5,8 @@ import re
 
 from . import DIRECTIONS, DIRECTION_SYNONYMS, STOPWORDS, enumerate_items
 from .echo import EchoMixin
+from .message import Message
+from .tokens import tokenize
 
 
 class Command(EchoMixin):
@@ -12,41 +14,57 @@ class Command(EchoMixin):
     user-specified tasks that interact with the world
     """
 
-    def __init__(self, name, pattern):
+    def __init__(self, name, pattern, stopwords=STOPWORDS):
         super(Command, self).__init__()
 
         self._pattern = pattern
+        # compile once here instead of on every match
+        self._regex = re.compile(pattern)
         self._name = name
+        # words removed from the input before matching (frozen, so lookups
+        # are quick and the tokenizer can cache by them)
+        self._stopwords = frozenset(stopwords)
 
     @property
     def name(self):
         return self._name
 
+    @property
+    def pattern(self):
+        return self._pattern
+
+    @property
+    def regex(self):
+        return self._regex
+
+    @property
+    def stopwords(self):
+        return self._stopwords
+
     def __unicode__(self):
         return self._name.decode()
 
     def __str__(self):
         return self._name
 
-    def _preprocess(self, input, stopwords=STOPWORDS):
+    def message(self, table, key, **params):
+        """
+        message from one of the command's text tables, rendered when read
+        """
+        return Message(self, key, table[key], params)
+
+    def _preprocess(self, input, stopwords=None):
         """
         clean up text before matching it with the command pattern
         this makes the command string patterns much simpler
+        (see tokens.tokenize; the result is cached)
         """
+        if stopwords is None:
+            stopwords = self._stopwords
+        elif not isinstance(stopwords, frozenset):
+            stopwords = frozenset(stopwords)
 
-        # set to lowercase
-        result = input.lower()
-        # strip punctuation
-        result = re.sub(r"[`~!@#$%^&*()-=_+,./<>?;':\"\[\]{}\|]", "", result)
-        # remove stopwords
-        result = " ".join([word for word in result.split()
-            if not word in stopwords])
-        # strip of leading / trailing whitespace
-        result = result.strip()
-        # normalize whitespace (convert sequence of spaces to 1 space)
-        result = re.sub(r"[\s]{2,}", " ", result)
-
-        return result
+        return tokenize(input, stopwords)[1]
 
     def match(self, world, input):
         """
@@ -55,8 +73,7 @@ class Command(EchoMixin):
         or false if the pattern doesn't match
         """
         input = self._preprocess(input)
-        cmd_pattern = re.compile(self._pattern)
-        output = cmd_pattern.search(input)
+        output = self._regex.search(input)
 
         # if the command pattern matches, execute the command!
         if output is not None:
@@ -86,7 +103,7 @@ class LookRoomCommand(Command):
 
     def execute(self, world):
         # look at the player's current location
-        world.player.location.look()
+        world.player.look()
 
 
 class MoveCommand(Command):
@@ -107,11 +124,52 @@ class MoveCommand(Command):
             world.player.move(direction)
         elif direction in DIRECTION_SYNONYMS:
             world.player.move(DIRECTION_SYNONYMS[direction])
+        # other exits of the room (ex. "go portal"), by direction or name
+        elif world.player.location.get_path(direction) is not None:
+            world.player.move(direction)
         else:
-            self.echo(MoveCommand.TEXT["NO_DIRECTION"].format(
+            self.echo(self.message(MoveCommand.TEXT, "NO_DIRECTION",
                 direction=direction))
 
 
+class TravelCommand(Command):
+    """
+    walk the shortest unblocked route to a room by its name
+    add it before MoveCommand, which would take "go to" for a direction
+    """
+
+    PATTERN = r"^(go|travel|walk) to (?P<room_name>[\w\s\d]+)"
+    TEXT = {
+        "NO_ROOM": "You don't know of any {room}.",
+        "NO_ROUTE": "You can't find a way to the {room}.",
+        "ALREADY_THERE": "You are already in the {room}."
+    }
+    # "to" is part of the pattern, and room names may well contain "room"
+    STOPWORDS = STOPWORDS - frozenset(["to", "room"])
+
+    def __init__(self):
+        super(TravelCommand, self).__init__("travel", TravelCommand.PATTERN,
+            TravelCommand.STOPWORDS)
+
+    def execute(self, world, room_name):
+        player = world.player
+        destination = world.router.find(room_name)
+
+        if destination is None:
+            self.echo(self.message(TravelCommand.TEXT, "NO_ROOM",
+                room=room_name))
+        elif destination is player.location:
+            self.echo(self.message(TravelCommand.TEXT, "ALREADY_THERE",
+                room=room_name))
+        else:
+            route = world.router.route(player.location, destination)
+            if route is None:
+                self.echo(self.message(TravelCommand.TEXT, "NO_ROUTE",
+                    room=room_name))
+            else:
+                player.travel(route)
+
+
 class TakeCommand(Command):
     """
     take an item and put it in the inventory
@@ -129,7 +187,7 @@ class TakeCommand(Command):
     def execute(self, world, item_name):
         # check if the item isn't alerady in the player's inventory
         if world.player.get(item_name) is not None:
-            self.echo(TakeCommand.TEXT["ALREADY_IN_INVENTORY"].format(
+            self.echo(self.message(TakeCommand.TEXT, "ALREADY_IN_INVENTORY",
                 item=item_name))
         else:
             # check if the item is in the current room
@@ -138,7 +196,7 @@ class TakeCommand(Command):
             if item is not None:
                 world.player.take(item)
             else:
-                self.echo(TakeCommand.TEXT["NO_ITEM"].format(
+                self.echo(self.message(TakeCommand.TEXT, "NO_ITEM",
                     item=item_name, room=world.player.location.name))
 
 
@@ -162,7 +220,8 @@ class DiscardCommand(Command):
         if item is not None:
             world.player.discard(item)
         else:
-            self.echo(DiscardCommand.TEXT["NO_ITEM"].format(item=item_name))
+            self.echo(self.message(DiscardCommand.TEXT, "NO_ITEM",
+                item=item_name))
 
 
 class PutCommand(Command):
@@ -170,7 +229,7 @@ class PutCommand(Command):
     put an item in a container
     """
     # use custom stopword list -- omit "in" because we use that in the pattern
-    CUSTOM_STOPWORDS = ["the", "a", "at", "to", "room", "around"]
+    CUSTOM_STOPWORDS = frozenset(["the", "a", "at", "to", "room", "around"])
     PATTERN = (r"^(put|place) (?P<item_name>[\w\d\s]+) in "
         r"(?P<container_name>[\w\d\s]+)")
     TEXT = {
@@ -181,13 +240,7 @@ class PutCommand(Command):
     }
 
     def __init__(self):
-        super(PutCommand, self).__init__("put", PutCommand.PATTERN)
-
-    def _preprocess(self, input):
-        """
-        override Command._preprocess because we need a custom stopwords list
-        """
-        return super(PutCommand, self)._preprocess(input,
+        super(PutCommand, self).__init__("put", PutCommand.PATTERN,
             stopwords=PutCommand.CUSTOM_STOPWORDS)
 
     def execute(self, world, item_name, container_name):
@@ -206,16 +259,16 @@ class PutCommand(Command):
             if container.container:
                 container.add(item)
             else:
-                self.echo(PutCommand.TEXT["NOT_CONTAINER"].format(
+                self.echo(self.message(PutCommand.TEXT, "NOT_CONTAINER",
                     container=container_name))
 
         # item doesn't exist
         elif item is None:
-            self.echo(PutCommand.TEXT["NO_ITEM"].format(item=item_name,
+            self.echo(self.message(PutCommand.TEXT, "NO_ITEM", item=item_name,
                 room=world.player.location.name))
         # container doesn't exist
         else:
-            self.echo(PutCommand.TEXT["NO_CONTAINER"].format(
+            self.echo(self.message(PutCommand.TEXT, "NO_CONTAINER",
                 container=container_name, room=world.player.location.name))
 
 
@@ -240,12 +293,12 @@ class RemoveCommand(Command):
             item = world.player.get(item_name)
 
         if item is None:
-            self.echo(RemoveCommand.TEXT["NO_ITEM"].format(item=item_name,
-                room=world.player.location.name))
+            self.echo(self.message(RemoveCommand.TEXT, "NO_ITEM",
+                item=item_name, room=world.player.location.name))
 
         elif item.owner is None or not item.owner.name == container_name:
-            self.echo(RemoveCommand.TEXT["NO_CONTAINER"].format(item=item_name,
-                container=container_name))
+            self.echo(self.message(RemoveCommand.TEXT, "NO_CONTAINER",
+                item=item_name, container=container_name))
 
         else:
             item.owner.remove(item)
@@ -273,10 +326,10 @@ class InventoryCommand(Command):
             if item.owner is None]
 
         if len(items) >= 1:
-            self.echo(InventoryCommand.TEXT["INVENTORY"].format(
+            self.echo(self.message(InventoryCommand.TEXT, "INVENTORY",
                 items=enumerate_items(items)))
         else:
-            self.echo(InventoryCommand.TEXT["NO_ITEMS"])
+            self.echo(self.message(InventoryCommand.TEXT, "NO_ITEMS"))
 
 
 class ActionCommand(Command):
@@ -307,13 +360,13 @@ class ActionCommand(Command):
 
 
         if item is None:
-            self.echo(ActionCommand.TEXT["NO_ITEM"].format(item=item_name,
-                room=world.player.location.name))
+            self.echo(self.message(ActionCommand.TEXT, "NO_ITEM",
+                item=item_name, room=world.player.location.name))
         else:
             action = item.get_action(action_name)
 
             if action is None:
-                self.echo(ActionCommand.TEXT["NO_COMMAND"].format(
+                self.echo(self.message(ActionCommand.TEXT, "NO_COMMAND",
                     action=action_name, item=item_name))
             # call the action method!
             else:
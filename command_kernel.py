@@ -1,7 +1,299 @@
 # command_kernel.py
 # manage user input and commands
 
+import re
+import time
+
 from .echo import EchoMixin
+from .command import Command
+from .message import Message
+from .stats import KernelStats
+
+
+# named group, named backreference and conditional on a group: the part up
+# to the name, and the name
+GROUP_REFERENCE = re.compile(r"(\(\?P[<=]|\(\?\()(\w+)")
+# numbered backreferences can't survive being merged with other patterns
+NUMBERED_BACKREF = re.compile(r"\\[1-9]")
+# the words a pattern's input can start with: a word, or a group of
+# alternatives made of words, followed by a space or the end of the input
+# (ex. "^take ", "^(look|view)$", "^(discard|throw away) ")
+# a quantified space or end ("^take ?") doesn't count; the word could run
+# straight into the rest of the input
+LEADING_VERBS = re.compile(r"\^(?:(\w+)|\((?:\?:)?(\w+(?: \w+)*"
+    r"(?:\|\w+(?: \w+)*)*)\))(?: |\$)(?![?*+{])")
+
+
+def _references(pattern):
+    """
+    positions and names of the group names in a pattern (see
+    GROUP_REFERENCE), skipping escaped characters and character classes
+    """
+    references = []
+    in_class = False
+    escaped = False
+    for i, char in enumerate(pattern):
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            if char == "]":
+                in_class = False
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            reference = GROUP_REFERENCE.match(pattern, i)
+            if reference is not None:
+                references.append((reference.start(2), reference.group(2)))
+
+    return references
+
+
+def _rename(pattern, prefix):
+    """
+    prefix the names of a pattern's groups, and the references to them
+    """
+    parts = []
+    last = 0
+    for start, name in _references(pattern):
+        parts.append(pattern[last:start])
+        parts.append(prefix + name)
+        last = start + len(name)
+    parts.append(pattern[last:])
+
+    return "".join(parts)
+
+
+def _verbs(pattern):
+    """
+    the words an input matching an anchored pattern can start with, or None
+    if it could start with any
+    """
+    leading = LEADING_VERBS.match(pattern)
+    if leading is None:
+        return None
+
+    if leading.group(1) is not None:
+        return [leading.group(1)]
+
+    verbs = []
+    for alternative in leading.group(2).split("|"):
+        verb = alternative.split(" ")[0]
+        if not verb in verbs:
+            verbs.append(verb)
+
+    return verbs
+
+
+def _merge(commands, numbers):
+    """
+    compile commands into one ordered alternation
+    numbers are the commands' positions in their group, which name their
+    branches; returns the regex and, by branch group index, (command,
+    {original group: renamed group})
+    """
+    branches = []
+    for command, i in zip(commands, numbers):
+        branches.append("(?P<_{}>{})".format(i,
+            _rename(command.pattern, "_{}_".format(i))))
+    regex = re.compile("|".join(branches))
+
+    found = {}
+    for command, i in zip(commands, numbers):
+        prefix = "_{}_".format(i)
+        groups = dict([(name, prefix + name)
+            for name in command.regex.groupindex])
+        found[regex.groupindex["_{}".format(i)]] = (command, groups)
+
+    return regex, found
+
+
+def _anchored(pattern):
+    """
+    check if a pattern can only match at the start of the input:
+    it must begin with ^ and have no alternation outside of a group
+    """
+    if not pattern.startswith("^"):
+        return False
+
+    depth = 0
+    in_class = False
+    escaped = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            if char == "]":
+                in_class = False
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return False
+
+    return True
+
+
+class CommandGroup(object):
+    """
+    consecutive commands merged into a single ordered alternation
+    every pattern is anchored at the start of the input, so the first branch
+    that matches is the same command the plain loop would have picked
+    commands are also indexed by the words their input starts with (see
+    LEADING_VERBS), and an input is only matched against the commands for
+    its first word, along with those that can start with any; each verb's
+    alternation is compiled the first time an input starts with it
+    a group of one command just searches with the command's own pattern
+    """
+
+    def __init__(self, commands):
+        self._commands = commands
+        # alternation of every command, with its branches: (command,
+        # {original group: renamed group}) by branch group index
+        self._regex = None
+        self._branches = {}
+        # positions of the commands for each verb, in order; None when no
+        # command has a verb to index
+        self._verbs = None
+        # positions of the commands that can start with any word
+        self._anywhere = []
+        # compiled (regex, branches) for each verb seen so far (None for words
+        # no command starts with)
+        self._by_verb = {}
+
+        # a lone command keeps its own pattern and matching rules
+        if len(commands) == 1:
+            return
+
+        verbs = {}
+        for i, command in enumerate(commands):
+            command_verbs = _verbs(command.pattern)
+            if command_verbs is None:
+                self._anywhere.append(i)
+                # every verb so far gets it too, in order
+                for positions in verbs.values():
+                    positions.append(i)
+                continue
+
+            for verb in command_verbs:
+                if not verb in verbs:
+                    verbs[verb] = list(self._anywhere)
+                verbs[verb].append(i)
+
+        if verbs:
+            self._verbs = verbs
+        else:
+            self._regex, self._branches = _merge(commands,
+                range(len(commands)))
+
+    @property
+    def commands(self):
+        return self._commands
+
+    @staticmethod
+    def standard(command):
+        """
+        check if a command matches the way Command.match does
+        commands that override how they match are run on their own
+        """
+        cls = type(command)
+        return cls.match is Command.match and \
+            cls._preprocess is Command._preprocess
+
+    @staticmethod
+    def mergeable(command):
+        """
+        check if a command can be merged with others into one alternation
+        numbered references to groups (backreferences and conditionals)
+        can't be, since merging renumbers the groups
+        """
+        if NUMBERED_BACKREF.search(command.pattern):
+            return False
+        for start, name in _references(command.pattern):
+            if name.isdigit():
+                return False
+
+        return _anchored(command.pattern)
+
+    def _alternation(self, verb):
+        """
+        regex and branches matching the commands an input starting with a
+        verb could be for; (None, None) if there are none
+        """
+        # words no command starts with share one entry, so inputs can't
+        # grow the cache
+        if not verb in self._verbs:
+            verb = None
+        found = self._by_verb.get(verb)
+        if found is None:
+            positions = self._verbs.get(verb, self._anywhere)
+            if positions:
+                found = _merge([self._commands[i] for i in positions],
+                    positions)
+            else:
+                found = (None, None)
+            self._by_verb[verb] = found
+
+        return found
+
+    @property
+    def name(self):
+        """
+        name the group goes by in stats: its command's name, or the first
+        one's and how many more there are
+        """
+        if len(self._commands) == 1:
+            return self._commands[0].name
+
+        return "{} (+{} more)".format(self._commands[0].name,
+            len(self._commands) - 1)
+
+    def search(self, text):
+        """
+        the command matching preprocessed text and the arguments to execute
+        it with, or None
+        """
+        if self._verbs is not None:
+            regex, branches = self._alternation(text.partition(" ")[0])
+            if regex is None:
+                return None
+        elif self._regex is None:
+            command = self._commands[0]
+            output = command.regex.search(text)
+            if output is not None:
+                return command, output.groupdict()
+            else:
+                return None
+        else:
+            regex = self._regex
+            branches = self._branches
+
+        output = regex.match(text)
+
+        if output is not None:
+            command, groups = branches[output.lastindex]
+            return command, dict([(name, output.group(renamed))
+                for name, renamed in groups.items()])
+        else:
+            return None
+
+    def match(self, world, text):
+        """
+        match preprocessed text against every command in the group at once
+        """
+        found = self.search(text)
+        if found is None:
+            return False
+
+        command, arguments = found
+        command.execute(world, **arguments)
+        return True
 
 
 class CommandKernel(EchoMixin):
@@ -13,16 +305,68 @@ class CommandKernel(EchoMixin):
         "NO_COMMAND": "I don't understand what you mean."
     }
 
-    def __init__(self, commands=[]):
+    # try each command in turn, like the kernel always has
+    DISPATCH_LOOP = "loop"
+    # preprocess once per stopword list and match precompiled groups
+    DISPATCH_COMPILED = "compiled"
+
+    def __init__(self, commands=[], dispatch=DISPATCH_LOOP):
         super(CommandKernel, self).__init__()
 
+        if not dispatch in (CommandKernel.DISPATCH_LOOP,
+            CommandKernel.DISPATCH_COMPILED):
+            raise ValueError("{} is not a dispatch mode".format(dispatch))
+
+        self._dispatch = dispatch
         self._commands = []
+        # compiled dispatch plan; rebuilt lazily when commands change
+        self._plan = None
+        # the plain loop, as runs of commands sharing preprocessed input;
+        # rebuilt lazily when commands change
+        self._loop_plan = None
+        # the plain loop as steps like the plan's, for instrument()
+        self._loop_steps = None
+        # inputs no command matched
+        self._unmatched = 0
+        # counters and timings (see instrument()); None when off
+        self._stats = None
         self.add_commands(commands)
 
     @property
     def commands(self):
         return self._commands
 
+    @property
+    def dispatch(self):
+        return self._dispatch
+
+    @property
+    def unmatched(self):
+        """
+        inputs no command matched (counted even without instrumentation)
+        """
+        return self._unmatched
+
+    # stats property is read-only; None unless instrumented
+    @property
+    def stats(self):
+        return self._stats
+
+    def instrument(self, enabled=True):
+        """
+        start (or stop) recording, per command, how often it is tried and
+        matches and how long matching and executing take (see KernelStats)
+        starting again keeps the stats so far; they are returned
+        without instrumentation, input() only pays for checking it is off
+        """
+        if enabled:
+            if self._stats is None:
+                self._stats = KernelStats()
+        else:
+            self._stats = None
+
+        return self._stats
+
     def add_command(self, command):
         """
         add a command
@@ -37,23 +381,269 @@ class CommandKernel(EchoMixin):
             if not command in self._commands:
                 command.on_echo.subscribe(self.command_echo)
                 self._commands.append(command)
+                self._plan = None
+                self._loop_plan = None
+                self._loop_steps = None
             else:
                 raise RuntimeError("Command is already in the kernel")
 
+    def message(self, table, key, **params):
+        """
+        message from a text table, rendered when read
+        """
+        return Message(self, key, table[key], params)
+
     def command_echo(self, msg):
         """
         relay command messages to the IO driver
         """
         self.echo(msg)
 
-    def input(self, world, input):
+    def _build_plan(self):
         """
-        feed the input to the list of commands
+        split the command list into steps, keeping the order of the commands
+        each step is a (stopword key, CommandGroup) pair, or a (None, Command)
+        pair for commands that preprocess and match the input themselves
+        """
+        plan = []
+        run = []
+        run_key = None
+
+        for command in self._commands:
+            if not CommandGroup.standard(command):
+                if run:
+                    plan.append((run_key, CommandGroup(run)))
+                    run = []
+                plan.append((None, command))
+                continue
+
+            key = command.stopwords
+            if run and (not key == run_key or
+                not CommandGroup.mergeable(command) or
+                not CommandGroup.mergeable(run[-1])):
+                plan.append((run_key, CommandGroup(run)))
+                run = []
+            run.append(command)
+            run_key = key
+
+        if run:
+            plan.append((run_key, CommandGroup(run)))
+
+        return plan
+
+    def _compiled_input(self, world, input, texts):
+        """
+        run the input through the compiled plan
+        returns true if a command matched
+        """
+        if self._plan is None:
+            self._plan = self._build_plan()
+
+        for key, step in self._plan:
+            if key is None:
+                if step.match(world, input):
+                    return True
+                continue
+
+            # what a group finds only depends on the text, so it is kept
+            # with the input's texts (by group) for when the input comes
+            # again (see input_many())
+            if step in texts:
+                found = texts[step]
+            else:
+                text = texts.get(key)
+                if text is None:
+                    text = step.commands[0]._preprocess(input)
+                    texts[key] = text
+                found = texts[step] = step.search(text)
+
+            if found is not None:
+                command, arguments = found
+                command.execute(world, **arguments)
+                return True
+
+        return False
+
+    def _build_loop_plan(self):
         """
+        split the command list into runs of consecutive commands that match
+        the standard way with the same stopwords, keeping their order
+        each run is a (stopword key, [(command, its regex's search)]) pair;
+        commands that preprocess and match the input themselves are a
+        (None, [(command, None)]) run of their own
+        """
+        plan = []
         for command in self._commands:
-            # once we have a match, stop
-            if command.match(world, input):
-                return
+            if not CommandGroup.standard(command):
+                plan.append((None, [(command, None)]))
+                continue
+
+            key = command.stopwords
+            if not plan or not plan[-1][0] == key:
+                plan.append((key, []))
+            plan[-1][1].append((command, command.regex.search))
+
+        return plan
+
+    def _loop_input(self, world, input, texts):
+        """
+        try each command in turn
+        returns true if a command matched
+        """
+        if texts is None:
+            for command in self._commands:
+                # once we have a match, stop
+                if command.match(world, input):
+                    return True
+
+            return False
+
+        if self._loop_plan is None:
+            self._loop_plan = self._build_loop_plan()
+
+        # commands that match the standard way share preprocessed input
+        # with the others using the same stopwords
+        for key, run in self._loop_plan:
+            if key is None:
+                if run[0][0].match(world, input):
+                    return True
+                continue
+
+            text = texts.get(key)
+            if text is None:
+                text = run[0][0]._preprocess(input)
+                texts[key] = text
+
+            for command, search in run:
+                output = search(text)
+                if output is not None:
+                    command.execute(world, **output.groupdict())
+                    return True
+
+        return False
+
+    def input(self, world, input, cache=None):
+        """
+        feed the input to the list of commands
+        returns true if a command matched it
+        cache, a dict kept across calls (see input_many()), saves
+        preprocessing inputs that were seen before (and, with compiled
+        dispatch, matching them)
+        """
+        # preprocessed input, one entry per stopword list (and what each
+        # compiled group found in it)
+        if cache is None:
+            texts = None
+        else:
+            texts = cache.get(input)
+            if texts is None:
+                texts = cache[input] = {}
+
+        if self._stats is not None:
+            start = time.perf_counter()
+            matched = self._instrumented_input(world, input, texts)
+            if not matched:
+                self._no_command(input)
+            self._stats.record_input(time.perf_counter() - start, matched)
+            return matched
+
+        if self._dispatch == CommandKernel.DISPATCH_COMPILED:
+            if self._compiled_input(world, input,
+                {} if texts is None else texts):
+                return True
+        elif self._loop_input(world, input, texts):
+            return True
+
+        self._no_command(input)
+        return False
+
+    def _no_command(self, input):
+        """
+        the input matched no command
+        """
+        self._unmatched += 1
+        self.echo(self.message(CommandKernel.TEXT, "NO_COMMAND", input=input))
+
+    def _instrumented_input(self, world, input, texts):
+        """
+        dispatch like _compiled_input() or _loop_input(), timing each step
+        commands (and groups) that match the standard way are timed matching
+        and executing apart; other commands match and execute in one call,
+        which all counts as matching
+        a group of several commands is tried as one, so trying it is charged
+        to the group, and the command that took the input only gets the
+        match and executing it (see KernelStats)
+        """
+        stats = self._stats
+        clock = time.perf_counter
+        if texts is None:
+            texts = {}
+
+        if self._dispatch == CommandKernel.DISPATCH_COMPILED:
+            if self._plan is None:
+                self._plan = self._build_plan()
+            # (key, group) steps search the preprocessed input
+            steps = self._plan
+        else:
+            if self._loop_steps is None:
+                self._loop_steps = [(command.stopwords,
+                    CommandGroup([command]))
+                    if CommandGroup.standard(command) else (None, command)
+                    for command in self._commands]
+            steps = self._loop_steps
+
+        for key, step in steps:
+            grouped = key is not None and len(step.commands) > 1
+            if grouped:
+                step_stats = stats.group(step.name)
+            else:
+                step_stats = stats.command(step.name)
+            step_stats.attempts += 1
+            start = clock()
+
+            if key is None:
+                matched = step.match(world, input)
+                step_stats.match.add(clock() - start)
+                if matched:
+                    step_stats.matches += 1
+                    return True
+                continue
+
+            text = texts.get(key)
+            if text is None:
+                text = step.commands[0]._preprocess(input)
+                texts[key] = text
+            found = step.search(text)
+            matched_at = clock()
+            step_stats.match.add(matched_at - start)
+
+            if found is not None:
+                step_stats.matches += 1
+                command, arguments = found
+                if grouped:
+                    command_stats = stats.command(command.name)
+                    command_stats.attempts += 1
+                    command_stats.matches += 1
+                else:
+                    command_stats = step_stats
+                command.execute(world, **arguments)
+                command_stats.execute.add(clock() - matched_at)
+                return True
+
+        return False
+
+    def input_many(self, world, inputs, stop_unmatched=False):
+        """
+        feed a script of inputs in one call, preprocessing (and with
+        compiled dispatch, matching) each distinct input only once
+        returns how many inputs were fed; with stop_unmatched, feeding stops
+        after the first input no command matches
+        """
+        cache = {}
+        count = 0
+        for input in inputs:
+            count += 1
+            if not self.input(world, input, cache) and stop_unmatched:
+                break
 
-        # if we reach here, that means the input matched no command
-        self.echo(CommandKernel.TEXT["NO_COMMAND"].format(input=input))
+        return count
@@ -1,7 +1,7 @@
 # echo.py
 # echo mixin
 
-from .event import Event
+from .event import EventSlot
 
 
 class EchoMixin(object):
@@ -9,9 +9,12 @@ class EchoMixin(object):
     Adds functionality to print to IO driver
     """
 
-    def __init__(self):
-        self.on_echo = Event()
+    # storage (_on_echo) is declared by subclasses that use __slots__
+    __slots__ = ()
+
+    on_echo = EventSlot()
 
+    def __init__(self):
         # call the next mixin constructor, if it exists
         # this makes multiple inheritance work
         super(EchoMixin, self).__init__()
@@ -20,4 +23,7 @@ class EchoMixin(object):
         """
         send off to subscribers (the last of which should be the IO Driver)
         """
-        self.on_echo.trigger(msg)
+        # skip building a stand-in event when nobody listens
+        event = getattr(self, "_on_echo", None)
+        if event is not None:
+            event.trigger(msg)
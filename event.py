@@ -6,6 +6,8 @@ class Event(object):
     handles event triggering and callbacks 
     """
 
+    __slots__ = ("_callbacks",)
+
     def __init__(self):
         self._callbacks = []
 
@@ -39,3 +41,68 @@ class Event(object):
         """
         for callback in self._callbacks:
             callback(*args, **kwargs)
+
+
+class _PendingEvent(object):
+    """
+    stands in for an event that had no subscribers when it was looked up
+    triggering it does nothing until something subscribes, which creates
+    the event; a stand-in kept after that acts on the created event
+    """
+
+    __slots__ = ("_owner", "_attribute")
+
+    def __init__(self, owner, attribute):
+        self._owner = owner
+        self._attribute = attribute
+
+    def __call__(self, callback):
+        self.subscribe(callback)
+
+    def subscribe(self, callback):
+        event = getattr(self._owner, self._attribute, None)
+        if event is None:
+            event = Event()
+            setattr(self._owner, self._attribute, event)
+        event.subscribe(callback)
+
+    def unsubscribe(self, callback):
+        event = getattr(self._owner, self._attribute, None)
+        if event is None:
+            raise RuntimeError("Callback is not subscribed to event")
+        event.unsubscribe(callback)
+
+    def trigger(self, *args, **kwargs):
+        event = getattr(self._owner, self._attribute, None)
+        if event is not None:
+            event.trigger(*args, **kwargs)
+
+
+class EventSlot(object):
+    """
+    event attribute that is only allocated once something subscribes
+    most events of most objects never get a subscriber, so this saves an
+    Event (and its callback list) per event per object
+    declare it on the class (ex. on_look = EventSlot()); classes with
+    __slots__ must include the storage slot, the name prefixed with "_"
+    """
+
+    __slots__ = ("_attribute",)
+
+    def __init__(self):
+        self._attribute = None
+
+    def __set_name__(self, owner, name):
+        self._attribute = "_" + name
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+
+        event = getattr(obj, self._attribute, None)
+        if event is None:
+            return _PendingEvent(obj, self._attribute)
+        return event
+
+    def __set__(self, obj, event):
+        setattr(obj, self._attribute, event)
@@ -0,0 +1,177 @@
+# farm.py
+# play many independent games at once, across processes
+
+import multiprocessing
+import os
+
+from . import snapshot
+
+
+class _Worker(object):
+    """
+    plays scripts in one process, on a world of its own
+    with reuse, the world is built once and restored from a snapshot of
+    its starting state before every script after the first
+    """
+
+    def __init__(self, factory, reuse):
+        self._factory = factory
+        self._reuse = reuse
+        self._driver = None
+        # starting state of the world and the output it opened with
+        self._start = None
+        self._opening = None
+        self._builds = 0
+
+    @property
+    def builds(self):
+        """
+        worlds built so far
+        """
+        return self._builds
+
+    def _build(self):
+        driver = self._factory()
+        self._builds += 1
+        self._opening = driver.output
+
+        self._start = None
+        if self._reuse:
+            try:
+                self._start = snapshot.dumps(driver.world)
+            except (ValueError, TypeError):
+                # a world snapshots can't take is built fresh every time
+                pass
+
+        return driver
+
+    def driver(self):
+        """
+        a driver whose world is in its starting state
+        """
+        if self._driver is None or self._start is None:
+            self._driver = self._build()
+        else:
+            snapshot.loads(self._driver.world, self._start)
+            self._driver.flush_output()
+
+        return self._driver
+
+    def play(self, script):
+        driver = self.driver()
+        return self._opening, driver.process_many(script)
+
+
+# the worker of a pool process; set when the process starts
+_worker = None
+
+
+def _start_worker(factory, reuse):
+    global _worker
+    _worker = _Worker(factory, reuse)
+
+
+def _play(script):
+    return _worker.play(script)
+
+
+class Farm(object):
+    """
+    plays scripts of inputs against fresh worlds, spread over a pool of
+    processes
+    -factory is called with no arguments and must return a ready IODriver
+    (world, player and kernel of its own, as for Server); it is sent to the
+    processes, so it must be picklable (ex. a module-level function)
+    -a transcript of a script is (opening, outputs): the output the world
+    opened with, then the output of each input (see IODriver.process_many)
+    -scripts are handed out in chunks of chunksize (by default, about four
+    chunks per process) and transcripts come back in the order of the
+    scripts, as soon as they and the ones before them are done
+    -with reuse, each process builds its world once and restores it from a
+    snapshot before every script; state a snapshot doesn't hold (scheduled
+    timers, changed descriptions, added rooms) carries over from one
+    script to the next, so worlds that change it need reuse=False
+    processes=0 plays the scripts in this process, one after another
+    ex. with Farm(make_game) as farm:
+            for opening, outputs in farm.play(scripts): ...
+    """
+
+    def __init__(self, factory, processes=None, chunksize=None, reuse=True):
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes < 0:
+            raise ValueError("Number of processes must not be negative")
+        if chunksize is not None and chunksize < 1:
+            raise ValueError("Chunk size must be at least 1")
+
+        self._factory = factory
+        self._processes = processes
+        self._chunksize = chunksize
+        self._reuse = reuse
+        # pool of processes, started on first use
+        self._pool = None
+        # worker for processes=0
+        self._local = None
+
+    @property
+    def processes(self):
+        return self._processes
+
+    @property
+    def reuse(self):
+        return self._reuse
+
+    def _chunks(self, scripts):
+        if self._chunksize is not None:
+            return self._chunksize
+
+        try:
+            count = len(scripts)
+        except TypeError:
+            # an iterator of unknown length
+            return 1
+
+        return max(1, count // (self._processes * 4))
+
+    def play(self, scripts):
+        """
+        play every script, yielding transcripts in order
+        """
+        if not self._processes:
+            if self._local is None:
+                self._local = _Worker(self._factory, self._reuse)
+            return map(self._local.play, scripts)
+
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self._processes, _start_worker,
+                (self._factory, self._reuse))
+
+        return self._pool.imap(_play, scripts, self._chunks(scripts))
+
+    def play_all(self, scripts):
+        """
+        list of the transcripts of every script
+        """
+        return list(self.play(scripts))
+
+    def close(self):
+        """
+        stop the processes
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._local = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._pool is not None:
+            # don't wait for work nobody will read
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
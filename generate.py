@@ -0,0 +1,207 @@
+# generate.py
+# build large worlds from a seed, for benchmarks and load tests
+
+import math
+import random
+
+from . import DIRECTIONS
+from .world import World
+from .room import Room
+from .player import Player
+from .item import Item, Container, Key
+
+
+# room layouts
+GRID = "grid"
+GRAPH = "graph"
+
+# direction back along a path
+OPPOSITE = {
+    "north": "south",
+    "south": "north",
+    "east": "west",
+    "west": "east",
+    "up": "down",
+    "down": "up"
+}
+
+# words that names are made of; no digits, so players can type them
+PLACES = ("hall", "cellar", "kitchen", "library", "chapel", "garden",
+    "vault", "attic", "gallery", "study", "armory", "pantry", "crypt",
+    "tower", "courtyard", "stable")
+PLACE_WORDS = ("dusty", "quiet", "grand", "narrow", "damp", "bright",
+    "crooked", "old", "silent", "cold", "hidden", "long")
+THINGS = ("lamp", "coin", "book", "rope", "apple", "candle", "dagger",
+    "scroll", "bottle", "shell", "ring", "feather", "bone", "cup", "map",
+    "stone")
+THING_WORDS = ("red", "silver", "small", "heavy", "cracked", "shiny",
+    "wooden", "golden", "worn", "strange")
+HOLDERS = ("box", "chest", "crate", "bag", "basket", "casket")
+PASSAGES = ("door", "arch", "corridor", "stairway", "gate", "tunnel")
+
+
+def _exit(number):
+    """
+    name of a room's numberth exit beyond the six directions, in letters
+    (ex. "exita", "exitb", ..., "exitba")
+    """
+    letters = ""
+    while True:
+        number, digit = divmod(number, 26)
+        letters = "abcdefghijklmnopqrstuvwxyz"[digit] + letters
+        if not number:
+            return "exit" + letters
+
+
+class WorldGenerator(object):
+    """
+    builds a world from a seed; the same seed and settings always build the
+    same world, entity for entity
+    -layout: GRID (rooms on a square grid, joined to their neighbours) or
+    GRAPH (a random spanning tree plus extra random paths, up to an average
+    of degree paths per room; rooms out of the six directions get named
+    exits)
+    -items: loose items per room
+    -containers: containers per room, each holding items and, down to depth
+    levels, containers of its own
+    -locked: fraction of containers that are locked; each has a key, left
+    in a random room
+    -blocked: fraction of paths that are blocked
+    ex. world = WorldGenerator(seed=7, rooms=10000).build()
+    """
+
+    def __init__(self, seed=0, rooms=1000, layout=GRID, degree=3, items=2,
+        containers=1, depth=2, locked=0.1, blocked=0.05):
+
+        if not layout in (GRID, GRAPH):
+            raise ValueError("{} is not a layout".format(layout))
+        if rooms < 1:
+            raise ValueError("A world needs at least one room")
+
+        self._seed = seed
+        self._rooms = rooms
+        self._layout = layout
+        self._degree = degree
+        self._items = items
+        self._containers = containers
+        self._depth = depth
+        self._locked = locked
+        self._blocked = blocked
+
+    @property
+    def seed(self):
+        return self._seed
+
+    @property
+    def layout(self):
+        return self._layout
+
+    def build(self):
+        """
+        a new world, with the player in its first room
+        """
+        rng = random.Random(self._seed)
+
+        rooms = []
+        for i in range(self._rooms):
+            rooms.append(Room(self._room_name(rng),
+                "Room {} of the world.".format(i)))
+
+        if self._layout == GRID:
+            self._grid(rng, rooms)
+        else:
+            self._graph(rng, rooms)
+
+        keys = []
+        for room in rooms:
+            room.add([self._item(rng) for i in range(self._items)])
+            room.add([self._container(rng, self._depth, keys)
+                for i in range(self._containers)])
+
+        # keys lie in rooms picked after the rooms are filled, so changing
+        # how many keys there are doesn't move anything else around
+        for key in keys:
+            rng.choice(rooms).add(key)
+
+        return World(Player(rooms[0]), rooms)
+
+    def _room_name(self, rng):
+        return "{} {}".format(rng.choice(PLACE_WORDS), rng.choice(PLACES))
+
+    def _join(self, rng, room, direction, destination, back):
+        """
+        paths both ways between two rooms
+        """
+        name = rng.choice(PASSAGES)
+        room.add_path(name, direction, destination,
+            blocked=rng.random() < self._blocked)
+        destination.add_path(name, back, room,
+            blocked=rng.random() < self._blocked)
+
+    def _grid(self, rng, rooms):
+        width = int(math.ceil(math.sqrt(len(rooms))))
+        for i, room in enumerate(rooms):
+            if (i + 1) % width and i + 1 < len(rooms):
+                self._join(rng, room, "east", rooms[i + 1], "west")
+            if i + width < len(rooms):
+                self._join(rng, room, "south", rooms[i + width], "north")
+
+    def _graph(self, rng, rooms):
+        exits = [0] * len(rooms)
+
+        def join(a, b):
+            free = [direction for direction in DIRECTIONS
+                if rooms[a].paths[direction] is None and
+                    rooms[b].paths[OPPOSITE[direction]] is None]
+            if free:
+                direction = rng.choice(free)
+                back = OPPOSITE[direction]
+            else:
+                # out of directions; a named exit each way
+                direction = _exit(exits[a])
+                back = _exit(exits[b])
+                exits[a] += 1
+                exits[b] += 1
+            self._join(rng, rooms[a], direction, rooms[b], back)
+
+        # every room joins one before it, so the graph is connected
+        for i in range(1, len(rooms)):
+            join(rng.randrange(i), i)
+
+        # then extra paths up to the average degree (each join is two)
+        for i in range(max(0, len(rooms) * self._degree // 2 -
+            (len(rooms) - 1))):
+            a = rng.randrange(len(rooms))
+            b = rng.randrange(len(rooms))
+            if not a == b and not rooms[b] in [path.destination
+                for path in rooms[a].paths.values() if path is not None]:
+                join(a, b)
+
+    def _item(self, rng):
+        thing = rng.choice(THINGS)
+        return Item(thing, ("{} {}".format(rng.choice(THING_WORDS), thing),),
+            "A {}.".format(thing), inventory=True)
+
+    def _container(self, rng, depth, keys, nested=False):
+        locked = rng.random() < self._locked
+        items = [self._item(rng) for i in range(self._items)]
+        if depth > 1:
+            items.append(self._container(rng, depth - 1, keys, True))
+
+        container = Container(rng.choice(HOLDERS), (),
+            "A container.", items=items,
+            opened=not locked and rng.random() < 0.5, locked=locked,
+            inventory=nested, containable=nested)
+
+        if locked:
+            keys.append(Key("key", ("{} key".format(container.name),),
+                "A key.", container_to_open=container))
+
+        return container
+
+
+def generate(seed=0, rooms=1000, layout=GRID, **settings):
+    """
+    a world built by a WorldGenerator
+    """
+    return WorldGenerator(seed, rooms, layout, **settings).build()
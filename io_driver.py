@@ -1,13 +1,61 @@
 # io_driver.py
 # bridge between world (game state) and user
 
+import json
+from collections import deque
+
+from .command import Command
+from .event import EventSlot
+from .message import Message, render
+
+
+# parameters that aren't JSON types are written as their text
+_ENCODER = json.JSONEncoder(default=str)
+
 
 class IODriver(object):
     """
     relays input and output between World and user
+    messages are kept as they come (see Message) and rendered into text when
+    output is read; a driver made with render=False hands out the messages
+    themselves, for clients that want data, and never renders them
+    output piles up until it is read; give a capacity to keep at most that
+    many messages, and an overflow policy for what happens past it:
+    -DROP_OLDEST: the oldest unread message makes room for the new one
+    -DROP_NEWEST: the new message is dropped
+    -BACKPRESSURE: feeding input while the output is full raises
+    RuntimeError until it is read; the output of input already fed (and the
+    world's own messages: timers, other players) is kept past the capacity,
+    up to a hard limit (by default LIMIT_FACTOR times the capacity) past
+    which new messages are dropped and on_overflow fires, so a server can
+    let go of a client that stopped reading
+    dropped counts the messages lost to any of them
     """
 
-    def __init__(self, world, kernel):
+    # overflow policies
+    DROP_OLDEST = "drop oldest"
+    DROP_NEWEST = "drop newest"
+    BACKPRESSURE = "backpressure"
+
+    # hard limit on the output kept under BACKPRESSURE, in capacities
+    LIMIT_FACTOR = 4
+
+    # EVENTS
+    # output under BACKPRESSURE reached its hard limit and messages are being
+    # dropped; fires once, then again only after the output has been read
+    on_overflow = EventSlot()
+
+    def __init__(self, world, kernel, render=True, capacity=None,
+        overflow=DROP_OLDEST, limit=None):
+
+        if not overflow in (IODriver.DROP_OLDEST, IODriver.DROP_NEWEST,
+            IODriver.BACKPRESSURE):
+            raise ValueError("{} is not an overflow policy".format(overflow))
+        if capacity is not None and capacity < 1:
+            raise ValueError("Output capacity must be at least 1")
+        if limit is not None and (capacity is None or limit < capacity):
+            raise ValueError("Output limit must be at least the capacity")
+
         # world
         self._world = world
         # listen to echoes from world
@@ -18,8 +66,31 @@ class IODriver(object):
         # listen to echoes from the kernel
         self._kernel.on_echo.subscribe(self.kernel_echo)
 
-        # list of strings emitted by world
-        self._outstream = []
+        # render output into strings when it is read
+        self._render = render
+        # most unread messages kept; None for no limit
+        self._capacity = capacity
+        self._overflow = overflow
+        # most unread messages kept under backpressure; None for no limit
+        if overflow == IODriver.BACKPRESSURE and capacity is not None:
+            self._limit = capacity * IODriver.LIMIT_FACTOR \
+                if limit is None else limit
+        else:
+            self._limit = None
+        # messages (or plain strings) emitted by world and kernel, oldest
+        # first; a full ring drops its oldest message by itself
+        self._outstream = deque(maxlen=capacity
+            if overflow == IODriver.DROP_OLDEST else None)
+
+        self._dropped = 0
+        # inputs refused because the output was full
+        self._refused = 0
+        # messages kept past the capacity under backpressure
+        self._excess = 0
+        # the output hit its limit since it was last read
+        self._overflowing = False
+        # set, so triggering it without subscribers stays cheap
+        self._on_overflow = None
 
     # world property is read only
     @property
@@ -31,40 +102,283 @@ class IODriver(object):
     def kernel(self):
         return self._kernel
 
+    @property
+    def render(self):
+        return self._render
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def overflow(self):
+        return self._overflow
+
+    @property
+    def limit(self):
+        """
+        most unread messages kept under BACKPRESSURE (None otherwise)
+        """
+        return self._limit
+
+    @property
+    def dropped(self):
+        """
+        messages lost because the output was full (with BACKPRESSURE, only
+        past the limit)
+        """
+        return self._dropped
+
+    @property
+    def excess(self):
+        """
+        messages kept past the capacity (BACKPRESSURE only)
+        """
+        return self._excess
+
+    @property
+    def refused(self):
+        """
+        inputs refused because the output was full (BACKPRESSURE only)
+        """
+        return self._refused
+
+    @property
+    def pending(self):
+        """
+        number of unread messages
+        """
+        return len(self._outstream)
+
+    @property
+    def full(self):
+        return self._capacity is not None and \
+            len(self._outstream) >= self._capacity
+
     @property
     def output(self):
-        output = self._outstream[:]
+        """
+        output since it was last read, rendered unless render is off
+        """
+        if self._render:
+            return [render(msg) for msg in self.messages]
+
+        return self.messages
+
+    @property
+    def messages(self):
+        """
+        output since it was last read, as emitted (never rendered)
+        """
+        output = list(self._outstream)
         # flush output after it has been accessed
         self.flush_output()
         return output
 
+    def drain(self, render_output=None):
+        """
+        hand out unread output one message at a time, oldest first, without
+        copying it; rendered if render_output is true (by default, if the
+        driver renders)
+        messages emitted while draining are handed out too, and whatever is
+        left when the caller stops stays unread
+        """
+        if render_output is None:
+            render_output = self._render
+
+        outstream = self._outstream
+        while outstream:
+            msg = outstream.popleft()
+            self._overflowing = False
+            yield render(msg) if render_output else msg
+
+    def __iter__(self):
+        return self.drain()
+
+    def _push(self, msg):
+        outstream = self._outstream
+        if self._capacity is not None and len(outstream) >= self._capacity:
+            if self._overflow == IODriver.DROP_NEWEST:
+                self._dropped += 1
+                return
+            # the ring drops the oldest message as this one is added;
+            # backpressure keeps it, and holds back input instead (feed()),
+            # up to the limit
+            if self._overflow == IODriver.DROP_OLDEST:
+                self._dropped += 1
+            elif len(outstream) >= self._limit:
+                self._dropped += 1
+                if not self._overflowing:
+                    self._overflowing = True
+                    if self._on_overflow is not None:
+                        self._on_overflow.trigger()
+                return
+            else:
+                self._excess += 1
+        outstream.append(msg)
+
     def world_echo(self, msg):
         """
         capture messages from world into output stream
         """
-        self._outstream.append(msg)
+        self._push(msg)
 
     def kernel_echo(self, msg):
         """
         capture messages from command kernel
         """
-        self._outstream.append(msg)
+        self._push(msg)
 
     def flush_output(self):
         """
         flush output stream
         """
-        self._outstream = []
+        self._outstream.clear()
+        self._overflowing = False
+
+    def feed(self, input_str, cache=None):
+        """
+        feed input into world, leaving the output to be read
+        returns true if a command matched it (see CommandKernel.input)
+        """
+        if self._overflow == IODriver.BACKPRESSURE and self.full:
+            self._refused += 1
+            raise RuntimeError("Output is full; read it before feeding "
+                "more input")
+        return self._kernel.input(self._world, input_str, cache)
 
     def process(self, input_str):
         """
         feed input into world and return output
         """
-        self._kernel.input(self._world, input_str)
-        output = self._outstream[:]
-        self.flush_output()
+        self.feed(input_str)
+        return self.output
 
-        return output
+    def process_many(self, lines, stop_unmatched=False, split=True):
+        """
+        feed a script of inputs in one call, preprocessing (and with
+        compiled dispatch, matching) each distinct input only once (see
+        CommandKernel.input_many)
+        -split: return a list of outputs, one per line fed
+        -otherwise: return (output, starts), all the output in one list and
+        the index in it where each line's output starts
+        output not read before the call goes with the first line
+        with stop_unmatched, feeding stops after the first line no command
+        matches; fewer outputs than lines come back
+        """
+        outstream = self._outstream
+        render_output = self._render
+        cache = {}
+        # every line's output goes into one list, split at the end, so the
+        # loop doesn't leave a trail of small lists for the collector
+        output = []
+        starts = []
+
+        for line in lines:
+            matched = self.feed(line, cache)
+
+            starts.append(len(output))
+            if render_output:
+                for msg in outstream:
+                    output.append(render(msg))
+            else:
+                output.extend(outstream)
+            outstream.clear()
+            self._overflowing = False
+
+            if stop_unmatched and not matched:
+                break
+
+        if not split:
+            return output, starts
+
+        ends = starts[1:]
+        ends.append(len(output))
+        return [output[start:end] for start, end in zip(starts, ends)]
+
+
+class JSONLinesAdapter(object):
+    """
+    output of an IO driver as JSON lines, one per message, for machine
+    clients; a line holds the template key, the kind and id of the source
+    (catalog kind and id for world entities, "command" and its name for
+    commands, "kernel" and null for the kernel) and the template's
+    parameters, but no text unless asked for
+    ex. {"key": "TAKE", "kind": "player", "source": 0, "params": {...}}
+    plain string messages only have their text
+    a driver on a PlayerView uses the shared world's catalog, so every
+    player's client sees the same ids
+    """
+
+    def __init__(self, driver, text=False):
+        self._driver = driver
+        # include the rendered text in every line
+        self._text = text
+
+    @property
+    def driver(self):
+        return self._driver
+
+    def source(self, entity):
+        """
+        kind and id of a message source; (None, None) if it has neither
+        """
+        if entity is self._driver.kernel:
+            return "kernel", None
+        if isinstance(entity, Command):
+            return "command", entity.name
+
+        catalog = self._driver.world.catalog
+        kind = catalog.kind(entity)
+        if kind is None:
+            return None, None
+
+        return kind, catalog.id(entity)
+
+    def encode(self, msg):
+        """
+        one message as a JSON line (without the newline)
+        """
+        if not isinstance(msg, Message):
+            return _ENCODER.encode({"text": msg})
+
+        kind, source = self.source(msg.source)
+        record = {"key": msg.key, "kind": kind, "source": source,
+            "params": msg.params}
+        if self._text:
+            record["text"] = msg.render()
+
+        return _ENCODER.encode(record)
+
+    @property
+    def output(self):
+        """
+        lines for the driver's output since it was last read
+        """
+        return [self.encode(msg) for msg in self._driver.messages]
+
+    def process(self, input_str):
+        """
+        feed input into world and return the output as lines
+        """
+        self._driver.feed(input_str)
+        return self.output
+
+    def drain(self):
+        """
+        lines for the driver's unread output, one at a time (see
+        IODriver.drain)
+        """
+        for msg in self._driver.drain(False):
+            yield self.encode(msg)
+
+    def write(self, stream):
+        """
+        write the driver's pending output to a text stream
+        """
+        for line in self.drain():
+            stream.write(line)
+            stream.write("\n")
 
 
 
@@ -1,31 +1,50 @@
 # item.py
 # objects that reside in a room
 
-from .event import Event
+from .event import EventSlot
 from .echo import EchoMixin
 from .text_template import TextTemplateMixin
+from . import enumerate_items
+from .collection import ItemCollection, holder_world
+from .bus import ITEM
+
+
+# built-in actions of each item class, merged along its mro
+_ACTIONS = {}
 
 
 class AbstractItem(EchoMixin):
     """
     base class for item
     doesn't contain any properties or event hooks
+    items are numerous, so they keep their attributes in slots; subclasses
+    without __slots__ of their own get a __dict__ as usual
     """
 
+    __slots__ = ("_name", "description", "synonyms", "_actions", "_on_echo")
+
+    # built-in actions of the class: action name -> name of the method doing
+    # it; shared by every item rather than stored in each (see get_action())
+    ACTIONS = {}
+
     def __init__(self, name, synonyms=(), description=""):
         super(AbstractItem, self).__init__()
+        # an unset slot is slow to find missing; echo() looks at this a lot
+        self._on_echo = None
 
         # this must be unique to the room
         self._name = name
         self.description = description
         # other names that the item can be called
         # these must also be unique to the room
+        # set them before the item is added anywhere; holders index them
         self.synonyms = synonyms
         # set of custom actions that the player can do to the item
         # the key in the action dict is the keyword of the action
         # and the value is a tuple containing the method to call (val[0])
-        # and its arguments (val[1])
-        self._actions = {}
+        # and its arguments (val[1]), or None for a removed built-in action
+        # None until the item gets custom actions
+        self._actions = None
 
     # name property is read only
     @property
@@ -43,6 +62,8 @@ class AbstractItem(EchoMixin):
         add/replace a custom action to the item
         """
         if hasattr(action_method, "__call__"):
+            if self._actions is None:
+                self._actions = {}
             self._actions[action_name] = (action_method, action_args)
         else:
             raise TypeError("Action method is not callable")
@@ -51,21 +72,45 @@ class AbstractItem(EchoMixin):
         """
         remove a custom action
         """
-        if action_name in self._actions:
-            self._actions.pop(action_name, None)
-        else:
+        if self.get_action(action_name) is None:
             raise ValueError("{action} is not an action of this item".format(
                 action=action_name))
 
+        if self._actions is None:
+            self._actions = {}
+        # built-in actions are shadowed rather than removed
+        if action_name in self._class_actions():
+            self._actions[action_name] = None
+        else:
+            del self._actions[action_name]
+
+    @classmethod
+    def _class_actions(cls):
+        """
+        built-in actions of the class and its bases
+        """
+        actions = _ACTIONS.get(cls)
+        if actions is None:
+            actions = {}
+            for base in reversed(cls.__mro__):
+                actions.update(base.__dict__.get("ACTIONS", {}))
+            _ACTIONS[cls] = actions
+
+        return actions
+
     def get_action(self, action_name):
         """
         retrieve an action by its name
         """
-        if action_name in self._actions:
+        if self._actions is not None and action_name in self._actions:
             return self._actions[action_name]
-        else:
+
+        method_name = self._class_actions().get(action_name)
+        if method_name is None:
             return None
 
+        return (getattr(self, method_name), {})
+
 
 class Item(AbstractItem, TextTemplateMixin):
     """
@@ -85,6 +130,28 @@ class Item(AbstractItem, TextTemplateMixin):
         "DESCRIPTION": "{description}"
     }
 
+    __slots__ = ("_inventory", "_containable", "_container", "_parent",
+        "_text", "_on_look", "_on_use")
+
+    # the player can look at and use any item
+    ACTIONS = {
+        "look": "look",
+        "use": "use"
+    }
+
+    # EVENTS
+    # player looked at this item
+    on_look = EventSlot()
+    # this is a dummy action; have subclasses override it
+    # or have callbacks to it
+    on_use = EventSlot()
+
+    CONTEXT = {
+        "name": lambda item: item.name,
+        "description": lambda item: item.description,
+        "room": lambda item: item.location().name
+    }
+
     def __init__(self, name, synonyms=(), description="", inventory=False,
         containable=True, container=False, text={}):
 
@@ -95,23 +162,14 @@ class Item(AbstractItem, TextTemplateMixin):
         self._containable = containable
         self._container = container
 
-        self._owner = None # the container the item is in
-        self._room = None
-        self._player = None # the player whose inventory the item is in
+        # the room, player or container the item is directly in
+        # the items form a tree under the rooms and players holding them
+        self._parent = None
 
         # update text templates
         self.update_text(Item.TEXT)
         self.update_text(text)
 
-        # EVENTS
-        # player looked at this item
-        self.add_action("look", self.look)
-        self.on_look = Event()
-        # this is a dummy action; have subclasses override it
-        # or have callbacks to it
-        self.add_action("use", self.use)
-        self.on_use = Event()
-
     @property
     def inventory(self):
         return self._inventory
@@ -124,84 +182,111 @@ class Item(AbstractItem, TextTemplateMixin):
     def container(self):
         return self._container
 
+    # parent property is read-only; rooms, players and containers set it
     @property
-    def owner(self):
-        return self._owner
-
-    @owner.setter
-    def owner(self, new_owner):
-        self._owner = new_owner
-        if new_owner is not None:
-            self.player = new_owner.player
-            self.room = new_owner.room
+    def parent(self):
+        """
+        the room, player or container directly holding the item
+        """
+        return self._parent
 
     @property
-    def room(self):
-        return self._room
+    def owner(self):
+        """
+        the container the item is in, if any
+        """
+        parent = self._parent
+        if parent is not None and parent.HOLDER == "container":
+            return parent
+        return None
 
-    @room.setter
-    def room(self, new_room):
+    def holder(self):
         """
-        set the room the item is in
+        the room or player holding the item, directly or through containers
         """
-        # unsubscribe current room
-        if self._room is not None:
-            self.on_echo.unsubscribe(self._room.object_echo)
+        holder = self._parent
+        while holder is not None and holder.HOLDER == "container":
+            holder = holder._parent
+        return holder
 
-        # subscribe new room
-        self._room = new_room
-        # only if it's actually a room, though
-        if new_room is not None:
-            self.on_echo.subscribe(self._room.object_echo)
+    @property
+    def room(self):
+        holder = self.holder()
+        if holder is not None and holder.HOLDER == "room":
+            return holder
+        return None
 
     @property
     def player(self):
-        return self._player
-
-    @player.setter
-    def player(self, new_player):
         """
-        set player who possesses the item
+        the player whose inventory the item is in
         """
-        # unsubscribe current player
-        if self._player is not None:
-            self.on_echo.unsubscribe(self._player.object_echo)
-
-        # subscribe new player
-        self._player = new_player
-        # only if it's actually a player, though
-        if new_player is not None:
-            self.on_echo.subscribe(self._player.object_echo)
-
-    def context(self, **extra):
-        context = super(Item, self).context(**extra)
-
-        if self._room is None:
-            room = self._player.location.name
-        else:
-            room = self._room.name
-
-        context.update({
-            "name": self._name,
-            "description": self.description,
-            "room": room
-        })
+        holder = self.holder()
+        if holder is not None and holder.HOLDER == "player":
+            return holder
+        return None
 
-        return context
+    def _move(self, parent, collection=None):
+        """
+        move the item, along with anything inside it, to a new parent
+        its contents keep it as their parent, and their room and player
+        follow from it, so only the two parents' collections change; the
+        contents are only reindexed when the item moves between worlds (see
+        AbstractWorld.names)
+        """
+        old_parent = self._parent
+        if old_parent is not None:
+            old_parent._release(self)
+        self._parent = parent
+        if collection is not None:
+            collection.add(self)
+
+        old_world = holder_world(old_parent)
+        new_world = holder_world(parent)
+        if not old_world is new_world:
+            if old_world is not None:
+                old_world.unindex_items((self,))
+            if new_world is not None:
+                new_world.index_items((self,))
+
+    def location(self):
+        """
+        room the item is in, or that the player carrying it is in
+        """
+        holder = self.holder()
+        if holder is not None and holder.HOLDER == "player":
+            return holder.location
+        return holder
+
+    def echo(self, msg):
+        """
+        send to the item's subscribers, then to whichever room or player
+        holds it now (found when the message is sent, so moving the item
+        never has to rewire anything): straight to the sinks through the
+        world's bus, or through the holder when it isn't in a world
+        """
+        super(Item, self).echo(msg)
+        holder = self.holder()
+        if holder is not None:
+            bus = holder.bus
+            if bus is None:
+                holder.object_echo(msg)
+            else:
+                bus.publish(ITEM, self, msg)
 
     def look(self):
         """
         player looked at item
         """
         # print description
-        self.echo(self.text("DESCRIPTION"))
+        self.echo(self.message("DESCRIPTION"))
         self.on_look.trigger()
 
     def use(self):
         """
         use the item
         """
-        self.echo(self.text("USE", item=self.name))
+        self.echo(self.message("USE", item=self.name))
         self.on_use.trigger()
 
 
@@ -210,6 +295,9 @@ class Container(Item):
     items that contain other items
     """
 
+    # what kind of parent the container is to its items
+    HOLDER = "container"
+
     TEXT = {
         "OPENED": "The {name} is open.",
         "CLOSED": "The {name} is closed.",
@@ -236,6 +324,36 @@ class Container(Item):
         "ALREADY_REMOVED": "The {item} is not in the {name}."
     }
 
+    __slots__ = ("_items", "_locked", "_opened", "_version", "_on_open",
+        "_on_close", "_on_unlock", "_on_lock", "_on_add_item",
+        "_on_remove_item")
+
+    ACTIONS = {
+        "open": "open",
+        "close": "close"
+    }
+
+    # EVENTS
+    # player opened this container
+    on_open = EventSlot()
+    # player closed this container
+    on_close = EventSlot()
+    # lock/unlock events are not actions because we don't want the player
+    # to be able to manually lock/unlock containers
+    # container was unlocked
+    on_unlock = EventSlot()
+    # container was locked
+    on_lock = EventSlot()
+    # item added to container
+    on_add_item = EventSlot()
+    # item removed from container
+    on_remove_item = EventSlot()
+
+    CONTEXT = {
+        "items": lambda container: enumerate_items(
+            [item.name for item in container.items])
+    }
+
     def __init__(self, name, synonyms=(), description="", items=[],
         opened=False, locked=False, inventory=False, containable=False,
         text={}):
@@ -245,7 +363,12 @@ class Container(Item):
         super(Container, self).__init__(name, synonyms, description,
             inventory=inventory, containable=False, container=True)
 
-        self._items = []
+        # bumped whenever the container changes: opened, closed, locked,
+        # unlocked, or its contents
+        self._version = 0
+
+        # contents in the order they were added, indexed by name and synonym
+        self._items = ItemCollection(holder=self)
         self._insert(items)
         self._locked = locked
         self._opened = False if locked else opened
@@ -254,73 +377,28 @@ class Container(Item):
         self.update_text(Container.TEXT)
         self.update_text(text)
 
-        # EVENTS
-        # player opened this container
-        self.add_action("open", self.open)
-        self.on_open = Event()
-        # player closed this container
-        self.add_action("close", self.close)
-        self.on_close = Event()
-        # lock/unlock events are not actions because we don't want the player
-        # to be able to manually lock/unlock containers
-        # container was unlocked
-        self.on_unlock = Event()
-        # container was locked
-        self.on_lock = Event()
-        # item added to container
-        self.on_add_item = Event()
-        # item removed from container
-        self.on_remove_item = Event()
-
     @property
     def items(self):
         return self._items
 
+    # index property is read-only
     @property
-    def room(self):
-        return self._room
+    def index(self):
+        return self._items.index
 
-    @room.setter
-    def room(self, new_room):
+    def _adopt(self, item):
         """
-        set the room the item is in
+        put an item directly in the container, wherever it was before
         """
-        # unsubscribe current room
-        if self._room is not None:
-            self.on_echo.unsubscribe(self._room.object_echo)
-
-        # subscribe new room
-        self._room = new_room
-        # only if it's actually a room, though
-        if new_room is not None:
-            self.on_echo.subscribe(self._room.object_echo)
+        item._move(self, self._items)
+        self._version += 1
 
-        # do the same for all the items in the container
-        for item in self._items:
-            item.room = new_room
-
-    @property
-    def player(self):
-        return self._player
-
-    @player.setter
-    def player(self, new_player):
+    def _release(self, item):
         """
-        set player who possesses the item
+        drop an item from the contents; the item sets its new parent
         """
-        # unsubscribe current player
-        if self._player is not None:
-            self.on_echo.unsubscribe(self._player.object_echo)
-
-        # subscribe new player
-        self._player = new_player
-        # only if it's actually a player, though
-        if new_player is not None:
-            self.on_echo.subscribe(self._player.object_echo)
-
-        # do the same for all the items in the container
-        for item in self._items:
-            item.player = new_player
+        self._items.remove(item)
+        self._version += 1
 
     # opened is read-only
     @property
@@ -331,27 +409,9 @@ class Container(Item):
     def locked(self):
         return self._locked
 
-    def context(self, **extra):
-        context = super(Container, self).context(**extra)
-
-        items_str = ""
-
-        # multiple items in container
-        if len(self._items) > 1:
-            for item in self._items[:-2]:
-                items_str += "{}, ".format(item.name)
-
-            items_str += "{} ".format(self._items[-2].name)
-            items_str += "and {}".format(self._items[-1].name)
-        # one item
-        elif len(self._items) == 1:
-            items_str += self._items[0].name
-
-        context.update({
-            "items": items_str
-        })
-
-        return context
+    @property
+    def version(self):
+        return self._version
 
     def look(self, describe_self=True, describe_items=True):
         """
@@ -361,9 +421,9 @@ class Container(Item):
         if describe_self:
             self.echo(self.description)
             if self._opened:
-                self.echo(self.text("OPENED"))
+                self.echo(self.message("OPENED"))
             else:
-                self.echo(self.text("CLOSED"))
+                self.echo(self.message("CLOSED"))
 
         # print items in the container if it is open
         if describe_items and self._opened:
@@ -371,13 +431,13 @@ class Container(Item):
 
             # multiple items in container
             if len(self._items) > 1:
-                self.echo(self.text("LOOK_ITEMS"))
+                self.echo(self.message("LOOK_ITEMS"))
             # one item
             elif len(self._items) == 1:
-                self.echo(self.text("LOOK_ITEMS"))
+                self.echo(self.message("LOOK_ITEMS"))
             # no items
             else:
-                self.echo(self.text("LOOK_EMPTY"))
+                self.echo(self.message("LOOK_EMPTY"))
 
         # send trigger
         self.on_look.trigger()
@@ -389,15 +449,16 @@ class Container(Item):
         if not self._opened:
             if not self._locked:
                 self._opened = True
-                self.echo(self.text("OPEN"))
+                self._version += 1
+                self.echo(self.message("OPEN"))
                 # you look inside the container when you open it
                 # don't describe the container again, though
                 self.look(describe_self=False)
                 self.on_open.trigger()
             else:
-                self.echo(self.text("OPEN_LOCKED"))
+                self.echo(self.message("OPEN_LOCKED"))
         else:
-            self.echo(self.text("ALREADY_OPEN"))
+            self.echo(self.message("ALREADY_OPEN"))
 
     def close(self):
         """
@@ -405,10 +466,11 @@ class Container(Item):
         """
         if self._opened:
             self._opened = False
-            self.echo(self.text("CLOSE"))
+            self._version += 1
+            self.echo(self.message("CLOSE"))
             self.on_close.trigger()
         else:
-            self.echo(self.text("ALREADY_CLOSED"))
+            self.echo(self.message("ALREADY_CLOSED"))
 
     def unlock(self):
         """
@@ -416,12 +478,13 @@ class Container(Item):
         """
         if self._locked:
             self._locked = False
-            self.echo(self.text("UNLOCK"))
+            self._version += 1
+            self.echo(self.message("UNLOCK"))
             self.on_unlock.trigger()
             # open the container too
             self.open()
         else:
-            self.echo(self.text("ALREADY_UNLOCKED"))
+            self.echo(self.message("ALREADY_UNLOCKED"))
 
     def lock(self):
         """
@@ -433,38 +496,39 @@ class Container(Item):
                 self.close()
 
             self._locked = True
-            self.echo(self.text("LOCK"))
+            self._version += 1
+            self.echo(self.message("LOCK"))
             self.on_lock.trigger()
         else:
-            self.echo(self.text("ALREADY_LOCKED"))
+            self.echo(self.message("ALREADY_LOCKED"))
 
     def add(self, item):
         """
         add item to container
         """
         if item.owner is not None:
-            self.echo(self.text("ADD_CONTAINED", item=item.name,
+            self.echo(self.message("ADD_CONTAINED", item=item.name,
                 container=item.owner.name))
             return
 
         if item in self._items:
-            self.echo(self.text("ALREADY_ADDED", item=item.name))
+            self.echo(self.message("ALREADY_ADDED", item=item.name))
             return
 
         if not item._containable:
-            self.echo(self.text("ADD_NOT_CONTAINABLE", item=item.name))
+            self.echo(self.message("ADD_NOT_CONTAINABLE", item=item.name))
             return
 
         if self._locked:
-            self.echo(self.text("ADD_LOCKED", item=item.name))
+            self.echo(self.message("ADD_LOCKED", item=item.name))
             return
         
         if not self._opened:
-            self.echo(self.text("CLOSED"))
+            self.echo(self.message("CLOSED"))
             return
 
         self._insert(item)
-        self.echo(self.text("ADD", item=item.name))
+        self.echo(self.message("ADD", item=item.name))
         self.on_add_item.trigger()
 
     def _insert(self, items):
@@ -477,55 +541,45 @@ class Container(Item):
 
         for item in items:
             if not item in self._items:
-                # move item to the container's room, if it isn't
-                if item.room is None and self.room is not None:
-                    item.player._erase(item)
-                    self.room.add(item)
-                # move item to the player inventory, if it isn't
-                elif item.player is None and self.player is not None:
-                    item.room.remove(item)
-                    self.player._insert(item)
-
-                item.owner = self
-                self._items.append(item)
+                # the item ends up wherever the container is
+                self._adopt(item)
 
     def remove(self, item):
         """
         remove item from container
         """
         if not item in self._items:
-            self.echo(self.text("ALREADY_REMOVED", item=item.name))
+            self.echo(self.message("ALREADY_REMOVED", item=item.name))
             return
 
         if self._locked:
-            self.echo(self.text("REMOVE_LOCKED", item=item.name))
+            self.echo(self.message("REMOVE_LOCKED", item=item.name))
             return
 
         if not self._opened:
-            self.echo(self.text("CLOSED"))
+            self.echo(self.message("CLOSED"))
             return
  
         self._erase(item)
-        self.echo(self.text("REMOVE", item=item.name))
+        self.echo(self.message("REMOVE", item=item.name))
         self.on_remove_item.trigger()
 
     def _erase(self, item):
         """
         like the remove() counterpart of insert()
+        the item is left where the container is (in its room or inventory)
         """
         if item in self._items:
-            item.owner = None
-            self._items.remove(item)
+            if self._parent is None:
+                item._move(None)
+            else:
+                self._parent._adopt(item)
 
     def get(self, item_name):
         """
-        get item by name
+        get item by name or synonym
         """
-        for item in self._items:
-            if item.name == item_name:
-                return item
-
-        return None
+        return self._items.find(item_name)
 
 
 class Key(Item):
@@ -538,6 +592,8 @@ class Key(Item):
         "CONTAINER_NOT_IN_ROOM": "{name} doesn't open anything in the {room}."
     }
 
+    __slots__ = ("_container_to_open",)
+
     def __init__(self, name, synonyms=(), description="",
         container_to_open=None, inventory=True, containable=True,
         container=False, text={}):
@@ -565,7 +621,7 @@ class Key(Item):
 
     def use(self):
         if self._container_to_open is None:
-            self.echo(self.text("NO_CONTAINER_TO_OPEN"))
+            self.echo(self.message("NO_CONTAINER_TO_OPEN"))
 
         # key must be in the same room or in player's inventory to be used
         elif not self.room == self._container_to_open.room and \
@@ -576,7 +632,7 @@ class Key(Item):
             else:
                 item_room = self.player.location.name
 
-            self.echo(self.text("CONTAINER_NOT_IN_ROOM"))
+            self.echo(self.message("CONTAINER_NOT_IN_ROOM"))
 
         else:
             self._container_to_open.unlock()
@@ -0,0 +1,451 @@
+# journal.py
+# write-ahead journal of world state changes, folded into checkpoints
+
+import os
+import struct
+import threading
+import zlib
+from functools import partial
+
+from .snapshot import Snapshot, OPENED, LOCKED
+
+
+# one change: operation, holder kind, and two ids (their meaning depends on
+# the operation; see Journal._replay)
+RECORD = struct.Struct("<BBii")
+# batches are written as their length and crc32, then their records
+BATCH = struct.Struct("<II")
+# a journal file starts with its sequence number; a checkpoint, with that
+# of the last journal folded into it (journals up to it are in it already)
+SEQUENCE = struct.Struct("<Q")
+
+# operations
+ADD = 1
+REMOVE = 2
+CLEAR = 3
+FLAGS = 4
+BLOCK = 5
+LOCATION = 6
+
+# holder kinds
+ROOM = 0
+PLAYER = 1
+CONTAINER = 2
+
+
+def _read_journal(path):
+    """
+    sequence number and records of a journal file, skipping a torn or
+    corrupt tail; (None, []) if there is no such file (or not even its
+    sequence number made it to disk)
+    """
+    records = []
+    if not os.path.exists(path):
+        return None, records
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < SEQUENCE.size:
+        return None, records
+    (sequence,) = SEQUENCE.unpack_from(data)
+
+    offset = SEQUENCE.size
+    while offset + BATCH.size <= len(data):
+        length, checksum = BATCH.unpack_from(data, offset)
+        payload = data[offset + BATCH.size:offset + BATCH.size + length]
+        # the process died while writing this batch; nothing after it counts
+        if not len(payload) == length or \
+            not zlib.crc32(payload) == checksum:
+            break
+
+        records.extend(RECORD.iter_unpack(payload))
+        offset += BATCH.size + length
+
+    return sequence, records
+
+
+def _read_checkpoint(path):
+    """
+    sequence number of the last journal folded into a checkpoint, and the
+    snapshot it holds
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    (folded,) = SEQUENCE.unpack_from(data)
+    return folded, Snapshot.from_bytes(data[SEQUENCE.size:])
+
+
+def _write_atomic(path, data, fsync):
+    """
+    replace a file with new contents so readers see the old or the new
+    """
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+class Journal(object):
+    """
+    records every change to a world's state as it happens
+    -changes are buffered and appended to the journal file in batches
+    -a background thread periodically folds the journal into the checkpoint
+    (a snapshot file), so recovering never replays more than about one
+    interval's worth of changes
+    -recover() rebuilds a world from the checkpoint and the journal tail
+    -journal files are numbered, and a checkpoint says up to which one it
+    holds, so a journal folded into the checkpoint but not yet removed (the
+    process died in between) is never replayed twice
+    changes made behind the world's back (ex. Snapshot.apply) aren't seen;
+    call checkpoint() after them
+    """
+
+    CHECKPOINT = "checkpoint"
+    JOURNAL = "journal"
+    # journal being folded into the checkpoint
+    FOLDING = "journal.fold"
+
+    def __init__(self, world, directory, batch_size=256, interval=5.0,
+        fsync=False):
+
+        self._world = world
+        self._directory = directory
+        # records buffered before they are appended to the journal
+        self._batch_size = batch_size
+        # seconds between compactions; None to only compact by hand
+        self._interval = interval
+        # fsync journal batches and checkpoints (survive power loss)
+        self._fsync = fsync
+
+        self._buffer = []
+        self._file = None
+        # sequence number of the journal file being written
+        self._sequence = 0
+        # guards the buffer, the journal file and checkpoint replacement
+        self._lock = threading.RLock()
+        # bumped whenever the live world is checkpointed, which makes any
+        # fold started before it obsolete
+        self._generation = 0
+
+        # subscriptions, as (event, callback) pairs, for close()
+        self._subscriptions = []
+        # entities being watched
+        self._watched = set()
+
+        self._thread = None
+        self._stop = threading.Event()
+
+        self._records = 0
+        self._batches = 0
+        self._compactions = 0
+
+    @property
+    def records(self):
+        return self._records
+
+    @property
+    def batches(self):
+        return self._batches
+
+    @property
+    def compactions(self):
+        return self._compactions
+
+    def _path(self, name):
+        return os.path.join(self._directory, name)
+
+    def start(self):
+        """
+        checkpoint the world as it is now and start journaling its changes
+        """
+        if self._file is not None:
+            raise RuntimeError("Journal is already started")
+
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+
+        # number on from whatever an earlier run left behind, so none of
+        # its journals pass for newer than the first checkpoint
+        sequences = [_read_journal(self._path(name))[0]
+            for name in (Journal.FOLDING, Journal.JOURNAL)]
+        if os.path.exists(self._path(Journal.CHECKPOINT)):
+            sequences.append(
+                _read_checkpoint(self._path(Journal.CHECKPOINT))[0])
+        self._sequence = max([sequence for sequence in sequences
+            if sequence is not None] + [0])
+
+        self.checkpoint()
+
+        if self._interval is not None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run,
+                name="journal compaction")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def close(self):
+        """
+        stop journaling; everything recorded so far is written out
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+        for event, callback in self._subscriptions:
+            event.unsubscribe(callback)
+        self._subscriptions = []
+        self._watched = set()
+
+    def _subscribe(self, event, callback):
+        event.subscribe(callback)
+        self._subscriptions.append((event, callback))
+
+    def _watch(self):
+        """
+        subscribe to the entities in the catalog that aren't watched yet
+        """
+        catalog = self._world.catalog
+
+        for room_id, room in enumerate(catalog.rooms):
+            if not room in self._watched:
+                self._watched.add(room)
+                self._watch_collection(room.items, ROOM, room_id)
+
+        for path_id, path in enumerate(catalog.paths):
+            if not path in self._watched:
+                self._watched.add(path)
+                self._subscribe(path.on_block,
+                    partial(self._record, BLOCK, 0, path_id, 1))
+                self._subscribe(path.on_unblock,
+                    partial(self._record, BLOCK, 0, path_id, 0))
+
+        for item_id, item in enumerate(catalog.items):
+            if item.container and not item in self._watched:
+                self._watched.add(item)
+                self._watch_collection(item.items, CONTAINER, item_id)
+                flags = partial(self._flags, item, item_id)
+                for event in (item.on_open, item.on_close, item.on_lock,
+                    item.on_unlock):
+                    self._subscribe(event, flags)
+
+        for player_id, player in enumerate(catalog.players):
+            if not player in self._watched:
+                self._watched.add(player)
+                self._watch_collection(player.inventory, PLAYER, player_id)
+                self._subscribe(player.on_relocate,
+                    partial(self._location, player_id))
+
+    def _watch_collection(self, collection, kind, holder_id):
+        self._subscribe(collection.on_add,
+            partial(self._item, ADD, kind, holder_id))
+        self._subscribe(collection.on_remove,
+            partial(self._item, REMOVE, kind, holder_id))
+        self._subscribe(collection.on_clear,
+            partial(self._record, CLEAR, kind, holder_id, 0))
+
+    def _item(self, op, kind, holder_id, item):
+        item_id = self._world.catalog.ids.get(item)
+        if item_id is None:
+            # the item is new to the world; the checkpoint will include it
+            self.checkpoint()
+        else:
+            self._record(op, kind, holder_id, item_id)
+
+    def _flags(self, container, container_id):
+        self._record(FLAGS, CONTAINER, container_id,
+            (OPENED if container.opened else 0) |
+            (LOCKED if container.locked else 0))
+
+    def _location(self, player_id, old_location, new_location):
+        if new_location is None:
+            self._record(LOCATION, PLAYER, player_id, -1)
+            return
+
+        room_id = self._world.catalog.ids.get(new_location)
+        if room_id is None:
+            self.checkpoint()
+        else:
+            self._record(LOCATION, PLAYER, player_id, room_id)
+
+    def _record(self, op, kind, a, b, *args):
+        """
+        buffer a change, writing the batch out once it is full
+        (extra arguments from the event being recorded are ignored)
+        """
+        with self._lock:
+            self._buffer.append(RECORD.pack(op, kind, a, b))
+            self._records += 1
+            if len(self._buffer) >= self._batch_size:
+                self._flush()
+
+    def flush(self):
+        """
+        write buffered changes to the journal
+        """
+        with self._lock:
+            self._flush()
+
+    def _open(self, sequence):
+        """
+        start a fresh journal file
+        """
+        if self._file is not None:
+            self._file.close()
+
+        self._file = open(self._path(Journal.JOURNAL), "wb")
+        self._file.write(SEQUENCE.pack(sequence))
+        self._file.flush()
+        if self._fsync:
+            os.fsync(self._file.fileno())
+        self._sequence = sequence
+
+    def _flush(self):
+        if not self._buffer or self._file is None:
+            return
+
+        payload = b"".join(self._buffer)
+        self._buffer = []
+        self._file.write(BATCH.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+        self._file.flush()
+        if self._fsync:
+            os.fsync(self._file.fileno())
+        self._batches += 1
+
+    def checkpoint(self):
+        """
+        write a full snapshot of the live world and empty the journal
+        call this from the thread that changes the world
+        """
+        with self._lock:
+            catalog = self._world.catalog
+            catalog.refresh()
+            self._watch()
+
+            # the checkpoint holds everything journaled so far
+            _write_atomic(self._path(Journal.CHECKPOINT),
+                SEQUENCE.pack(self._sequence) +
+                Snapshot.capture(self._world).to_bytes(), self._fsync)
+
+            self._buffer = []
+            self._open(self._sequence + 1)
+            if os.path.exists(self._path(Journal.FOLDING)):
+                os.remove(self._path(Journal.FOLDING))
+            self._generation += 1
+
+    def compact(self):
+        """
+        fold the journal into the checkpoint without touching the live world
+        safe to call from any thread
+        """
+        with self._lock:
+            self._flush()
+            generation = self._generation
+
+            # set the journal aside; new changes go to a fresh one
+            # (a journal left aside by an earlier failed fold is folded first)
+            journal = self._path(Journal.JOURNAL)
+            folding = self._path(Journal.FOLDING)
+            if not os.path.exists(folding):
+                if self._file is None or \
+                    self._file.tell() <= SEQUENCE.size:
+                    return
+                self._file.close()
+                self._file = None
+                os.replace(journal, folding)
+                self._open(self._sequence + 1)
+
+        # a checkpoint of the live world replacing the file meanwhile makes
+        # this fold stale, which is checked before it is written back
+        folded, snapshot = _read_checkpoint(self._path(Journal.CHECKPOINT))
+        sequence, records = _read_journal(folding)
+        # a fold that got as far as replacing the checkpoint only has the
+        # journal left to remove
+        if sequence is not None and sequence > folded:
+            Journal._replay(snapshot, records)
+            folded = sequence
+        data = SEQUENCE.pack(folded) + snapshot.to_bytes()
+
+        with self._lock:
+            # the live world was checkpointed meanwhile; this fold is stale
+            if not generation == self._generation:
+                return
+
+            # the checkpoint says it holds the folded journal, so a crash
+            # before the journal is removed doesn't replay it again
+            _write_atomic(self._path(Journal.CHECKPOINT), data, self._fsync)
+            os.remove(folding)
+            self._compactions += 1
+
+    def _run(self):
+        """
+        compaction thread
+        """
+        while not self._stop.wait(self._interval):
+            self.compact()
+
+    @staticmethod
+    def _replay(snapshot, records):
+        """
+        apply journal records to a snapshot
+        """
+        for op, kind, a, b in records:
+            if op == ADD or op == REMOVE or op == CLEAR:
+                if kind == ROOM:
+                    items = snapshot.room_items[a]
+                elif kind == PLAYER:
+                    items = snapshot.player_items[a]
+                else:
+                    items = snapshot.container_items.setdefault(a, [])
+
+                if op == ADD:
+                    items.append(b)
+                elif op == REMOVE:
+                    items.remove(b)
+                else:
+                    del items[:]
+
+            elif op == FLAGS:
+                snapshot.flags[a] = b
+            elif op == BLOCK:
+                snapshot.blocked[a] = b
+            elif op == LOCATION:
+                snapshot.locations[a] = b
+            else:
+                raise ValueError("Unknown journal operation {}".format(op))
+
+        # containers that ended up empty are left out of snapshots
+        for container_id, items in list(snapshot.container_items.items()):
+            if not items:
+                del snapshot.container_items[container_id]
+
+    @staticmethod
+    def recover(world, directory):
+        """
+        restore a world built the same way as the journaled one from the last
+        checkpoint plus the journal written since
+        """
+        folded, snapshot = _read_checkpoint(
+            os.path.join(directory, Journal.CHECKPOINT))
+
+        # a fold may have been cut short; its journal comes first, unless
+        # the checkpoint has it already
+        for name in (Journal.FOLDING, Journal.JOURNAL):
+            sequence, records = _read_journal(os.path.join(directory, name))
+            if sequence is not None and sequence > folded:
+                Journal._replay(snapshot, records)
+
+        snapshot.apply(world)
+        return snapshot
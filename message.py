@@ -0,0 +1,63 @@
+# message.py
+# messages that are rendered into text only when someone reads them
+
+
+class Message(object):
+    """
+    output of an entity, kept as data until it is shown
+    -source is the entity (or command) the message is from
+    -key names the template it uses (ex. "ENTER")
+    -params are the values of the fields the template refers to, taken when
+    the message is made, so rendering it later shows things as they were
+    str() renders the message (once); clients that want data instead of
+    prose can read the parts and never render it
+    """
+
+    __slots__ = ("_source", "_key", "_template", "_params", "_text")
+
+    def __init__(self, source, key, template, params):
+        self._source = source
+        self._key = key
+        self._template = template
+        self._params = params
+        # rendered text; None until the message is rendered
+        self._text = None
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def template(self):
+        return self._template
+
+    # don't modify it
+    @property
+    def params(self):
+        return self._params
+
+    def render(self):
+        """
+        text of the message
+        """
+        if self._text is None:
+            self._text = self._template.format_map(self._params)
+
+        return self._text
+
+    def __str__(self):
+        return self.render()
+
+    def __repr__(self):
+        return "Message({!r}, {!r})".format(self._key, self._params)
+
+
+def render(msg):
+    """
+    text of a message; plain strings are their own text
+    """
+    return msg if type(msg) == str else str(msg)
@@ -0,0 +1,338 @@
+# npc.py
+# crowds of non-player characters wandering a world, simulated in arrays
+
+from functools import partial
+
+try:
+    import numpy
+except ImportError:
+    # only crowds need numpy; the rest of the engine runs without it
+    numpy = None
+
+from .event import EventSlot
+from .text_template import TextTemplateMixin
+from .world import bulk_load
+
+
+class Crowd(TextTemplateMixin):
+    """
+    many NPCs wandering the rooms of a world, kept as arrays rather than
+    objects (needs numpy)
+    -the world's paths are laid out as CSR adjacency arrays: the paths out
+    of room i are offsets[i]:offsets[i + 1] of targets (destination rooms)
+    and blocked (a mask kept up to date as paths are blocked and unblocked,
+    and read again when the world is restored from a snapshot)
+    -every NPC has a room (positions) and a state (states); each step, every
+    wandering NPC leaves along a random path of its room with probability
+    restlessness, in one vectorized operation for the whole crowd
+    (an NPC that picks a blocked path stays where it is)
+    -only rooms with a player in them hear about NPCs coming and going:
+    the room echoes it, and on_arrive / on_leave fire
+    NPCs are numbered in the order they were spawned
+    ex. crowd = Crowd(world, "goblin", "goblins")
+        crowd.spawn(100000)
+        world.scheduler.every(1, crowd.step)
+    build the crowd again (refresh()) after adding or removing rooms or
+    paths; the world's rooms must all be loaded (not a PagedWorld)
+    """
+
+    TEXT = {
+        "ARRIVE": "A {name} wanders into the {room}.",
+        "ARRIVE_MANY": "{count} {plural} wander into the {room}.",
+        "LEAVE": "A {name} wanders out of the {room}.",
+        "LEAVE_MANY": "{count} {plural} wander out of the {room}."
+    }
+
+    CONTEXT = {
+        "name": lambda crowd: crowd.name,
+        "plural": lambda crowd: crowd.plural
+    }
+
+    # NPC states
+    WANDER = 0
+    REST = 1
+
+    # EVENTS
+    # NPCs came into a room with a player in it; callbacks receive the room
+    # and an array of the NPCs
+    on_arrive = EventSlot()
+    # NPCs left a room with a player in it; same arguments
+    on_leave = EventSlot()
+
+    def __init__(self, world, name="stranger", plural=None, restlessness=0.5,
+        seed=0, text={}):
+
+        if numpy is None:
+            raise ImportError("Crowds need numpy")
+
+        super(Crowd, self).__init__()
+
+        self._world = world
+        self._name = name
+        self._plural = name + "s" if plural is None else plural
+        self._restlessness = None
+        self.restlessness = restlessness
+        self._rng = numpy.random.default_rng(seed)
+
+        # room of each NPC, by index in rooms, and its state
+        self._positions = numpy.zeros(0, dtype=numpy.int64)
+        self._states = numpy.zeros(0, dtype=numpy.uint8)
+
+        # paths whose blocking is watched, with their callbacks
+        self._watches = []
+        self._build()
+        # restoring the world sets paths without blocking or unblocking them
+        world.on_restore.subscribe(self._restored)
+
+        self.update_text(Crowd.TEXT)
+        self.update_text(text)
+
+    @property
+    def world(self):
+        return self._world
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def plural(self):
+        return self._plural
+
+    @property
+    def restlessness(self):
+        """
+        chance that a wandering NPC moves in a step
+        """
+        return self._restlessness
+
+    @restlessness.setter
+    def restlessness(self, new_restlessness):
+        if not 0 <= new_restlessness <= 1:
+            raise ValueError("Restlessness must be between 0 and 1")
+        self._restlessness = new_restlessness
+
+    # rooms property is read-only; the crowd's rooms, by index
+    @property
+    def rooms(self):
+        return self._rooms
+
+    # the arrays are read-only; don't modify them
+    @property
+    def positions(self):
+        """
+        index in rooms of every NPC's room
+        """
+        return self._positions
+
+    @property
+    def states(self):
+        return self._states
+
+    @property
+    def offsets(self):
+        return self._offsets
+
+    @property
+    def targets(self):
+        return self._targets
+
+    @property
+    def blocked(self):
+        return self._blocked
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _build(self):
+        """
+        lay out the world's rooms and paths as arrays, and watch the paths
+        """
+        rooms = list(self._world.rooms)
+        index = dict((room, i) for i, room in enumerate(rooms))
+        offsets = [0]
+        targets = []
+        paths = []
+
+        # a large world makes a lot of subscriptions at once; don't let the
+        # collector rescan it over and over meanwhile
+        with bulk_load():
+            for room in rooms:
+                for path in room.paths.values():
+                    if path is None:
+                        continue
+
+                    destination = index.get(path.destination)
+                    if destination is not None:
+                        changed = partial(self._changed, len(paths))
+                        path.on_block.subscribe(changed)
+                        path.on_unblock.subscribe(changed)
+                        self._watches.append((path, changed))
+                        targets.append(destination)
+                        paths.append(path)
+                offsets.append(len(targets))
+
+        self._rooms = rooms
+        self._index = index
+        self._paths = paths
+        self._offsets = numpy.array(offsets, dtype=numpy.int64)
+        self._targets = numpy.array(targets, dtype=numpy.int64)
+        self._blocked = numpy.array([path.blocked for path in paths],
+            dtype=bool)
+
+    def _changed(self, edge):
+        self._blocked[edge] = self._paths[edge].blocked
+
+    def _restored(self):
+        self._blocked = numpy.array([path.blocked for path in self._paths],
+            dtype=bool)
+
+    def refresh(self):
+        """
+        lay out the world again, after rooms or paths were added or removed
+        NPCs in rooms that are gone are dropped (the rest are renumbered)
+        """
+        for path, changed in self._watches:
+            path.on_block.unsubscribe(changed)
+            path.on_unblock.unsubscribe(changed)
+        self._watches = []
+
+        old_rooms = self._rooms
+        self._build()
+
+        moved = numpy.array([self._index.get(room, -1) for room in old_rooms],
+            dtype=numpy.int64)[self._positions]
+        kept = moved >= 0
+        self._positions = moved[kept]
+        self._states = self._states[kept]
+
+    def spawn(self, count, room=None, state=WANDER):
+        """
+        add NPCs, in a room or else each in a random one
+        returns their numbers
+        """
+        if not self._rooms:
+            raise RuntimeError("The world has no rooms to spawn NPCs in")
+
+        if room is None:
+            positions = self._rng.integers(0, len(self._rooms), count)
+        else:
+            if not room in self._index:
+                raise KeyError("{} is not in the crowd's world".format(
+                    room.name))
+            positions = numpy.full(count, self._index[room],
+                dtype=numpy.int64)
+
+        first = len(self._positions)
+        self._positions = numpy.concatenate((self._positions, positions))
+        self._states = numpy.concatenate((self._states,
+            numpy.full(count, state, dtype=numpy.uint8)))
+
+        return numpy.arange(first, first + count)
+
+    def set_state(self, npcs, state):
+        """
+        put NPCs (a number, or an array or list of them) in a state
+        """
+        self._states[npcs] = state
+
+    def room(self, npc):
+        """
+        room an NPC is in
+        """
+        return self._rooms[self._positions[npc]]
+
+    def npcs(self, room):
+        """
+        numbers of the NPCs in a room
+        """
+        index = self._index.get(room)
+        if index is None:
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        return numpy.flatnonzero(self._positions == index)
+
+    def occupancy(self):
+        """
+        number of NPCs in each room, by index in rooms
+        """
+        return numpy.bincount(self._positions, minlength=len(self._rooms))
+
+    def step(self):
+        """
+        move every wandering NPC that feels like it one path on
+        returns the number of NPCs that moved
+        """
+        positions = self._positions
+        if not len(positions) or not len(self._targets) or \
+            not self._restlessness:
+            return 0
+
+        start = self._offsets[positions]
+        degree = self._offsets[positions + 1] - start
+
+        # one draw per NPC decides both whether it moves and where: below
+        # restlessness it moves, and scaled back up to [0, 1) it picks the
+        # path
+        draw = self._rng.random(len(positions))
+        moving = (draw < self._restlessness) & (degree > 0) & \
+            (self._states == Crowd.WANDER)
+        choice = (draw / self._restlessness * degree).astype(numpy.int64)
+        # rooms without paths (or the last room, when it has none) would
+        # point past the last path; those NPCs aren't moving anyway
+        edge = numpy.minimum(start + choice, len(self._targets) - 1)
+        moving &= ~self._blocked[edge]
+
+        movers = numpy.flatnonzero(moving)
+        if not len(movers):
+            return 0
+
+        origins = positions[movers]
+        destinations = self._targets[edge[movers]]
+        positions[movers] = destinations
+
+        self._notify(movers, origins, destinations)
+        return len(movers)
+
+    def _occupied(self):
+        """
+        indexes of the rooms with a player in them
+        """
+        occupied = set()
+        for player in self._world.players:
+            index = self._index.get(player.location)
+            if index is not None:
+                occupied.add(index)
+
+        return numpy.fromiter(occupied, dtype=numpy.int64,
+            count=len(occupied))
+
+    def _notify(self, movers, origins, destinations):
+        """
+        tell rooms with players in them about the NPCs that left and came
+        """
+        occupied = self._occupied()
+        if not len(occupied):
+            return
+
+        for key, event, where in (("LEAVE", self.on_leave, origins),
+            ("ARRIVE", self.on_arrive, destinations)):
+            watched = numpy.isin(where, occupied)
+            if not watched.any():
+                continue
+
+            npcs = movers[watched]
+            where = where[watched]
+            order = numpy.argsort(where, kind="stable")
+            rooms, starts, counts = numpy.unique(where[order],
+                return_index=True, return_counts=True)
+
+            for index, first, count in zip(rooms.tolist(), starts.tolist(),
+                counts.tolist()):
+                room = self._rooms[index]
+                if count == 1:
+                    room.echo(self.message(key, room=room.name))
+                else:
+                    room.echo(self.message(key + "_MANY", room=room.name,
+                        count=count))
+                event.trigger(room, npcs[order[first:first + count]])
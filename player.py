@@ -1,9 +1,11 @@
 # player.py
 # a bad, bad person
 
-from .event import Event
+from .event import EventSlot
 from .echo import EchoMixin
 from .text_template import TextTemplateMixin
+from .collection import ItemCollection
+from .bus import PLAYER
 
 
 class Player(EchoMixin, TextTemplateMixin):
@@ -11,6 +13,9 @@ class Player(EchoMixin, TextTemplateMixin):
     represents user
     """
 
+    # what kind of parent the player is to the items in the inventory
+    HOLDER = "player"
+
     TEXT = {
         "TAKE": "You take the {item} and put it in your inventory.",
         "TAKE_IN_LOCKED_CONTAINER": ("The {item} is locked inside "
@@ -20,16 +25,37 @@ class Player(EchoMixin, TextTemplateMixin):
         "DISCARD": "You discard the {item} and leave it in the {room}.",
         "ALREADY_DISCARDED": "The {item} is not in your inventory.",
         "NO_PATH": "You can't go {direction}.",
-        "PATH_BLOCKED": "The path {direction}ward is blocked."
+        "PATH_BLOCKED": "The path {direction}ward is blocked.",
+        "TRAVEL": "You make your way to the {destination}."
+    }
+
+    CONTEXT = {
+        "room": lambda player: player.location.name
     }
 
+    # EVENTS
+    # player changed location; callbacks receive the old and new rooms
+    # this fires before the new room is entered
+    on_relocate = EventSlot()
+    # player added an item to inventory
+    on_take_item = EventSlot()
+    # player discards item from inventory
+    on_discard_item = EventSlot()
+    # player moves to another room
+    on_move = EventSlot()
+
     def __init__(self, start_location=None, inventory=[]):
         super(Player, self).__init__()
 
-        # list of items a player has
-        self._inventory = []
+        # items a player has (containers hold their own contents), indexed
+        # by name and synonym
+        self._inventory = ItemCollection(holder=self)
+
+        # bus of the world the player is in; set by the world
+        self._bus = None
 
         # location of player (room that player is currently in)
+        self._location = None
         self.location = start_location
 
         # template strings for printing
@@ -39,41 +65,60 @@ class Player(EchoMixin, TextTemplateMixin):
         for item in inventory:
             self._insert(item)
 
-        # EVENTS
-        # player added an item to inventory
-        self.on_take_item = Event()
-        # player discards item from inventory
-        self.on_discard_item = Event()
-        # player moves to another room
-        self.on_move = Event()
-
     @property
     def inventory(self):
         return self._inventory
 
-    def context(self, **extra):
-        context = super(Player, self).context(**extra)
-        context.update({
-            "room": self.location.name
-        })
-        return context
+    # index property is read-only
+    @property
+    def index(self):
+        return self._inventory.index
+
+    @property
+    def bus(self):
+        return self._bus
+
+    @bus.setter
+    def bus(self, new_bus):
+        old_world = None if self._bus is None else self._bus.world
+        new_world = None if new_bus is None else new_bus.world
+        if not old_world is new_world:
+            # the inventory leaves one world's index for the other's
+            if old_world is not None:
+                old_world.unindex_items(self._inventory)
+            if new_world is not None:
+                new_world.index_items(self._inventory)
+        self._bus = new_bus
+
+    @property
+    def location(self):
+        return self._location
+
+    @location.setter
+    def location(self, new_location):
+        """
+        set the room the player is in
+        """
+        old_location = self._location
+        self._location = new_location
+        self.on_relocate.trigger(old_location, new_location)
 
     def take(self, item):
         """
         add an item to the inventory
         """
         if not item.inventory:
-            self.echo(self.text("TAKE_NOT_INVENTORY", item=item.name))
-            self.echo(self.text("TAKE_NOT_INVENTORY", item=item.name))
+            self.echo(self.message("TAKE_NOT_INVENTORY", item=item.name))
+            self.echo(self.message("TAKE_NOT_INVENTORY", item=item.name))
             return
 
         if item.owner is not None and item.owner.locked:
-            self.echo(self.text("TAKE_IN_LOCKED_CONTAINER", item=item.name,
+            self.echo(self.message("TAKE_IN_LOCKED_CONTAINER", item=item.name,
                 container=item.owner.name))
             return
 
-        if item in self._inventory:
-            self.echo(self.text("ALREADY_TAKEN", item=item.name))
+        if item.player is self:
+            self.echo(self.message("ALREADY_TAKEN", item=item.name))
             return
 
         # if the item is in the container, open the container and
@@ -86,55 +131,51 @@ class Player(EchoMixin, TextTemplateMixin):
 
         # the item is "roomless" when it is in the inventory
         self._insert(item)
-        self.echo(self.text("TAKE", item=item.name))
+        self.echo(self.message("TAKE", item=item.name))
         self.on_take_item.trigger()
 
     def _insert(self, item):
         """
         insert an item to inventory without echoing
+        (a container brings its contents along)
         """
-        if item.room is not None:
-            item.room.remove(item)
+        if not item in self._inventory:
+            self._adopt(item)
 
-        item.player = self
-        self._inventory.append(item)
+    def _adopt(self, item):
+        """
+        put an item directly in the inventory, wherever it was before
+        """
+        item._move(self, self._inventory)
 
-        # if the item is a container, add to inventory its contents
-        if item.container:
-            for con_item in item.items:
-                self._insert(con_item)
+    def _release(self, item):
+        """
+        drop an item from the inventory; the item sets its new parent
+        """
+        self._inventory.remove(item)
 
     def discard(self, item):
         """
         remove an item from inventory
         """
-        if item in self._inventory:
+        if item.player is self:
             self._erase(item)
             self.on_discard_item.trigger()
-            self.echo(self.text("DISCARD", item=item.name))
+            self.echo(self.message("DISCARD", item=item.name))
         else:
-            self.echo(self.text("DISCARD", item=item.name))
+            self.echo(self.message("DISCARD", item=item.name))
 
     def _erase(self, item):
-        if item in self._inventory:
+        if item.player is self:
             # put item back into room when it is discarded
+            # (a container takes its contents along)
             self.location.add(item)
-            self._inventory.remove(item)
-
-            # if the item is a container, throw away from inventory its contents
-            if item.container:
-                for con_item in item.items:
-                    self._erase(con_item)
 
     def get(self, item_name):
         """
-        get item from inventory by its name
+        get item from inventory by its name, looking inside containers too
         """
-        for item in self._inventory:
-            if item.name == item_name or item_name in item.synonyms:
-                return item
-
-        return None
+        return self._inventory.find(item_name)
 
     def move(self, direction):
         """
@@ -148,23 +189,61 @@ class Player(EchoMixin, TextTemplateMixin):
 
                 # enter new location
                 self.location = path.destination
-                self.location.enter()
+                self.location.enter(player=self)
 
                 self.on_move.trigger()
             else:
-                self.echo(self.text("PATH_BLOCKED", direction=direction))
+                self.echo(self.message("PATH_BLOCKED", direction=direction))
         else:
-            self.echo(self.text("NO_PATH", direction=direction))
+            self.echo(self.message("NO_PATH", direction=direction))
+
+    def travel(self, route):
+        """
+        walk a route (a list of directions) in one go
+        the rooms on the way are entered and left quietly (their events
+        still fire); only the last one is described, after a summary
+        walking stops where a path is missing or blocked
+        """
+        start = self.location
+        for steps, direction in enumerate(route):
+            path = self.location.get_path(direction)
+            if path is None or path.blocked:
+                # say where the walk ended, then why
+                if not self.location is start:
+                    self.location.look(self)
+                self.move(direction)
+                return
+
+            self.location.exit()
+            self.location = path.destination
+            # the last room is entered out loud below
+            if steps + 1 < len(route):
+                self.location.enter(echo=False)
+                self.on_move.trigger()
+
+        if route:
+            self.echo(self.message("TRAVEL", destination=self.location.name))
+            self.location.enter(player=self)
+            self.on_move.trigger()
 
     def look(self):
         """
         look around (equivalent to looking around the current location)
         """
-        self.location.look()
+        self.location.look(self)
 
     def object_echo(self, msg):
         """
         relay inventory item messages to player echo callbacks
+        (items in a world publish to its bus instead)
         """
         self.echo(msg)
 
+    def echo(self, msg):
+        """
+        send to the player's subscribers and publish to the world's bus
+        """
+        super(Player, self).echo(msg)
+        if self._bus is not None:
+            self._bus.publish(PLAYER, self, msg)
+
@@ -2,10 +2,12 @@
 # a space with a collection of items
 
 from . import DIRECTIONS, enumerate_items
-from .event import Event
+from .event import EventSlot
 from .echo import EchoMixin
 from .text_template import TextTemplateMixin
 from .item import Item
+from .collection import ItemCollection
+from .bus import ROOM, PLAYER
 
 
 class Path(EchoMixin, TextTemplateMixin):
@@ -22,6 +24,16 @@ class Path(EchoMixin, TextTemplateMixin):
             "is already unblocked.")
     }
 
+    CONTEXT = {
+        "path": lambda path: path.name,
+        "destination": lambda path: path.destination_name
+    }
+
+    # EVENTS
+    # path was blocked
+    on_block = EventSlot()
+    on_unblock = EventSlot()
+
     def __init__(self, name, destination, blocked=False, text={}):
 
         super(Path, self).__init__()
@@ -29,6 +41,8 @@ class Path(EchoMixin, TextTemplateMixin):
         self._name = name
         self._destination = destination
         self._blocked = blocked
+        # bumped whenever the path changes (see Room.look)
+        self._version = 0
         # verb used to signify the path is blocked or unblocked
         # (ex. the gate is "opened" or "closed"
         # we use arguments for the verbs because subclassing path
@@ -36,11 +50,6 @@ class Path(EchoMixin, TextTemplateMixin):
         self.update_text(Path.TEXT)
         self.update_text(text)
 
-        # EVENTS
-        # path was blocked
-        self.on_block = Event()
-        self.on_unblock = Event()
-
     @property
     def name(self):
         return self._name
@@ -49,17 +58,22 @@ class Path(EchoMixin, TextTemplateMixin):
     def destination(self):
         return self._destination
 
+    @property
+    def destination_name(self):
+        """
+        name of the destination; describing a path only needs this, so
+        paths that load their destination lazily can answer it without
+        loading it
+        """
+        return self._destination.name
+
     @property
     def blocked(self):
         return self._blocked
 
-    def context(self, **extra):
-        context = super(Path, self).context(**extra)
-        context.update({
-            "path": self._name,
-            "destination": self._destination.name
-        })
-        return context
+    @property
+    def version(self):
+        return self._version
 
     def block(self, echo=True):
         """
@@ -67,10 +81,11 @@ class Path(EchoMixin, TextTemplateMixin):
         """
         if not self._blocked:
             self._blocked = True
-            if echo: self.echo(self.text("BLOCK"))
+            self._version += 1
+            if echo: self.echo(self.message("BLOCK"))
             self.on_block.trigger()
         else:
-            self.echo(self.text("ALREADY_BLOCKED"))
+            self.echo(self.message("ALREADY_BLOCKED"))
 
     def unblock(self, echo=True):
         """
@@ -78,10 +93,11 @@ class Path(EchoMixin, TextTemplateMixin):
         """
         if self._blocked:
             self._blocked = False
-            if echo: self.echo(self.text("UNBLOCK"))
+            self._version += 1
+            if echo: self.echo(self.message("UNBLOCK"))
             self.on_unblock.trigger()
         else:
-            self.echo(self.text("ALREADY_UNBLOCKED"))
+            self.echo(self.message("ALREADY_UNBLOCKED"))
 
     def toggle(self, echo=True):
         """
@@ -98,12 +114,23 @@ class AbstractRoom(EchoMixin):
     base class for Room
     """
 
+    # what kind of parent the room is to its items
+    HOLDER = "room"
+
     def __init__(self, name, description="", items=[]):
+        # bumped whenever the room changes: its description, items, paths or
+        # templates (see Room.look)
+        self._version = 0
+
         super(AbstractRoom, self).__init__()
 
         self._name = name
-        self.description = description
-        self._items = []
+        self._description = description
+        # bus of the room's world; None when the room isn't in one
+        self._bus = None
+        # items lying directly in the room, in the order they were added,
+        # indexed by name and synonym (items in containers are in those)
+        self._items = ItemCollection(holder=self)
         self.add(items)
 
     # name property is read-only
@@ -117,6 +144,33 @@ class AbstractRoom(EchoMixin):
     def __str__(self):
         return self.name
 
+    @property
+    def description(self):
+        return self._description
+
+    @description.setter
+    def description(self, new_description):
+        self._description = new_description
+        self._version += 1
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def items(self):
+        return self._items
+
+    # index property is read-only
+    @property
+    def index(self):
+        return self._items.index
+
+    # bus property is read-only; it follows the room's world
+    @property
+    def bus(self):
+        return self._bus
+
     def add(self, items):
         """
         add a list of items to the room
@@ -126,51 +180,55 @@ class AbstractRoom(EchoMixin):
 
         for item in items:
             if not item in self._items:
-                item.room = self
-                self._items.append(item)
+                # takes it out of the inventory or container it was in
+                self._adopt(item)
 
-                #if the item was in the player's inventory, take it off
-                item.player = None
+    def _adopt(self, item):
+        """
+        put an item directly in the room, wherever it was before
+        """
+        item._move(self, self._items)
+        self._version += 1
 
-                # add items in a container
-                if item.container:
-                    for con_item in item.items:
-                        self.add(con_item)
+    def _release(self, item):
+        """
+        drop an item from the room; the item sets its new parent
+        """
+        self._items.remove(item)
+        self._version += 1
 
     def remove(self, item):
         """
-        remove an item from the room
+        remove an item from the room (taking it out of its container, if
+        it is in one)
         """
-        if item in self._items:
-            item.room = None
-            self._items.remove(item)
-
-            # remove items in a container
-            if item.container:
-                for con_item in item.items:
-                    self.remove(con_item)
-
+        if item.room is self:
+            item._move(None)
         else:
             raise RuntimeError("{item} is not in {room}"
                 .format(item=item.name, room=self.name))
 
     def get(self, item_name):
         """
-        get item by name
+        get item by name, looking inside containers too
         """
-        for item in self._items:
-            if item.name == item_name or item_name in item.synonyms:
-                return item
-
-        return None
+        return self._items.find(item_name)
 
     def object_echo(self, msg):
         """
         relay object echo messages up to the echo listeners of the room
-        (one of which will be the IO driver)
+        (items in a world publish to its bus instead)
         """
         self.echo(msg)
 
+    def echo(self, msg):
+        """
+        send to the room's subscribers and publish to the world's bus
+        """
+        super(AbstractRoom, self).echo(msg)
+        if self._bus is not None:
+            self._bus.publish(ROOM, self, msg)
+
 
 class Room(AbstractRoom, TextTemplateMixin):
     """
@@ -185,67 +243,126 @@ class Room(AbstractRoom, TextTemplateMixin):
             "to the {destination}. "),
         "LOOK_PATH_BLOCKED": ("Looking {direction}wards, you see the "
             "{destination} but the {path} is blocked."),
+        "LOOK_EXIT": "There is a {path} to the {destination}. ",
+        "LOOK_EXIT_BLOCKED": ("There is a {path} to the {destination}, "
+            "but it is blocked."),
         "LOOK_ITEMS": ("Looking around the {room}, you see the "
             "following items: {items}"),
         "LOOK_EMPTY": "Looking around the {room}, you don't see any items.",
     }
 
+    CONTEXT = {
+        "room": lambda room: room.name,
+        "description": lambda room: room.description,
+        "items": lambda room: enumerate_items(
+            [item.name for item in room.visible_items()])
+    }
+
+    # EVENTS
+    # player entered room
+    on_enter = EventSlot()
+    # player exited room
+    on_exit = EventSlot()
+    # player looks around room
+    on_look = EventSlot()
+
+    # keep what look() says until the room or its paths change; a subclass
+    # whose description depends on anything else should turn this off
+    CACHE_LOOK = True
+
     def __init__(self, name, description="", items=[], world=None, text={}):
         super(Room, self).__init__(name, description, items)
-        # paths to other rooms
+        # paths to other rooms by direction; the six DIRECTIONS always have
+        # an entry (None if there is no path), other exits only while they
+        # exist
         self._paths = dict([(direction, None) for direction in DIRECTIONS])
+        # directions of the paths by path name and by destination name
+        self._path_names = {}
+        self._path_destinations = {}
         self._world = None
         self.world = world
+        # messages of the last look, and the versions they were made at
+        self._look = None
+        self._look_key = None
+        self._look_hits = 0
+        self._look_misses = 0
         self.update_text(Room.TEXT)
         self.update_text(text)
 
-        # EVENTS
-        # player entered room
-        self.on_enter = Event()
-        # player exited room
-        self.on_exit = Event()
-        # player looks around room
-        self.on_look = Event()
-
     @property
     def world(self):
         return self._world
 
+    # paths property is read-only; it maps directions to paths (or None)
+    @property
+    def paths(self):
+        return self._paths
+
+    @property
+    def look_hits(self):
+        """
+        looks answered from the cache
+        """
+        return self._look_hits
+
+    @property
+    def look_misses(self):
+        return self._look_misses
+
+    @property
+    def look_hit_ratio(self):
+        looks = self._look_hits + self._look_misses
+        return self._look_hits / float(looks) if looks else 0.0
+
     @world.setter
     def world(self, new_world):
         """
         set the world the room is in
         """
-        # unsubscribe current world
-        if self._world is not None:
-            self.on_echo.unsubscribe(self._world.room_echo)
-
-        # subscribe new world
+        old_world = self._world
+        if not old_world is new_world:
+            # the room's items leave one world's index for the other's
+            if old_world is not None:
+                old_world.unindex_items(self._items)
+            if new_world is not None:
+                new_world.index_items(self._items)
         self._world = new_world
-        # only if it's actually a world, though
-        if new_world is not None:
-            self.on_echo.subscribe(self._world.room_echo)
+        # messages go out on the world's bus
+        self._bus = None if new_world is None else new_world.bus
 
-    def context(self, **extra):
-        context = super(Room, self).context(**extra)
+    def update_text(self, text):
+        super(Room, self).update_text(text)
+        self._version += 1
 
-        visible_items = [item for item in self._items if item.owner is None]
-        items_str = enumerate_items([item.name for item in visible_items])
-        context.update({
-            "room": self.name,
-            "description": self.description,
-            "items": items_str
-        })
+    def visible_items(self):
+        """
+        items lying in the room (not inside containers)
+        """
+        return list(self._items)
 
-        return context
+    def tell(self, msg, player=None):
+        """
+        send a message about the room to one player only (ex. what the
+        player sees looking around), through the room's subscribers and the
+        world's bus; without a player, the whole room hears it
+        """
+        if player is None or self._bus is None:
+            self.echo(msg)
+            return
 
-    def enter(self):
+        EchoMixin.echo(self, msg)
+        self._bus.publish(PLAYER, player, msg)
+
+    def enter(self, echo=True, player=None):
         """
         player has entered the room
+        (without echo, the player only passes through; see Player.travel)
+        what the player sees goes to that player only, when it is given
         """
         # player looks around when he/she enters
-        self.echo(self.text("ENTER"))
-        self.look()
+        if echo:
+            self.tell(self.message("ENTER"), player)
+            self.look(player)
         self.on_enter.trigger()
 
     def exit(self):
@@ -254,86 +371,163 @@ class Room(AbstractRoom, TextTemplateMixin):
         """
         self.on_exit.trigger()
 
-    def look(self):
+    def look(self, player=None):
         """
-        player looks around the room
+        player looks around the room; the description goes to that player
+        only, when it is given (see tell())
+        what it says is kept until the room, its items or its paths change
+        (see version); looking around an unchanged room sends the same
+        messages again
         """
-        self.echo(self.text("DESCRIPTION"))
+        if not self.CACHE_LOOK:
+            messages = self._describe()
+        else:
+            # a path's version only grows, and the room's changes when its
+            # paths do, so the sum tells whether any of them changed
+            paths_version = 0
+            for path in self._paths.values():
+                if path is not None:
+                    paths_version += path._version
+            key = (self._version, paths_version)
+
+            if key == self._look_key:
+                self._look_hits += 1
+                messages = self._look
+            else:
+                self._look_misses += 1
+                messages = self._look = self._describe()
+                self._look_key = key
+
+        for msg in messages:
+            self.tell(msg, player)
+
+        self.on_look.trigger()
+
+    def _describe(self):
+        """
+        messages describing the room, its paths and its items
+        """
+        messages = [self.message("DESCRIPTION")]
 
         # describe paths
-        for direction, path in self._paths.iteritems():
+        for direction, path in self._paths.items():
             if path is not None:
-                if not path.blocked:
-                    self.echo(self.text("LOOK_PATH", path=path.name, 
-                        direction=direction, destination=path.destination))
+                # exits other than the six directions are described by name
+                if direction in DIRECTIONS:
+                    key = "LOOK_PATH"
                 else:
-                    self.echo(self.text("LOOK_PATH_BLOCKED", path=path.name, 
-                        direction=direction, destination=path.destination))
+                    key = "LOOK_EXIT"
+                if path.blocked:
+                    key += "_BLOCKED"
+
+                messages.append(self.message(key, path=path.name,
+                    direction=direction, destination=path.destination_name))
 
         # multiple items in container
-        visible_items = [item for item in self._items if item.owner is None]
-        if len(visible_items) >= 1:
-            self.echo(self.text("LOOK_ITEMS"))
+        if len(self._items) >= 1:
+            messages.append(self.message("LOOK_ITEMS"))
         # no items
         else:
-            self.echo(self.text("LOOK_EMPTY"))
+            messages.append(self.message("LOOK_EMPTY"))
 
-        self.on_look.trigger()
+        return messages
 
     def add_path(self, name, direction, destination, blocked=False, text={}):
         """
         add a path to another room
         """
+        self.set_path(direction, Path(name, destination, blocked, text={}))
+
+    def set_path(self, direction, path):
+        """
+        put a path (or a subclass of it) in a direction, replacing the path
+        there; besides the six DIRECTIONS, a direction can be any word
+        naming an exit (ex. "portal")
+        """
+        if not isinstance(direction, str) or not direction:
+            raise ValueError("{} is not a direction".format(direction))
+
+        old_path = self._paths.get(direction)
+        if old_path is not None:
+            self._drop_path(direction, old_path)
+
+        path.on_echo.subscribe(self._path_echo)
+        self._paths[direction] = path
+        self._version += 1
+        self._path_names.setdefault(path.name, {})[direction] = None
+        self._path_destinations.setdefault(path.destination_name,
+            {})[direction] = None
+
+        if self._world is not None:
+            self._world.link_path(self, direction, path)
+
+    def _drop_path(self, direction, path):
+        path.on_echo.unsubscribe(self._path_echo)
+        for index, key in ((self._path_names, path.name),
+            (self._path_destinations, path.destination_name)):
+            directions = index[key]
+            del directions[direction]
+            if not directions:
+                del index[key]
+
+        # the six directions are always there, if only as None
         if direction in DIRECTIONS:
-            path = Path(name, destination, blocked, text={})
-            path.on_echo.subscribe(self._path_echo)
-            self._paths[direction] = path
+            self._paths[direction] = None
         else:
-            raise ValueError("{} is not a direction".format(direction))
+            del self._paths[direction]
+        self._version += 1
+
+        if self._world is not None:
+            self._world.unlink_path(self, direction, path)
 
     def remove_path(self, dir_dest):
         """
         remove a path by direction or by destination
         """
         # by direction
-        if type(dir_dest) == str:
-            if dir_dest in DIRECTION:
-                path.on_echo.unsubscribe(self._path_echo)
-                self._paths[dir_dest] = None
+        if isinstance(dir_dest, str):
+            if dir_dest in self._paths:
+                path = self._paths[dir_dest]
+                if path is not None:
+                    self._drop_path(dir_dest, path)
             else:
                 raise ValueError("{} is not a direction".format(dir_dest))
 
-        # by destination
-        elif type(dir_dest) == Room:
-            rm_dir = ""
-            for direction, destination in self._paths.iteritems():
-                if dir_dest == destination:
-                    rm_dir = direction
+        # by destination (the first path leading to it)
+        elif isinstance(dir_dest, AbstractRoom):
+            directions = self._path_destinations.get(dir_dest.name, ())
+            for direction, path in self._paths.items():
+                if direction in directions and path.destination is dir_dest:
+                    self._drop_path(direction, path)
                     break
 
-            # we found the destination; remove its path
-            if not rm_dir == "":
-                path.on_echo.unsubscribe(self._path_echo)
-                self._paths[rm_dir] = None
-
     def get_path(self, direction):
         """
         get path by name, direction, or destination
         """
         # get path by direction
-        if direction in DIRECTIONS:
+        if direction in self._paths:
             return self._paths[direction]
 
         # get path by name or destination
-        else:
-            for direction, path in self._paths.iteritems():
-                if path is not None:
-                    if path.name == direction:
-                        return path
-                    elif path.destination.name == direction:
-                        return path
-
-            return None
+        by_name = self._path_names.get(direction)
+        by_destination = self._path_destinations.get(direction)
+        if by_destination is None:
+            if by_name is None:
+                return None
+            if len(by_name) == 1:
+                for direction in by_name:
+                    return self._paths[direction]
+        elif by_name is None and len(by_destination) == 1:
+            for direction in by_destination:
+                return self._paths[direction]
+
+        # several paths answer to it; the first one in direction order wins
+        for path_direction, path in self._paths.items():
+            if (by_name is not None and path_direction in by_name) or \
+                (by_destination is not None and
+                    path_direction in by_destination):
+                return path
 
     def _path_echo(self, msg):
         """
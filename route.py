@@ -0,0 +1,206 @@
+# route.py
+# shortest routes between the rooms of a world
+
+from collections import OrderedDict
+from functools import partial
+
+
+class Router(object):
+    """
+    finds the shortest unblocked routes between rooms
+    -routes to a room come from a table built by searching backwards from
+    it (every room that can reach it, with the direction to take next), so
+    one table answers for every starting room
+    -tables are kept for the capacity most recently used destinations and
+    dropped only when a path they depend on is blocked, or a path that would
+    shorten one of their routes is unblocked
+    -the world tells the router about rooms and paths that come and go,
+    which drops the tables they change the same way
+    routes follow the world's index of incoming paths (World.incoming)
+    """
+
+    def __init__(self, world, capacity=64):
+        self._world = world
+        # most routing tables kept at once
+        self._capacity = capacity
+        # routing tables by destination, least recently used first
+        # each maps a room to (direction, path, distance to the destination)
+        self._tables = OrderedDict()
+        # first room with each name; None until first used
+        self._names = None
+        # paths whose blocking and unblocking are watched
+        self._watched = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @property
+    def world(self):
+        return self._world
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def invalidations(self):
+        """
+        routing tables dropped because a path was blocked or unblocked
+        """
+        return self._invalidations
+
+    def refresh(self):
+        """
+        drop every routing table
+        """
+        self._tables.clear()
+        self._names = None
+
+    def find(self, name):
+        """
+        room by name, or None
+        """
+        if self._names is None:
+            names = {}
+            for room in self._world.rooms:
+                names.setdefault(room.name, room)
+            self._names = names
+
+        return self._names.get(name)
+
+    def room_added(self, room):
+        if self._names is not None:
+            self._names.setdefault(room.name, room)
+
+    def room_removed(self, room):
+        # another room may have the same name; find it again when asked
+        if self._names is not None and self._names.get(room.name) is room:
+            self._names = None
+
+    def path_added(self, room, path):
+        # a new path is like one that was unblocked; a blocked one is
+        # watched so its unblocking is seen
+        if path.blocked:
+            if not path in self._watched:
+                self._watch(room, path, path.destination)
+        else:
+            self._unblocked(room, path.destination)
+
+    def path_removed(self, room, path):
+        # and a path that is gone is like one that was blocked
+        self._blocked(room, path)
+
+    def table(self, destination):
+        """
+        routing table to a room: room -> (direction, path, distance)
+        don't modify it
+        """
+        table = self._tables.get(destination)
+        if table is not None:
+            self._hits += 1
+            self._tables.move_to_end(destination)
+            return table
+
+        self._misses += 1
+        table = self._search(destination)
+        self._tables[destination] = table
+        if len(self._tables) > self._capacity:
+            self._tables.popitem(last=False)
+
+        return table
+
+    def _search(self, destination):
+        """
+        breadth-first search backwards from a room along unblocked paths
+        """
+        incoming = self._world.incoming
+        watched = self._watched
+        table = {destination: (None, None, 0)}
+        frontier = [destination]
+        distance = 0
+
+        # a table of a large world allocates a lot at once; don't let the
+        # collector rescan the whole world over and over meanwhile (imported
+        # here, as the world module imports this one)
+        from .world import bulk_load
+        with bulk_load():
+            while frontier:
+                distance += 1
+                reached = []
+                for room in frontier:
+                    for path, (source, direction) in incoming(room).items():
+                        # a room reached already has a route at least as
+                        # short; its other paths can't change the table by
+                        # being blocked or unblocked
+                        if source in table:
+                            continue
+
+                        # the table depends on the paths it uses and on the
+                        # blocked paths it goes around
+                        if not path in watched:
+                            self._watch(source, path, room)
+                        if not path.blocked:
+                            table[source] = (direction, path, distance)
+                            reached.append(source)
+                frontier = reached
+
+        return table
+
+    def _watch(self, source, path, destination):
+        self._watched[path] = None
+        changed = partial(self._changed, source, path, destination)
+        path.on_block.subscribe(changed)
+        path.on_unblock.subscribe(changed)
+
+    def _changed(self, source, path, destination):
+        if path.blocked:
+            self._blocked(source, path)
+        else:
+            self._unblocked(source, destination)
+
+    def _blocked(self, source, path):
+        # tables whose route from source goes through the path
+        for destination, table in list(self._tables.items()):
+            step = table.get(source)
+            if step is not None and step[1] is path:
+                del self._tables[destination]
+                self._invalidations += 1
+
+    def _unblocked(self, source, path_destination):
+        # tables the path gives a shorter (or first) route from source
+        for destination, table in list(self._tables.items()):
+            step = table.get(path_destination)
+            if step is None:
+                continue
+
+            current = table.get(source)
+            if current is None or step[2] + 1 < current[2]:
+                del self._tables[destination]
+                self._invalidations += 1
+
+    def route(self, source, destination):
+        """
+        directions of the shortest unblocked route between two rooms; None
+        if there is no such route
+        """
+        table = self.table(destination)
+        if not source in table:
+            return None
+
+        route = []
+        room = source
+        while not room is destination:
+            direction, path, distance = table[room]
+            route.append(direction)
+            room = path.destination
+
+        return route
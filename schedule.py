@@ -0,0 +1,225 @@
+# schedule.py
+# timed events: callbacks that run after some ticks of world time
+
+import asyncio
+import heapq
+from itertools import count
+
+
+class Timer(object):
+    """
+    a callback waiting in a scheduler; cancel() it to keep it from running
+    (again, if it is periodic)
+    """
+
+    __slots__ = ("_due", "_interval", "_callback", "_args", "_cancelled",
+        "_scheduler")
+
+    def __init__(self, scheduler, due, interval, callback, args):
+        self._scheduler = scheduler
+        self._due = due
+        # ticks between runs; None if the timer runs once
+        self._interval = interval
+        self._callback = callback
+        self._args = args
+        self._cancelled = False
+
+    @property
+    def due(self):
+        """
+        tick the timer runs at next
+        """
+        return self._due
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def callback(self):
+        return self._callback
+
+    @property
+    def active(self):
+        """
+        true while the timer is still to run: not cancelled, and not a
+        one-off timer that has run already
+        """
+        return not self._cancelled
+
+    def cancel(self):
+        """
+        stop the timer; cancelling it again does nothing
+        """
+        if not self._cancelled:
+            self._cancelled = True
+            self._scheduler._cancelled_timer()
+
+
+class Scheduler(object):
+    """
+    runs callbacks at ticks of world time, kept in a priority queue so a
+    tick only costs as much as the callbacks due then, however many are
+    waiting
+    ex. scheduler.after(5, path.block)          # close a door in 5 ticks
+        scheduler.every(10, room.echo, "...")   # ambient message
+    time only moves when advance() is called, so tests can drive it tick by
+    tick; run() advances it in real time on an asyncio loop
+    callbacks due at the same tick run in the order they were scheduled;
+    a callback that raises stops advance() at its tick; the callbacks after
+    it stay due
+    """
+
+    def __init__(self, tick=0):
+        self._tick = tick
+        # (due, order scheduled, timer); cancelled timers stay until they
+        # come up, or until they are most of the queue
+        self._queue = []
+        self._order = count()
+        self._cancelled = 0
+        self._runs = 0
+
+    @property
+    def tick(self):
+        """
+        current tick of world time
+        """
+        return self._tick
+
+    @property
+    def pending(self):
+        """
+        number of timers waiting to run
+        """
+        return len(self._queue) - self._cancelled
+
+    @property
+    def runs(self):
+        """
+        callbacks run so far
+        """
+        return self._runs
+
+    @property
+    def next_due(self):
+        """
+        tick the next timer is due at, or None if there are none
+        """
+        queue = self._queue
+        while queue and queue[0][2]._cancelled:
+            heapq.heappop(queue)
+            self._cancelled -= 1
+
+        return queue[0][0] if queue else None
+
+    def at(self, tick, callback, *args):
+        """
+        run callback(*args) at a tick (now, if it has passed)
+        """
+        return self._push(Timer(self, max(tick, self._tick), None, callback,
+            args))
+
+    def after(self, delay, callback, *args):
+        """
+        run callback(*args) once, delay ticks from now
+        """
+        if delay < 0:
+            raise ValueError("Delay must not be negative")
+
+        return self._push(Timer(self, self._tick + delay, None, callback,
+            args))
+
+    def every(self, interval, callback, *args, delay=None):
+        """
+        run callback(*args) every interval ticks, starting delay ticks from
+        now (one interval, by default), until the timer is cancelled
+        """
+        if interval < 1:
+            raise ValueError("Interval must be at least 1 tick")
+        if delay is None:
+            delay = interval
+        elif delay < 0:
+            raise ValueError("Delay must not be negative")
+
+        return self._push(Timer(self, self._tick + delay, interval, callback,
+            args))
+
+    def _push(self, timer):
+        heapq.heappush(self._queue, (timer._due, next(self._order), timer))
+        return timer
+
+    def _cancelled_timer(self):
+        self._cancelled += 1
+        # drop cancelled timers once they are most of the queue, so a lot
+        # of cancelling doesn't keep the queue (and what it holds) large
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._queue):
+            # in place; advance() may be holding the queue
+            self._queue[:] = [entry for entry in self._queue
+                if not entry[2]._cancelled]
+            heapq.heapify(self._queue)
+            self._cancelled = 0
+
+    def advance(self, ticks=1):
+        """
+        move time forward, running the callbacks that come due on the way,
+        in order
+        returns the number of callbacks run
+        """
+        if ticks < 0:
+            raise ValueError("Time can't go backwards")
+
+        target = self._tick + ticks
+        queue = self._queue
+        runs = 0
+
+        while queue and queue[0][0] <= target:
+            due, order, timer = heapq.heappop(queue)
+            if timer._cancelled:
+                self._cancelled -= 1
+                continue
+
+            self._tick = due
+            # a periodic timer goes back in before it runs, so its callback
+            # can cancel it
+            if timer._interval is not None:
+                timer._due = due + timer._interval
+                self._push(timer)
+            else:
+                # nothing to cancel any more
+                timer._cancelled = True
+
+            runs += 1
+            self._runs += 1
+            timer._callback(*timer._args)
+
+        self._tick = target
+        return runs
+
+    def clear(self):
+        """
+        cancel every timer
+        """
+        for due, order, timer in self._queue:
+            timer._cancelled = True
+        del self._queue[:]
+        self._cancelled = 0
+
+    async def run(self, seconds=1.0):
+        """
+        advance a tick every given number of seconds until cancelled
+        ticks are counted from when run() started, so slow callbacks don't
+        make time drift; ticks missed while the loop was busy are caught up
+        in one go
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        start_tick = self._tick
+
+        while True:
+            next_time = start + (self._tick - start_tick + 1) * seconds
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+            ticks = start_tick + int((loop.time() - start) / seconds) - \
+                self._tick
+            if ticks > 0:
+                self.advance(ticks)
@@ -0,0 +1,200 @@
+# server.py
+# serve many games from one process over line-oriented TCP
+
+import asyncio
+
+
+class Session(object):
+    """
+    one connected client playing in its own world
+    every line the client sends is fed to the session's IO driver; the
+    output is queued and written back by a separate task, followed by the
+    prompt line so clients know the response is complete
+    """
+
+    def __init__(self, driver, reader, writer, prompt=">"):
+        self._driver = driver
+        self._reader = reader
+        self._writer = writer
+        self._prompt = prompt
+        # lines waiting to be written to the client; None closes the session
+        self._queue = asyncio.Queue()
+        self._commands = 0
+
+    @property
+    def driver(self):
+        return self._driver
+
+    @property
+    def commands(self):
+        return self._commands
+
+    @property
+    def peer(self):
+        return self._writer.get_extra_info("peername")
+
+    def send(self, lines):
+        """
+        queue lines of output for the client
+        """
+        for line in lines:
+            self._queue.put_nowait(line)
+
+    async def run(self):
+        """
+        read input until the client disconnects or the session is cancelled
+        """
+        write_task = asyncio.ensure_future(self._write())
+
+        try:
+            # output produced while the world was set up (ex. World.start())
+            self.send(self._driver.output)
+            self.send([self._prompt])
+
+            while True:
+                line = await self._reader.readline()
+                # empty read means the client closed the connection
+                if not line:
+                    break
+
+                input = line.decode("utf-8", "replace").strip()
+                self._commands += 1
+                self.send(self._driver.process(input))
+                self.send([self._prompt])
+
+        except (ConnectionError, ValueError):
+            # ValueError: the client sent a line over the stream limit
+            pass
+
+        finally:
+            self._queue.put_nowait(None)
+            try:
+                # give the writer a moment to flush what is queued
+                await asyncio.wait_for(write_task, Server.FLUSH_TIMEOUT)
+            except (asyncio.TimeoutError, asyncio.CancelledError,
+                ConnectionError):
+                write_task.cancel()
+            self._writer.close()
+
+    async def _write(self):
+        """
+        drain the output queue into the connection
+        """
+        while True:
+            line = await self._queue.get()
+            if line is None:
+                break
+
+            self._writer.write(line.encode("utf-8") + b"\n")
+            # only wait on the socket once the queue is empty, so a burst
+            # of output goes out in as few writes as possible
+            if self._queue.empty():
+                await self._writer.drain()
+
+        await self._writer.drain()
+
+
+class Server(object):
+    """
+    asyncio TCP server running one session per connection
+    factory is called with no arguments for every new connection and must
+    return a ready IODriver (world, player and kernel of its own)
+    """
+
+    # seconds a closing session waits for its output to be written
+    FLUSH_TIMEOUT = 1.0
+
+    def __init__(self, factory, host="127.0.0.1", port=0, prompt=">",
+        backlog=1024):
+        self._factory = factory
+        self._host = host
+        self._port = port
+        self._prompt = prompt
+        # connections the OS queues before we accept them
+        self._backlog = backlog
+        self._server = None
+        # running session tasks, by session
+        self._sessions = {}
+
+    @property
+    def sessions(self):
+        return list(self._sessions)
+
+    @property
+    def port(self):
+        """
+        port the server is listening on (useful when started on port 0)
+        """
+        if self._server is None:
+            return self._port
+
+        return self._server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        """
+        start accepting connections
+        """
+        if self._server is not None:
+            raise RuntimeError("Server is already running")
+
+        self._server = await asyncio.start_server(self._connect,
+            self._host, self._port, backlog=self._backlog)
+
+    async def serve_forever(self):
+        """
+        start the server and run until cancelled
+        """
+        if self._server is None:
+            await self.start()
+
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """
+        stop accepting connections and end every session
+        """
+        if self._server is None:
+            return
+
+        server = self._server
+        self._server = None
+        server.close()
+
+        # end the sessions before waiting for the server: from python 3.12
+        # on, wait_closed() also waits for every connection to close
+        tasks = list(self._sessions.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        await server.wait_closed()
+
+    def _connect(self, reader, writer):
+        """
+        start a session for a new connection
+        sessions run in tasks of their own so close() can cancel them
+        """
+        session = Session(self._factory(), reader, writer, self._prompt)
+        self._sessions[session] = asyncio.ensure_future(self._run(session))
+
+    async def _run(self, session):
+        """
+        run a session and forget it once it ends
+        """
+        try:
+            await session.run()
+        finally:
+            del self._sessions[session]
+
+
+def serve(factory, host="127.0.0.1", port=4000):
+    """
+    run a server until interrupted
+    """
+    try:
+        asyncio.run(Server(factory, host, port).serve_forever())
+    except KeyboardInterrupt:
+        pass
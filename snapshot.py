@@ -0,0 +1,310 @@
+# snapshot.py
+# save and restore the state of a world
+
+import struct
+import sys
+from array import array
+
+
+# file header: magic, format version, rooms, paths, items, players and the
+# fingerprint of the catalog the snapshot was taken with
+HEADER = struct.Struct("<4sHIIIII")
+MAGIC = b"CWSS"
+VERSION = 2
+
+# container flag bits
+OPENED = 1
+LOCKED = 2
+
+
+def _pack(values):
+    """
+    pack a list of ints as a length-prefixed little-endian int32 array
+    """
+    values = array("i", values)
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return struct.pack("<I", len(values)) + values.tobytes()
+
+
+def _unpack(data, offset):
+    """
+    read an array written by _pack, returning it and the next offset
+    """
+    (length,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    values = array("i")
+    values.frombytes(data[offset:offset + length * values.itemsize])
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return values, offset + length * values.itemsize
+
+
+def _pack_lists(lists):
+    """
+    pack a list of int lists as their lengths followed by their contents
+    """
+    flat = []
+    for values in lists:
+        flat.extend(values)
+
+    return _pack([len(values) for values in lists]) + _pack(flat)
+
+
+def _unpack_lists(data, offset):
+    lengths, offset = _unpack(data, offset)
+    flat, offset = _unpack(data, offset)
+
+    lists = []
+    start = 0
+    for length in lengths:
+        lists.append(flat[start:start + length].tolist())
+        start += length
+
+    return lists, offset
+
+
+class Snapshot(object):
+    """
+    the state of a world, with entities referred to by catalog id
+    -room_items / player_items: item ids each room / player holds directly
+    (not inside containers), in order
+    -container_items: item ids each container holds, by container id
+    -flags: OPENED and LOCKED bits of each item
+    -blocked: 1 for each blocked path
+    -locations: room id of each player, -1 for none
+    definitions (names, text, actions) are not part of it; a snapshot is
+    applied to a world built the same way as the one it was taken from
+    """
+
+    def __init__(self, counts, fingerprint, room_items, player_items,
+        container_items, flags, blocked, locations):
+
+        self.counts = counts
+        self.fingerprint = fingerprint
+        self.room_items = room_items
+        self.player_items = player_items
+        self.container_items = container_items
+        self.flags = flags
+        self.blocked = blocked
+        self.locations = locations
+
+    def __eq__(self, other):
+        return isinstance(other, Snapshot) and \
+            self.to_bytes() == other.to_bytes()
+
+    def __ne__(self, other):
+        return not self == other
+
+    @classmethod
+    def capture(cls, world):
+        """
+        take a snapshot of a world
+        """
+        catalog = world.catalog
+        try:
+            return cls._capture(catalog)
+        except KeyError:
+            # something joined the world since the catalog was last refreshed
+            catalog.refresh()
+            return cls._capture(catalog)
+
+    @classmethod
+    def _capture(cls, catalog):
+        id = catalog.ids.__getitem__
+
+        room_items = [[id(item) for item in room.items]
+            for room in catalog.rooms]
+        player_items = [[id(item) for item in player.inventory]
+            for player in catalog.players]
+
+        container_items = {}
+        flags = bytearray(len(catalog.items))
+        for item_id, item in enumerate(catalog.items):
+            if item.container:
+                if len(item.items):
+                    container_items[item_id] = [id(con_item)
+                        for con_item in item.items]
+                flags[item_id] = (OPENED if item.opened else 0) | \
+                    (LOCKED if item.locked else 0)
+
+        blocked = bytearray([1 if path.blocked else 0
+            for path in catalog.paths])
+        locations = [-1 if player.location is None else id(player.location)
+            for player in catalog.players]
+
+        return cls(catalog.counts, catalog.fingerprint, room_items,
+            player_items, container_items, flags, blocked, locations)
+
+    def apply(self, world):
+        """
+        restore a world to this snapshot
+        only holders whose contents changed are refilled, each in one go,
+        rather than moving every item through the holders' methods
+        """
+        catalog = world.catalog
+        if not catalog.counts == self.counts:
+            catalog.refresh()
+        if not catalog.counts == self.counts or \
+            not catalog.fingerprint == self.fingerprint:
+            raise ValueError("Snapshot was taken from a different world")
+
+        items = catalog.items
+        member = items.__getitem__
+        ids = catalog.ids
+
+        # work out what changes before touching anything: holders as
+        # (holder, its collection, new members), containers whose flags
+        # change as (container, opened, locked)
+        changes = []
+        flag_changes = []
+        holders = [(room, room.items, item_ids)
+            for room, item_ids in zip(catalog.rooms, self.room_items)]
+        holders.extend([(player, player.inventory, item_ids)
+            for player, item_ids in zip(catalog.players, self.player_items)])
+        for item_id, item in enumerate(items):
+            if item.container:
+                flags = self.flags[item_id]
+                opened = bool(flags & OPENED)
+                locked = bool(flags & LOCKED)
+                if not (item._opened == opened and item._locked == locked):
+                    flag_changes.append((item, opened, locked))
+                holders.append((item, item.items,
+                    self.container_items.get(item_id, ())))
+
+        for holder, collection, item_ids in holders:
+            members = list(map(member, item_ids))
+            if list(collection) == members:
+                continue
+
+            for item in collection:
+                if not item in ids:
+                    raise ValueError("{} is not in the world's catalog"
+                        .format(item.name))
+            changes.append((holder, collection, members))
+
+        for container, opened, locked in flag_changes:
+            container._opened = opened
+            container._locked = locked
+            container._version += 1
+
+        # items keep their contents, so only the changed holders' direct
+        # members need new parents
+        for holder, collection, members in changes:
+            for item in collection:
+                if item._parent is holder:
+                    item._parent = None
+            collection.clear()
+
+        for holder, collection, members in changes:
+            for item in members:
+                item._parent = holder
+            collection.update(members)
+            # rooms and containers keep versions; players don't
+            if not holder.HOLDER == "player":
+                holder._version += 1
+
+        # items were moved without going through the holders, so the world's
+        # index of them may be wrong now; it is rebuilt when next needed
+        if changes:
+            world._names = None
+
+        rerouted = False
+        for path, blocked in zip(catalog.paths, self.blocked):
+            if not path._blocked == bool(blocked):
+                path._blocked = bool(blocked)
+                path._version += 1
+                rerouted = True
+
+        # paths changed without blocking or unblocking them, so the router
+        # wasn't told; its routes may be wrong now
+        if rerouted and world._router is not None:
+            world._router.refresh()
+
+        for player, location in zip(catalog.players, self.locations):
+            new_location = None if location < 0 else catalog.rooms[location]
+            if not player.location is new_location:
+                player.location = new_location
+
+        world.on_restore.trigger()
+
+    def to_bytes(self):
+        """
+        encode the snapshot
+        """
+        containers = sorted(self.container_items)
+        parts = [
+            HEADER.pack(MAGIC, VERSION, self.counts[0], self.counts[1],
+                self.counts[2], self.counts[3], self.fingerprint),
+            _pack_lists(self.room_items),
+            _pack_lists(self.player_items),
+            _pack(containers),
+            _pack_lists([self.container_items[container_id]
+                for container_id in containers]),
+            _pack(self.locations),
+            bytes(self.flags),
+            bytes(self.blocked)
+        ]
+
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        decode a snapshot made by to_bytes()
+        """
+        if len(data) < HEADER.size:
+            raise ValueError("Data is too short to be a snapshot")
+
+        magic, version, rooms, paths, items, players, fingerprint = \
+            HEADER.unpack_from(data, 0)
+        if not magic == MAGIC:
+            raise ValueError("Data is not a snapshot")
+        if not version == VERSION:
+            raise ValueError("Unsupported snapshot version {}".format(version))
+
+        offset = HEADER.size
+        room_items, offset = _unpack_lists(data, offset)
+        player_items, offset = _unpack_lists(data, offset)
+        containers, offset = _unpack(data, offset)
+        contents, offset = _unpack_lists(data, offset)
+        locations, offset = _unpack(data, offset)
+        flags = bytearray(data[offset:offset + items])
+        offset += items
+        blocked = bytearray(data[offset:offset + paths])
+
+        return cls((rooms, paths, items, players), fingerprint, room_items,
+            player_items, dict(zip(containers, contents)), flags, blocked,
+            locations.tolist())
+
+
+def dumps(world):
+    """
+    snapshot a world to bytes
+    """
+    return Snapshot.capture(world).to_bytes()
+
+
+def loads(world, data):
+    """
+    restore a world from bytes made by dumps()
+    """
+    Snapshot.from_bytes(data).apply(world)
+
+
+def save(world, path):
+    """
+    snapshot a world to a file
+    """
+    with open(path, "wb") as f:
+        f.write(dumps(world))
+
+
+def load(world, path):
+    """
+    restore a world from a file made by save()
+    """
+    with open(path, "rb") as f:
+        loads(world, f.read())
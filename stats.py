@@ -0,0 +1,192 @@
+# stats.py
+# counters and latency histograms for the command kernel
+
+# upper bounds of the histogram buckets, in microseconds (powers of two up
+# to about a second); a last bucket takes everything slower
+BOUNDS = tuple(2 ** i for i in range(21))
+
+
+class Histogram(object):
+    """
+    counts of durations in buckets whose bounds double, so recording one is
+    a couple of operations and percentiles are good to within a factor of 2
+    """
+
+    __slots__ = ("_counts", "_count", "_total")
+
+    def __init__(self):
+        self._counts = [0] * (len(BOUNDS) + 1)
+        self._count = 0
+        self._total = 0.0
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def total(self):
+        """
+        sum of the durations, in seconds
+        """
+        return self._total
+
+    @property
+    def counts(self):
+        """
+        count in each bucket (see BOUNDS); don't modify it
+        """
+        return self._counts
+
+    def add(self, seconds):
+        self._count += 1
+        self._total += seconds
+        # bucket i holds durations up to 2 ** i microseconds
+        bucket = int(seconds * 1e6).bit_length()
+        if bucket > len(BOUNDS):
+            bucket = len(BOUNDS)
+        self._counts[bucket] += 1
+
+    def percentile(self, fraction):
+        """
+        upper bound, in seconds, of the bucket holding the given fraction of
+        the durations; None if there are none (or they are all past the last
+        bound)
+        """
+        if not self._count:
+            return None
+
+        rank = fraction * self._count
+        seen = 0
+        for bound, count in zip(BOUNDS, self._counts):
+            seen += count
+            if seen >= rank:
+                return bound / 1e6
+
+        return None
+
+
+class CommandStats(object):
+    """
+    what one command (or group of commands matched together) cost
+    -attempts: inputs it was tried on; matches: inputs it took
+    -match: time spent matching (preprocessing included)
+    -execute: time the command took to run once matched
+    """
+
+    __slots__ = ("attempts", "matches", "match", "execute")
+
+    def __init__(self):
+        self.attempts = 0
+        self.matches = 0
+        self.match = Histogram()
+        self.execute = Histogram()
+
+
+class KernelStats(object):
+    """
+    counters and histograms of a command kernel, by command name
+    with compiled dispatch, commands merged into a group are tried together,
+    so what trying them costs is only known for the group: its attempts and
+    matching time are kept by group name (see CommandGroup.name), and the
+    commands in it only count the inputs they took and executing them
+    see CommandKernel.instrument()
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self._inputs = 0
+        self._unmatched = 0
+        # time each input took, start to finish
+        self._latency = Histogram()
+        self._commands = {}
+        self._groups = {}
+
+    @property
+    def inputs(self):
+        return self._inputs
+
+    @property
+    def unmatched(self):
+        """
+        inputs no command matched
+        """
+        return self._unmatched
+
+    @property
+    def latency(self):
+        return self._latency
+
+    # commands property is read-only; it maps names to CommandStats
+    @property
+    def commands(self):
+        return self._commands
+
+    # groups property is read-only; it maps group names to CommandStats
+    @property
+    def groups(self):
+        return self._groups
+
+    def command(self, name):
+        """
+        stats of a command by name, created on first use
+        """
+        stats = self._commands.get(name)
+        if stats is None:
+            stats = self._commands[name] = CommandStats()
+
+        return stats
+
+    def group(self, name):
+        """
+        stats of a group of commands by name, created on first use
+        """
+        stats = self._groups.get(name)
+        if stats is None:
+            stats = self._groups[name] = CommandStats()
+
+        return stats
+
+    def record_input(self, seconds, matched):
+        self._inputs += 1
+        self._latency.add(seconds)
+        if not matched:
+            self._unmatched += 1
+
+    def dump(self):
+        """
+        the stats as text: totals, then a line per command, busiest first,
+        then a line per group of commands, if any
+        times are in microseconds; p50/p99 are bucket bounds
+        """
+        def us(seconds):
+            return "-" if seconds is None else "{:.0f}".format(seconds * 1e6)
+
+        lines = ["inputs {} unmatched {} latency p50 {} p99 {} "
+            "mean {}".format(self._inputs, self._unmatched,
+                us(self._latency.percentile(0.5)),
+                us(self._latency.percentile(0.99)),
+                us(self._latency.total / self._latency.count
+                    if self._latency.count else None)),
+            "{:<30} {:>9} {:>9} {:>11} {:>11} {:>9} {:>9}".format("command",
+                "attempts", "matches", "match_us", "execute_us", "exec_p50",
+                "exec_p99")]
+
+        for name, stats in sorted(self._commands.items(),
+            key=lambda item: -(item[1].match.total + item[1].execute.total)):
+            lines.append("{:<30} {:>9} {:>9} {:>11} {:>11} {:>9} {:>9}"
+                .format(name[:30], stats.attempts, stats.matches,
+                    us(stats.match.total), us(stats.execute.total),
+                    us(stats.execute.percentile(0.5)),
+                    us(stats.execute.percentile(0.99))))
+
+        if self._groups:
+            lines.append("{:<30} {:>9} {:>9} {:>11}".format("group",
+                "attempts", "matches", "match_us"))
+            for name, stats in sorted(self._groups.items(),
+                key=lambda item: -item[1].match.total):
+                lines.append("{:<30} {:>9} {:>9} {:>11}".format(name[:30],
+                    stats.attempts, stats.matches, us(stats.match.total)))
+
+        return "\n".join(lines)
@@ -0,0 +1,417 @@
+# store.py
+# rooms kept on disk and paged into a world as players reach them
+
+import json
+import sqlite3
+from collections import OrderedDict
+from functools import partial
+
+from .world import World
+from .room import Room, Path
+from .item import Item, Container
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT NOT NULL,
+    items TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS paths (
+    room INTEGER NOT NULL,
+    direction TEXT NOT NULL,
+    name TEXT NOT NULL,
+    destination INTEGER NOT NULL,
+    blocked INTEGER NOT NULL,
+    PRIMARY KEY (room, direction)
+);
+"""
+
+
+def _dump_item(item):
+    """
+    an item (and a container's contents) as a json-friendly dict
+    """
+    if type(item) == Item:
+        return {
+            "name": item.name,
+            "synonyms": list(item.synonyms),
+            "description": item.description,
+            "inventory": item.inventory,
+            "containable": item.containable
+        }
+
+    elif type(item) == Container:
+        return {
+            "container": True,
+            "name": item.name,
+            "synonyms": list(item.synonyms),
+            "description": item.description,
+            "inventory": item.inventory,
+            "opened": item.opened,
+            "locked": item.locked,
+            "items": [_dump_item(con_item) for con_item in item.items]
+        }
+
+    else:
+        raise TypeError("{} can't be stored; only plain items and "
+            "containers can".format(item.name))
+
+
+def _load_item(data):
+    """
+    build an item from a dict made by _dump_item()
+    """
+    if data.get("container"):
+        return Container(data["name"], tuple(data["synonyms"]),
+            data["description"],
+            items=[_load_item(con_item) for con_item in data["items"]],
+            opened=data["opened"], locked=data["locked"],
+            inventory=data["inventory"])
+
+    return Item(data["name"], tuple(data["synonyms"]), data["description"],
+        inventory=data["inventory"], containable=data["containable"])
+
+
+class RoomStore(object):
+    """
+    room definitions and state in an SQLite file
+    rooms are numbered in the order they are added; paths refer to their
+    destinations by number
+    only rooms with plain items and containers can be stored, and custom
+    text and item actions are not kept
+    """
+
+    def __init__(self, filename=":memory:"):
+        self._db = sqlite3.connect(filename)
+        self._db.executescript(SCHEMA)
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM rooms").fetchone()[0]
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def add_rooms(self, rooms):
+        """
+        store rooms built in memory, returning their ids
+        paths must lead to rooms in the same batch
+        """
+        first = self._db.execute(
+            "SELECT COALESCE(MAX(id) + 1, 0) FROM rooms").fetchone()[0]
+        ids = dict([(room, first + i) for i, room in enumerate(rooms)])
+
+        room_rows = []
+        path_rows = []
+        for room, room_id in ids.items():
+            items = [_dump_item(item) for item in room.items
+                if item.owner is None]
+            room_rows.append((room_id, room.name, room.description,
+                json.dumps(items)))
+
+            for direction, path in room.paths.items():
+                if path is None:
+                    continue
+                if not path.destination in ids:
+                    raise ValueError("{} leads out of the rooms being stored"
+                        .format(path.name))
+                path_rows.append((room_id, direction, path.name,
+                    ids[path.destination], 1 if path.blocked else 0))
+
+        self._db.executemany("INSERT INTO rooms VALUES (?, ?, ?, ?)",
+            room_rows)
+        self._db.executemany("INSERT INTO paths VALUES (?, ?, ?, ?, ?)",
+            path_rows)
+        self._db.commit()
+
+        return [ids[room] for room in rooms]
+
+    def find(self, name):
+        """
+        id of the first room with a name, or None
+        """
+        row = self._db.execute("SELECT id FROM rooms WHERE name = ? "
+            "ORDER BY id LIMIT 1", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def load(self, room_id):
+        """
+        name, description and items (as dicts) of a room, and its paths as
+        (direction, name, destination id, destination name, blocked)
+        """
+        row = self._db.execute("SELECT name, description, items FROM rooms "
+            "WHERE id = ?", (room_id,)).fetchone()
+        if row is None:
+            raise KeyError("There is no room {}".format(room_id))
+
+        paths = self._db.execute("SELECT paths.direction, paths.name, "
+            "paths.destination, rooms.name, paths.blocked FROM paths "
+            "JOIN rooms ON rooms.id = paths.destination "
+            "WHERE paths.room = ? ORDER BY paths.rowid",
+            (room_id,)).fetchall()
+
+        return row[0], row[1], json.loads(row[2]), paths
+
+    def save(self, room_id, room):
+        """
+        write back the state of a room: its items and which paths are blocked
+        """
+        items = [_dump_item(item) for item in room.items
+            if item.owner is None]
+        self._db.execute("UPDATE rooms SET items = ? WHERE id = ?",
+            (json.dumps(items), room_id))
+        self._db.executemany("UPDATE paths SET blocked = ? "
+            "WHERE room = ? AND direction = ?",
+            [(1 if path.blocked else 0, room_id, direction)
+                for direction, path in room.paths.items() if path is not None])
+
+    def commit(self):
+        self._db.commit()
+
+
+class PagedPath(Path):
+    """
+    path whose destination is loaded the first time it is reached
+    """
+
+    def __init__(self, name, world, destination_id, destination_name,
+        blocked=False, text={}):
+
+        super(PagedPath, self).__init__(name, None, blocked, text)
+        self._world = world
+        self._destination_id = destination_id
+        self._destination_name = destination_name
+
+    @property
+    def destination(self):
+        # not kept; the room may have been evicted since
+        return self._world.room(self._destination_id)
+
+    @property
+    def destination_id(self):
+        return self._destination_id
+
+    @property
+    def destination_name(self):
+        return self._destination_name
+
+
+class PagedWorld(World):
+    """
+    world whose rooms live in a RoomStore and are loaded on demand
+    -a room is built, with its paths and items, when a path first leads to it
+    (or room() is called); until then it doesn't exist in memory
+    -at most capacity rooms stay loaded; the least recently used ones are
+    evicted, writing their state back to the store first if it changed
+    -rooms with a player in them are never evicted
+    rooms holds only the loaded rooms, so whole-world features (catalog,
+    snapshots, journals) don't apply
+    items the player carries belong to the player, not a room, and are
+    stored with whichever room they are left in
+    """
+
+    def __init__(self, store, player, start=0, capacity=1024):
+        self._store = store
+        # most rooms kept in memory at once
+        self._capacity = capacity
+        # loaded rooms by id, least recently used first
+        self._loaded = OrderedDict()
+        # ids of loaded rooms
+        self._ids = {}
+        # ids of loaded rooms whose state changed since they were loaded
+        self._dirty = set()
+        # callbacks watching each loaded room: (dirty, added, removed)
+        self._watchers = {}
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._writes = 0
+
+        super(PagedWorld, self).__init__(player)
+        player.location = self.room(start)
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    @property
+    def writes(self):
+        """
+        rooms written back to the store
+        """
+        return self._writes
+
+    @property
+    def hit_ratio(self):
+        lookups = self._hits + self._misses
+        return self._hits / float(lookups) if lookups else 0.0
+
+    def start(self):
+        """
+        start game; have player enter its current location
+        (there is no catalog to take; it would pin every room ever loaded)
+        """
+        self._player.location.enter(player=self._player)
+
+    def room_id(self, room):
+        return self._ids[room]
+
+    def room(self, room_id):
+        """
+        room by id, loading it if it isn't in memory
+        """
+        room = self._loaded.get(room_id)
+        if room is not None:
+            self._hits += 1
+            self._loaded.move_to_end(room_id)
+            return room
+
+        self._misses += 1
+        room = self._load(room_id)
+        self._evict()
+        return room
+
+    def _load(self, room_id):
+        name, description, items, paths = self._store.load(room_id)
+
+        room = Room(name, description, [_load_item(item) for item in items])
+        for direction, path_name, destination_id, destination_name, \
+            blocked in paths:
+            room.set_path(direction, PagedPath(path_name, self,
+                destination_id, destination_name, bool(blocked)))
+
+        self._loaded[room_id] = room
+        self._ids[room] = room_id
+        self.add_room(room)
+        self._watch(room_id, room)
+
+        return room
+
+    def _watch(self, room_id, room):
+        """
+        mark the room dirty when its state changes
+        """
+        # kept so the same callbacks can be unsubscribed from containers
+        # taken out of the room
+        watcher = (partial(self._mark_dirty, room_id),
+            partial(self._item_added, room_id),
+            partial(self._item_removed, room_id))
+        self._watchers[room_id] = watcher
+        dirty, added, removed = watcher
+
+        room.items.on_add.subscribe(added)
+        room.items.on_remove.subscribe(removed)
+        room.items.on_clear.subscribe(dirty)
+        for item in room.items:
+            if item.container:
+                self._watch_container(watcher, item)
+
+        for path in room.paths.values():
+            if path is not None:
+                path.on_block.subscribe(dirty)
+                path.on_unblock.subscribe(dirty)
+
+    def _container_events(self, watcher, container):
+        """
+        (event, callback) pairs watching a container for a room
+        """
+        dirty, added, removed = watcher
+        return ((container.on_open, dirty), (container.on_close, dirty),
+            (container.on_lock, dirty), (container.on_unlock, dirty),
+            (container.items.on_add, added),
+            (container.items.on_remove, removed),
+            (container.items.on_clear, dirty))
+
+    def _watch_container(self, watcher, container):
+        """
+        watch a container and every container inside it
+        """
+        for event, callback in self._container_events(watcher, container):
+            event.subscribe(callback)
+        for item in container.items:
+            if item.container:
+                self._watch_container(watcher, item)
+
+    def _unwatch_container(self, watcher, container):
+        for event, callback in self._container_events(watcher, container):
+            event.unsubscribe(callback)
+        for item in container.items:
+            if item.container:
+                self._unwatch_container(watcher, item)
+
+    def _item_added(self, room_id, item):
+        self._mark_dirty(room_id)
+        if item.container:
+            self._watch_container(self._watchers[room_id], item)
+
+    def _item_removed(self, room_id, item):
+        self._mark_dirty(room_id)
+        if item.container:
+            self._unwatch_container(self._watchers[room_id], item)
+
+    def _mark_dirty(self, room_id, *args):
+        self._dirty.add(room_id)
+
+    def _evict(self):
+        """
+        evict least recently used rooms until within capacity
+        """
+        if len(self._loaded) <= self._capacity:
+            return
+
+        occupied = set([player.location for player in self.players])
+        # the room just loaded (last) is about to be used; keep it
+        newest = next(reversed(self._loaded))
+        excess = len(self._loaded) - self._capacity
+
+        # walk from the least recently used end only as far as it takes to
+        # find enough rooms to evict (the dict can't change meanwhile)
+        evicted = []
+        for room_id, room in self._loaded.items():
+            if room_id == newest or len(evicted) == excess:
+                break
+            if not room in occupied:
+                evicted.append((room_id, room))
+
+        for room_id, room in evicted:
+            if room_id in self._dirty:
+                self._save(room_id, room)
+            del self._loaded[room_id]
+            del self._ids[room]
+            del self._watchers[room_id]
+            self.remove_room(room)
+            self._evictions += 1
+
+        self._store.commit()
+
+    def _save(self, room_id, room):
+        self._store.save(room_id, room)
+        self._dirty.discard(room_id)
+        self._writes += 1
+
+    def flush(self):
+        """
+        write every changed room back to the store
+        """
+        for room_id in list(self._dirty):
+            self._save(room_id, self._loaded[room_id])
+        self._store.commit()
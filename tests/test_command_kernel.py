@@ -0,0 +1,96 @@
+# test_command_kernel.py
+# compiled dispatch runs the same command as the plain loop
+
+import random
+import unittest
+
+from ..command import Command
+from ..command_kernel import CommandKernel
+
+
+class Recorder(Command):
+    """
+    command that records what it was executed with
+    """
+
+    def __init__(self, name, pattern, log):
+        super(Recorder, self).__init__(name, pattern)
+        self._log = log
+
+    def execute(self, world, **kwargs):
+        self._log.append((self.name, kwargs))
+
+
+# patterns whose input may or may not start with a whole word
+PATTERNS = [
+    r"^take (?P<item>\w+)$",
+    r"^take ?(?P<item>\w+)$",
+    r"^take *(?P<item>\w+)$",
+    r"^take {0,1}(?P<item>\w+) (?P<rest>\w+)$",
+    r"^(take|get) (?P<item>\w+)$",
+    r"^(?:take|pick up) ?(?P<item>\w+)$",
+    r"^(look|view)$",
+    r"^look(?P<at> at (?P<item>\w+))?$",
+    r"^(?P<verb>\w+) (?P<item>\w+)$",
+    r"^(?P<verb>\w+)$",
+    r"^tak(?P<end>\w*) (?P<item>\w+)$",
+    r"^(?P<item>\w+) ?(?P<rest>\w*)$",
+]
+
+INPUTS = ["take knife", "takeknife", "take  knife", "take knife now",
+    "takeknife now", "get knife", "pick up knife", "pick upknife",
+    "look", "view", "look at knife", "lookat knife", "takes knife",
+    "knife", "", "take", "drop knife", "pick knife"]
+
+
+def dispatch(dispatch, patterns, inputs, many=False):
+    """
+    what each input ran with a kernel of commands for the patterns
+    """
+    log = []
+    kernel = CommandKernel([Recorder(str(i), pattern, log)
+        for i, pattern in enumerate(patterns)], dispatch=dispatch)
+
+    ran = []
+    if many:
+        kernel.input_many(None, inputs)
+        return log
+
+    for input in inputs:
+        del log[:]
+        kernel.input(None, input)
+        ran.append(list(log))
+
+    return ran
+
+
+class DispatchTest(unittest.TestCase):
+
+    def assertSameDispatch(self, patterns, inputs):
+        for many in (False, True):
+            self.assertEqual(
+                dispatch(CommandKernel.DISPATCH_COMPILED, patterns, inputs,
+                    many),
+                dispatch(CommandKernel.DISPATCH_LOOP, patterns, inputs,
+                    many),
+                "patterns {}".format(patterns))
+
+    def test_optional_space_after_verb(self):
+        self.assertSameDispatch([r"^take (?P<item>\w+)$",
+            r"^take ?(?P<z>\w+)", r"^(?P<verb>\w+)$"], INPUTS)
+
+    def test_every_pattern_alone(self):
+        for pattern in PATTERNS:
+            self.assertSameDispatch([pattern], INPUTS)
+
+    def test_random_command_lists(self):
+        rand = random.Random(7)
+        for trial in range(300):
+            patterns = [rand.choice(PATTERNS)
+                for i in range(rand.randint(2, 8))]
+            inputs = [rand.choice(INPUTS) for i in range(20)]
+            self.assertSameDispatch(patterns, inputs)
+
+
+if __name__ == "__main__":
+    unittest.main()
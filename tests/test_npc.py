@@ -0,0 +1,57 @@
+# test_npc.py
+# crowds of NPCs
+
+import unittest
+
+from .. import npc, snapshot
+from ..generate import WorldGenerator
+
+
+@unittest.skipIf(npc.numpy is None, "crowds need numpy")
+class CrowdTest(unittest.TestCase):
+
+    def setUp(self):
+        self.world = WorldGenerator(seed=5, rooms=100, blocked=0.2).build()
+        self.world.start()
+        self.crowd = npc.Crowd(self.world, "goblin")
+        self.paths = [path for room in self.crowd.rooms
+            for path in room.paths.values() if path is not None]
+
+    def assertMaskMatches(self):
+        self.assertEqual(self.crowd.blocked.tolist(),
+            [path.blocked for path in self.paths])
+
+    def test_block_and_unblock(self):
+        path = self.paths[0]
+        path.toggle()
+        self.assertMaskMatches()
+        path.toggle()
+        self.assertMaskMatches()
+
+    def test_restore(self):
+        data = snapshot.dumps(self.world)
+        for path in self.paths[::3]:
+            path.toggle()
+        self.assertMaskMatches()
+
+        # the snapshot sets the paths back without blocking or unblocking
+        snapshot.loads(self.world, data)
+        self.assertMaskMatches()
+
+    def test_blocked_paths_are_not_taken(self):
+        for path in self.paths:
+            if not path.blocked:
+                path.block()
+        data = snapshot.dumps(self.world)
+        for path in self.paths:
+            path.unblock()
+        snapshot.loads(self.world, data)
+
+        self.crowd.spawn(1000)
+        before = self.crowd.positions.copy()
+        self.assertEqual(self.crowd.step(), 0)
+        self.assertEqual(self.crowd.positions.tolist(), before.tolist())
+
+
+if __name__ == "__main__":
+    unittest.main()
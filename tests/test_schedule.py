@@ -0,0 +1,178 @@
+# test_schedule.py
+# timers run in order as time is advanced tick by tick
+
+import unittest
+
+from ..schedule import Scheduler
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+        # (tick, name) for every callback run
+        self.runs = []
+
+    def record(self, name):
+        self.runs.append((self.scheduler.tick, name))
+
+    def test_after_runs_once_in_due_order(self):
+        self.scheduler.after(3, self.record, "c")
+        self.scheduler.after(1, self.record, "a")
+        self.scheduler.after(2, self.record, "b")
+        self.assertEqual(self.scheduler.next_due, 1)
+
+        self.assertEqual(self.scheduler.advance(5), 3)
+        self.assertEqual(self.runs, [(1, "a"), (2, "b"), (3, "c")])
+        self.assertEqual(self.scheduler.tick, 5)
+        self.assertEqual(self.scheduler.pending, 0)
+        self.assertEqual(self.scheduler.advance(5), 0)
+
+    def test_after_zero_runs_on_next_advance(self):
+        timer = self.scheduler.after(0, self.record, "now")
+        self.assertEqual(self.scheduler.advance(0), 1)
+        self.assertEqual(self.runs, [(0, "now")])
+        self.assertFalse(timer.active)
+
+    def test_every_repeats(self):
+        self.scheduler.every(3, self.record, "tick")
+        self.scheduler.every(4, self.record, "tock", delay=1)
+
+        self.scheduler.advance(9)
+        self.assertEqual(self.runs, [(1, "tock"), (3, "tick"), (5, "tock"),
+            (6, "tick"), (9, "tock"), (9, "tick")])
+        self.assertEqual(self.scheduler.pending, 2)
+
+    def test_ties_run_in_scheduled_order(self):
+        for name in "abcde":
+            self.scheduler.after(2, self.record, name)
+        self.scheduler.at(2, self.record, "f")
+
+        self.scheduler.advance(2)
+        self.assertEqual(self.runs, [(2, name) for name in "abcdef"])
+
+    def test_periodic_ties_keep_order(self):
+        self.scheduler.every(2, self.record, "a")
+        self.scheduler.every(1, self.record, "b", delay=2)
+
+        self.scheduler.advance(4)
+        self.assertEqual(self.runs, [(2, "a"), (2, "b"), (3, "b"), (4, "a"),
+            (4, "b")])
+
+    def test_advance_one_tick_at_a_time(self):
+        self.scheduler.every(2, self.record, "even")
+        self.scheduler.after(3, self.record, "three")
+
+        counts = [self.scheduler.advance() for i in range(6)]
+        self.assertEqual(counts, [0, 1, 1, 1, 0, 1])
+        self.assertEqual(self.scheduler.tick, 6)
+        self.assertEqual(self.runs, [(2, "even"), (3, "three"), (4, "even"),
+            (6, "even")])
+
+    def test_advance_in_steps_matches_one_go(self):
+        other = Scheduler()
+        other_runs = []
+        for scheduler, record in ((self.scheduler, self.record),
+            (other, lambda name: other_runs.append((other.tick, name)))):
+            scheduler.every(3, record, "a")
+            scheduler.every(5, record, "b", delay=0)
+            scheduler.after(7, record, "c")
+
+        for ticks in (1, 0, 4, 2, 9, 1):
+            self.scheduler.advance(ticks)
+        other.advance(17)
+
+        self.assertEqual(self.runs, other_runs)
+        self.assertEqual(self.scheduler.tick, other.tick)
+
+    def test_cancel(self):
+        once = self.scheduler.after(2, self.record, "once")
+        periodic = self.scheduler.every(1, self.record, "periodic")
+        self.assertEqual(self.scheduler.pending, 2)
+
+        once.cancel()
+        once.cancel()
+        self.assertFalse(once.active)
+        self.assertEqual(self.scheduler.pending, 1)
+
+        self.scheduler.advance(2)
+        periodic.cancel()
+        self.scheduler.advance(3)
+        self.assertEqual(self.runs, [(1, "periodic"), (2, "periodic")])
+        self.assertEqual(self.scheduler.pending, 0)
+        self.assertEqual(self.scheduler.next_due, None)
+
+    def test_callback_cancels_itself(self):
+        def stop():
+            self.record("stop")
+            if len(self.runs) == 2:
+                timer.cancel()
+
+        timer = self.scheduler.every(1, stop)
+        self.scheduler.advance(5)
+        self.assertEqual(self.runs, [(1, "stop"), (2, "stop")])
+        self.assertEqual(self.scheduler.pending, 0)
+
+    def test_callback_schedules_another(self):
+        def first():
+            self.record("first")
+            self.scheduler.after(0, self.record, "same tick")
+            self.scheduler.after(1, self.record, "next tick")
+
+        self.scheduler.after(1, first)
+        self.scheduler.advance(3)
+        self.assertEqual(self.runs, [(1, "first"), (1, "same tick"),
+            (2, "next tick")])
+
+    def test_many_cancelled_timers_are_dropped(self):
+        timers = [self.scheduler.after(i + 1, self.record, i)
+            for i in range(200)]
+        for timer in timers[:150]:
+            timer.cancel()
+
+        self.assertEqual(self.scheduler.pending, 50)
+        self.assertTrue(len(self.scheduler._queue) < 200)
+
+        self.scheduler.advance(200)
+        self.assertEqual([name for tick, name in self.runs],
+            list(range(150, 200)))
+
+    def test_callback_raising_stops_at_its_tick(self):
+        def fail():
+            raise RuntimeError("failed")
+
+        self.scheduler.after(1, self.record, "before")
+        self.scheduler.after(2, fail)
+        self.scheduler.after(2, self.record, "after")
+
+        with self.assertRaises(RuntimeError):
+            self.scheduler.advance(5)
+        self.assertEqual(self.scheduler.tick, 2)
+        self.assertEqual(self.runs, [(1, "before")])
+
+        self.scheduler.advance(3)
+        self.assertEqual(self.runs, [(1, "before"), (2, "after")])
+        self.assertEqual(self.scheduler.tick, 5)
+
+    def test_clear(self):
+        timers = [self.scheduler.after(1, self.record, "a"),
+            self.scheduler.every(1, self.record, "b")]
+        self.scheduler.clear()
+
+        self.assertEqual(self.scheduler.pending, 0)
+        self.assertFalse(any(timer.active for timer in timers))
+        self.assertEqual(self.scheduler.advance(3), 0)
+
+    def test_bad_arguments(self):
+        with self.assertRaises(ValueError):
+            self.scheduler.after(-1, self.record, "a")
+        with self.assertRaises(ValueError):
+            self.scheduler.every(0, self.record, "a")
+        with self.assertRaises(ValueError):
+            self.scheduler.every(1, self.record, "a", delay=-1)
+        with self.assertRaises(ValueError):
+            self.scheduler.advance(-1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# test_snapshot.py
+# round trips of world state through snapshots
+
+import unittest
+
+from .. import snapshot
+from ..generate import WorldGenerator, GRAPH
+
+
+def build():
+    """
+    a started world with nested, locked and open containers and blocked
+    paths; every call builds the same one
+    """
+    world = WorldGenerator(seed=3, rooms=200, layout=GRAPH).build()
+    world.start()
+    return world
+
+
+def layout(items):
+    """
+    names of items, with what each container holds and its flags, in order
+    """
+    return [(item.name, item.opened, item.locked, layout(item.items))
+        if item.container else item.name for item in items]
+
+
+def state(world):
+    """
+    everything a snapshot records, by name
+    """
+    return ([layout(room.items) for room in world.rooms],
+        layout(world.player.inventory),
+        [[path.blocked for path in room.paths.values() if path is not None]
+            for room in world.rooms],
+        world.player.location.name)
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.world = build()
+        self.copy = build()
+
+        # change some of everything: move the player, take items out of
+        # containers, move containers, open them and block paths
+        player = self.world.player
+        rooms = list(self.world.rooms)
+        for room in rooms[::5]:
+            player.location = room
+            for item in list(room.items):
+                if item.container:
+                    if not item.locked:
+                        item.open()
+                    for inner in list(item.items):
+                        if inner.inventory and not item.locked:
+                            player.take(inner)
+                elif item.inventory:
+                    player.take(item)
+            for path in room.paths.values():
+                if path is not None and not path.blocked:
+                    path.block()
+                    break
+        for item in list(player.inventory)[::2]:
+            player._erase(item)
+        rooms[1].add([item for item in rooms[0].items if item.container])
+        player.location = rooms[7]
+
+    def test_round_trip(self):
+        data = snapshot.dumps(self.world)
+        self.assertNotEqual(state(self.copy), state(self.world))
+
+        snapshot.loads(self.copy, data)
+        self.assertEqual(state(self.copy), state(self.world))
+        self.assertEqual(snapshot.dumps(self.copy), data)
+
+    def test_restores_earlier_state(self):
+        data = snapshot.dumps(self.copy)
+        expected = state(self.copy)
+
+        snapshot.loads(self.world, data)
+        self.assertEqual(state(self.world), expected)
+
+        # items are found by name where the snapshot put them
+        for room in self.world.rooms:
+            for item in room.items:
+                self.assertIs(item.room, room)
+                if item.container:
+                    for inner in item.items:
+                        self.assertIs(room.get(inner.name).room, room)
+                        self.assertIs(inner.owner, item)
+
+    def test_unchanged_world(self):
+        data = snapshot.dumps(self.world)
+        before = state(self.world)
+
+        snapshot.loads(self.world, data)
+        self.assertEqual(state(self.world), before)
+
+    def test_different_world(self):
+        other = WorldGenerator(seed=4, rooms=200, layout=GRAPH).build()
+        other.start()
+        with self.assertRaises(ValueError):
+            snapshot.loads(other, snapshot.dumps(self.world))
+
+
+if __name__ == "__main__":
+    unittest.main()
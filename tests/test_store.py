@@ -0,0 +1,74 @@
+# test_store.py
+# rooms paged in and out of a store keep their state
+
+import unittest
+
+from ..item import Item, Container
+from ..player import Player
+from ..room import Room
+from ..store import RoomStore, PagedWorld
+
+
+def build():
+    """
+    a paged world of three rooms, keeping one loaded at a time besides the
+    player's; the cellar has a closed casket inside an open chest
+    """
+    casket = Container("casket", items=[Item("ring")])
+    chest = Container("chest", items=[casket], opened=True)
+    cellar = Room("cellar", items=[chest])
+    attic = Room("attic")
+    hall = Room("hall")
+
+    store = RoomStore()
+    cellar_id, attic_id, hall_id = store.add_rooms([cellar, attic, hall])
+    world = PagedWorld(store, Player(), start=attic_id, capacity=1)
+    return world, cellar_id, hall_id
+
+
+class PagedWorldTest(unittest.TestCase):
+
+    def chest(self, world, room_id):
+        return world.room(room_id).items.get("chest")
+
+    def test_nested_container_change_is_saved(self):
+        world, cellar_id, hall_id = build()
+        casket = self.chest(world, cellar_id).items.get("casket")
+        casket.open()
+
+        # loading the hall evicts the cellar
+        world.room(hall_id)
+        self.assertEqual(world.evictions, 1)
+
+        casket = self.chest(world, cellar_id).items.get("casket")
+        self.assertTrue(casket.opened)
+
+    def test_container_added_later_is_watched(self):
+        world, cellar_id, hall_id = build()
+        cellar = world.room(cellar_id)
+        box = Container("box")
+        cellar.items.get("chest")._insert(box)
+        world.flush()
+
+        box.open()
+        world.room(hall_id)
+        self.assertEqual(world.evictions, 1)
+
+        box = self.chest(world, cellar_id).items.get("box")
+        self.assertTrue(box.opened)
+
+    def test_container_taken_out_is_not_watched(self):
+        world, cellar_id, hall_id = build()
+        chest = self.chest(world, cellar_id)
+        casket = chest.items.get("casket")
+        Room("shed", items=[casket])
+        world.flush()
+        writes = world.writes
+
+        casket.open()
+        world.flush()
+        self.assertEqual(world.writes, writes)
+
+
+if __name__ == "__main__":
+    unittest.main()
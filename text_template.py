@@ -1,38 +1,175 @@
 # text_template.py
 # text template mixin
 
+from string import Formatter
+
+from .message import Message
+
+
+# fields referenced by each template string, parsed once per distinct string
+_FIELDS = {}
+# context providers of each class, merged along its mro; see providers()
+_PROVIDERS = {}
+# templates of each class, merged along its mro; see templates()
+_TEMPLATES = {}
+
+
+def template_fields(template):
+    """
+    names of the fields a template string refers to
+    ex. "The {item.name} is in the {room}." refers to item and room
+    """
+    fields = _FIELDS.get(template)
+    if fields is None:
+        names = set()
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if field is not None:
+                # only the first part of "a.b" or "a[0]" is a context field
+                names.add(field.split(".", 1)[0].split("[", 1)[0])
+            if spec:
+                # nested fields in the format spec (ex. "{name:{width}}")
+                names.update(template_fields(spec))
+
+        fields = _FIELDS[template] = frozenset(names)
+
+    return fields
+
 
 class TextTemplateMixin(object):
     """
     provides functionality for customizing text (usually for echoing)
+    templates are looked up in the object's own overrides (the text passed
+    in), then in the TEXT tables of its class and bases, subclasses winning;
+    the class tables are shared, not copied into every object
+    the fields templates refer to are filled in by the class's CONTEXT
+    providers (field name -> function of the object), and otherwise by the
+    extra arguments passed to text(); only the fields a template refers to
+    are computed
     """
 
+    # storage (_text) is declared by subclasses that use __slots__
+    __slots__ = ()
+
+    # context providers; subclasses add their own
+    CONTEXT = {}
+
     def __init__(self, text={}):
-        self._text = {}
-        self._text.update(text)
+        # templates overriding the class tables; None until there are any
+        self._text = None
+        self.update_text(text)
 
         # call next mixin constructor, if it exists
         # this makes multiple inheritance work
         super(TextTemplateMixin, self).__init__()
 
     def update_text(self, text):
-        self._text.update(text)
+        """
+        override templates
+        a TEXT table of the object's own class or bases is already part of
+        its lookup, so passing one (as constructors do) stores nothing
+        """
+        if not text:
+            return
+
+        if self._text is None:
+            for cls in type(self).__mro__:
+                if cls.__dict__.get("TEXT") is text:
+                    return
+            self._text = {}
+
+        for key, template in text.items():
+            # parse now, so text() only has to look the fields up
+            template_fields(template)
+            self._text[key] = template
+
+    @classmethod
+    def templates(cls):
+        """
+        templates of the class and its bases, subclasses winning
+        don't modify it
+        """
+        templates = _TEMPLATES.get(cls)
+        if templates is None:
+            templates = {}
+            for base in reversed(cls.__mro__):
+                table = base.__dict__.get("TEXT")
+                if isinstance(table, dict):
+                    templates.update(table)
+            for template in templates.values():
+                template_fields(template)
+            _TEMPLATES[cls] = templates
+
+        return templates
+
+    def template(self, key):
+        """
+        template the object uses for a key
+        """
+        if self._text is not None and key in self._text:
+            return self._text[key]
+
+        templates = self.templates()
+        if key in templates:
+            return templates[key]
+
+        raise KeyError("Template dictionary has no key {}".format(key))
+
+    @classmethod
+    def providers(cls):
+        """
+        context providers of the class and its bases, subclasses winning
+        """
+        providers = _PROVIDERS.get(cls)
+        if providers is None:
+            providers = {}
+            for base in reversed(cls.__mro__):
+                providers.update(base.__dict__.get("CONTEXT", {}))
+            _PROVIDERS[cls] = providers
+
+        return providers
 
     def context(self, **extra):
         """
         return the content of the template
-        subclasses should override this, obviously
+        this computes every field; text() only computes the ones it needs
+        subclasses may still override this, in which case text() uses it
         """
         context = {}
         context.update(extra)
+        for field, provider in self.providers().items():
+            context[field] = provider(self)
+        return context
+
+    def _fields(self, template, extra):
+        """
+        values of the fields a template refers to
+        """
+        # a subclass building its own context the old way
+        if not type(self).context == TextTemplateMixin.context:
+            return self.context(**extra)
+
+        providers = self.providers()
+        context = {}
+        for field in template_fields(template):
+            # provided fields win over extra arguments, as they always have
+            if field in providers:
+                context[field] = providers[field](self)
+            elif field in extra:
+                context[field] = extra[field]
+
         return context
 
     def text(self, key, **extra):
         """
         retrieve a text with a built-in context
         """
+        template = self.template(key)
+        return template.format_map(self._fields(template, extra))
 
-        if key in self._text:
-            return self._text[key].format(**self.context(**extra))
-        else:
-            raise KeyError("Template dictionary has no key {}".format(key))
\ No newline at end of file
+    def message(self, key, **extra):
+        """
+        like text(), but the text is only rendered when the message is read
+        the fields are filled in now
+        """
+        template = self.template(key)
+        return Message(self, key, template, self._fields(template, extra))
@@ -0,0 +1,27 @@
+# tokens.py
+# split user input into the words commands match against
+
+from functools import lru_cache
+
+
+# characters stripped from input
+PUNCTUATION = "`~!@#$%^&*()-=_+,./<>?;':\"[]{}|"
+_STRIP = str.maketrans("", "", PUNCTUATION)
+
+# most distinct inputs (per stopword set) kept tokenized
+CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def tokenize(input, stopwords=frozenset()):
+    """
+    lowercase the input, strip punctuation and drop stopwords (a frozenset)
+    returns (tokens, text): the words left, and them joined by single spaces
+    results are cached by input and stopwords, least recently used dropped
+    first; tokenize.cache_info() tells how well it does
+    ex. tokenize("Take the RED lamp!", frozenset(["the"]))
+    returns (("take", "red", "lamp"), "take red lamp")
+    """
+    tokens = tuple([word for word in input.lower().translate(_STRIP).split()
+        if not word in stopwords])
+    return tokens, " ".join(tokens)
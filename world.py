@@ -1,7 +1,58 @@
 # world.py
 # collection of rooms
 
+import gc
+import threading
+from contextlib import contextmanager
+
 from .echo import EchoMixin
+from .event import EventSlot
+from .collection import OrderedSet, ItemIndex
+from .catalog import Catalog
+from .route import Router
+from .schedule import Scheduler
+from .bus import MessageBus, MultiplayerBus, ROOM, WORLD
+
+
+# bulk loads under way (they nest, and may run in several threads) and
+# whether the collector was on before the first of them started
+_bulk_lock = threading.Lock()
+_bulk_depth = 0
+_bulk_enabled = False
+
+
+@contextmanager
+def bulk_load(freeze=False):
+    """
+    build a large world without the cyclic garbage collector repeatedly
+    rescanning the growing object graph, which makes building a world
+    superlinear in its size
+    the collector is off while any bulk load is under way; it comes back on
+    when the last one ends, if it was on before the first
+    -freeze: then also move every object in the process, not only those
+    built inside, into the collector's permanent generation (gc.freeze()),
+    so none of it is rescanned later; this is process-wide and permanent
+    (frozen objects are never collected), so only use it for a world that
+    lives as long as the process
+    ex. with bulk_load(): world = World(player, make_rooms())
+    """
+    global _bulk_depth, _bulk_enabled
+
+    with _bulk_lock:
+        if not _bulk_depth:
+            _bulk_enabled = gc.isenabled()
+            gc.disable()
+        _bulk_depth += 1
+
+    try:
+        yield
+    finally:
+        if freeze:
+            gc.freeze()
+        with _bulk_lock:
+            _bulk_depth -= 1
+            if not _bulk_depth and _bulk_enabled:
+                gc.enable()
 
 
 class AbstractWorld(EchoMixin):
@@ -9,12 +60,122 @@ class AbstractWorld(EchoMixin):
     base class for world
     """
 
+    # class of the world's message bus
+    BUS = MessageBus
+
+    # EVENTS
+    # the world's state was restored without going through its entities
+    # (ex. Snapshot.apply); whatever keeps its own copy of that state should
+    # read it again
+    on_restore = EventSlot()
+
     def __init__(self, rooms=[]):
         super(AbstractWorld, self).__init__()
-        
-        self._rooms = []
+
+        # routes the messages of the world's entities (rooms get it as
+        # they are added, so it comes first)
+        self._bus = self.BUS(self)
+        self._rooms = OrderedSet()
+        # entity ids, numbered on first use (see Catalog)
+        self._catalog = None
+        # shortest routes between rooms, made on first use (see Router)
+        self._router = None
+        # timed events, made on first use (see Scheduler)
+        self._scheduler = None
+        # paths leading into each room: room -> {path: (room it leaves
+        # from, direction)}; None until first used (see incoming())
+        self._incoming = None
+        # every item in the world by name and synonym; None until first used
+        # (see names)
+        self._names = None
         self.add_rooms(rooms)
 
+    # rooms property is read-only
+    @property
+    def rooms(self):
+        return self._rooms
+
+    @property
+    def players(self):
+        return []
+
+    # bus property is read-only
+    @property
+    def bus(self):
+        return self._bus
+
+    @property
+    def catalog(self):
+        if self._catalog is None:
+            self._catalog = Catalog(self)
+
+        return self._catalog
+
+    @property
+    def names(self):
+        """
+        index of every item in the world, in rooms, inventories and
+        containers alike, by name and synonym (see ItemCollection.find)
+        it is built the first time it is needed and kept up to date as items
+        enter and leave the world; moving items around inside the world
+        doesn't touch it; don't modify it
+        """
+        if self._names is None:
+            names = ItemIndex()
+            for room in self._rooms:
+                names.add_tree(room.items)
+            for player in self.players:
+                names.add_tree(player.inventory)
+            self._names = names
+
+        return self._names
+
+    def index_items(self, items):
+        """
+        items entered the world, along with everything inside them
+        """
+        if self._names is not None:
+            self._names.add_tree(items)
+
+    def unindex_items(self, items):
+        """
+        items left the world, along with everything inside them
+        """
+        if self._names is not None:
+            self._names.remove_tree(items)
+
+    @property
+    def router(self):
+        if self._router is None:
+            self._router = Router(self)
+
+        return self._router
+
+    @property
+    def scheduler(self):
+        """
+        the world's clock: callbacks on its entities after some ticks
+        (ex. world.scheduler.after(5, path.block)); ticks only pass when the
+        scheduler is advanced
+        """
+        if self._scheduler is None:
+            self._scheduler = Scheduler()
+
+        return self._scheduler
+
+    @property
+    def look_hit_ratio(self):
+        """
+        share of looks around the world's rooms answered from their caches
+        (see Room.look)
+        """
+        hits = misses = 0
+        for room in self._rooms:
+            hits += room.look_hits
+            misses += room.look_misses
+        looks = hits + misses
+        return hits / float(looks) if looks else 0.0
+
     def add_room(self, room):
         """
         add a room to the world
@@ -28,21 +189,95 @@ class AbstractWorld(EchoMixin):
         for room in rooms:
             if not room in self._rooms:
                 room.world = self
-                self._rooms.append(room)
+                self._rooms.add(room)
+
+                # nothing to keep up to date until routes or incoming paths
+                # are first asked for
+                if self._incoming is None and self._router is None:
+                    continue
+
+                if self._router is not None:
+                    self._router.room_added(room)
+                for direction, path in room.paths.items():
+                    if path is not None:
+                        self.link_path(room, direction, path)
 
     def remove_room(self, room):
         """
         remove a room from the world
+        paths leading to it from other rooms stay; see delete_room()
         """
         if room in self._rooms:
+            if self._incoming is not None or self._router is not None:
+                for direction, path in room.paths.items():
+                    if path is not None:
+                        self.unlink_path(room, direction, path)
+                if self._router is not None:
+                    self._router.room_removed(room)
+
             room.world = None
             self._rooms.remove(room)
 
-    def room_echo(self, msg):
+    def delete_room(self, room):
+        """
+        remove a room from the world along with every path leading to it
+        """
+        for path, (source, direction) in list(self.incoming(room).items()):
+            source.remove_path(direction)
+        self._incoming.pop(room, None)
+        self.remove_room(room)
+
+    def _index_paths(self):
+        incoming = {}
+        for room in self._rooms:
+            for direction, path in room.paths.items():
+                if path is not None:
+                    incoming.setdefault(path.destination, {})[path] = \
+                        (room, direction)
+        self._incoming = incoming
+
+    def incoming(self, room):
+        """
+        paths leading to a room: {path: (room it leaves from, direction)}
+        the index is built the first time it is needed and kept up to date
+        as paths and rooms come and go; don't modify it
+        """
+        if self._incoming is None:
+            self._index_paths()
+
+        return self._incoming.get(room, {})
+
+    def link_path(self, room, direction, path):
+        """
+        a room of the world got a path
+        """
+        if self._incoming is not None:
+            self._incoming.setdefault(path.destination, {})[path] = \
+                (room, direction)
+        if self._router is not None:
+            self._router.path_added(room, path)
+
+    def unlink_path(self, room, direction, path):
+        """
+        a room of the world lost a path
+        """
+        if self._incoming is not None:
+            paths = self._incoming.get(path.destination)
+            if paths is not None:
+                paths.pop(path, None)
+        if self._router is not None:
+            self._router.path_removed(room, path)
+
+    def room_echo(self, msg, room=None):
         """
         relay room messages to world echo callbacks (ex. IO driver)
+        room is where the message came from
+        (rooms publish to the bus themselves; this is for other callers)
         """
-        self.echo(msg)
+        if room is None:
+            self._bus.publish(WORLD, self, msg)
+        else:
+            self._bus.publish(ROOM, room, msg)
 
     def player_echo(self, msg):
         """
@@ -59,15 +294,179 @@ class World(AbstractWorld):
     def __init__(self, player, rooms=[]):
         super(World, self).__init__(rooms)
         self._player = player
-        self._player.on_echo.subscribe(self.player_echo)
+        self._player.bus = self._bus
+
+    # player property is read-only
+    @property
+    def player(self):
+        return self._player
+
+    @property
+    def players(self):
+        return [self._player]
+
+    def start(self):
+        """
+        start game; have player enter its current location
+        """
+        # number the entities before anything moves, so the ids match
+        # those of any other world built the same way (a catalog taken
+        # earlier already has)
+        if self._catalog is None:
+            self._catalog = Catalog(self)
+        self._player.location.enter(player=self._player)
+
+
+class PlayerView(EchoMixin):
+    """
+    one player's view of a shared world
+    commands and the IO driver use it in place of a World: it has the player
+    and echoes only the messages that player should see
+    """
+
+    def __init__(self, world, player):
+        super(PlayerView, self).__init__()
+        self._world = world
+        self._player = player
+
+    # world property is read-only
+    @property
+    def world(self):
+        return self._world
 
     # player property is read-only
     @property
     def player(self):
         return self._player
 
+    # the shared world's rooms, catalog, router and scheduler
+    @property
+    def rooms(self):
+        return self._world.rooms
+
+    @property
+    def catalog(self):
+        return self._world.catalog
+
+    @property
+    def router(self):
+        return self._world.router
+
+    @property
+    def scheduler(self):
+        return self._world.scheduler
+
     def start(self):
         """
         start game; have player enter its current location
         """
-        self._player.location.enter()
+        self._player.location.enter(player=self._player)
+
+
+class MultiplayerWorld(AbstractWorld):
+    """
+    collection of rooms shared by many players
+    a message from a room only reaches the players in that room, so the cost
+    of delivering it grows with the room's occupancy, not the world's
+    """
+
+    BUS = MultiplayerBus
+
+    def __init__(self, rooms=[]):
+        super(MultiplayerWorld, self).__init__(rooms)
+
+        # view of the world for each player
+        self._views = {}
+        # players in each room (interest management for room messages)
+        self._occupants = {}
+        # relocation callbacks, by player, so they can be unsubscribed
+        self._relocators = {}
+
+    @property
+    def players(self):
+        return list(self._views)
+
+    def occupants(self, room):
+        """
+        players in a room
+        """
+        return list(self._occupants.get(room, ()))
+
+    def view(self, player):
+        """
+        view of the world for a player that has joined
+        """
+        return self._views[player]
+
+    def get_view(self, player):
+        """
+        view of the world for a player, or None if it hasn't joined
+        """
+        return self._views.get(player)
+
+    def room_views(self, room):
+        """
+        views of the players in a room, without copying the occupants (see
+        occupants()); the room's players mustn't change while iterating
+        """
+        views = self._views
+        for player in self._occupants.get(room, ()):
+            yield views[player]
+
+    def join(self, player):
+        """
+        add a player to the world
+        returns the player's view, to hand to commands and an IO driver
+        """
+        if player in self._views:
+            raise RuntimeError("Player is already in the world")
+
+        view = PlayerView(self, player)
+        self._views[player] = view
+        # players only hear their own messages
+        player.bus = self._bus
+
+        def relocate(old_location, new_location):
+            self._relocate(player, old_location, new_location)
+
+        self._relocators[player] = relocate
+        player.on_relocate.subscribe(relocate)
+        self._relocate(player, None, player.location)
+
+        return view
+
+    def leave(self, player):
+        """
+        remove a player from the world
+        """
+        if not player in self._views:
+            raise RuntimeError("Player is not in the world")
+
+        self._views.pop(player)
+        player.bus = None
+        player.on_relocate.unsubscribe(self._relocators.pop(player))
+        self._relocate(player, player.location, None)
+
+    def _relocate(self, player, old_location, new_location):
+        """
+        keep room occupancy in step with player locations
+        """
+        if old_location is not None:
+            occupants = self._occupants.get(old_location)
+            if occupants is not None:
+                occupants.discard(player)
+                if not occupants:
+                    del self._occupants[old_location]
+
+        if new_location is not None:
+            occupants = self._occupants.get(new_location)
+            if occupants is None:
+                occupants = self._occupants[new_location] = OrderedSet()
+            occupants.add(player)
+
+    def broadcast(self, msg):
+        """
+        send a message to every player
+        """
+        for view in self._views.values():
+            view.echo(msg)